@@ -8,7 +8,6 @@ import uuid
 
 from app.models.conversation import conversation_storage
 from app.services.rag import rag_service, task_manager
-from app.models.document import storage
 
 router = APIRouter()
 
@@ -48,10 +47,10 @@ async def ask_question(request: QuestionRequest):
                 conversation_history = conversation.get("messages", [])
 
         # 执行 RAG 问答
-        result = rag_service.answer_question(
+        result = await rag_service.answer_question_async(
             query=request.question,
             document_id=request.documentId,
-            document_ids=get_document_ids(request.folderId),
+            folder_ids=folder_scope(request.folderId),
             conversation_id=request.conversationId,
             conversation_history=conversation_history,
             task_id=task_id
@@ -80,16 +79,9 @@ async def ask_question(request: QuestionRequest):
         raise HTTPException(status_code=500, detail=f"问答失败: {str(e)}")
 
 
-def get_document_ids(folder_id: str) -> Optional[List[str]]:
-    """获取知识库下的所有文档ID"""
-    if not folder_id:
-        return None
-
-    documents, _ = storage.list_documents(folder=folder_id)
-    if not documents:
-        return None
-
-    return [doc["id"] for doc in documents]
+def folder_scope(folder_id: str) -> Optional[List[str]]:
+    """知识库检索范围（按 folder_id 分区检索，不再展开为文档ID列表）"""
+    return [folder_id] if folder_id else None
 
 
 class CreateConversationRequest(BaseModel):
@@ -124,9 +116,9 @@ async def create_conversation(request: CreateConversationRequest):
         )
 
         # 回答问题
-        result = rag_service.answer_question(
+        result = await rag_service.answer_question_async(
             query=request.firstQuestion,
-            document_ids=get_document_ids(request.folderId),
+            folder_ids=folder_scope(request.folderId),
             conversation_id=conversation["id"],
             conversation_history=None,
             task_id=task_id
@@ -10,6 +10,7 @@ from docx.shared import Pt, RGBColor, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn  # 用于设置字体
 from docx.oxml import OxmlElement
+import asyncio
 import io
 import re
 from urllib.parse import quote
@@ -385,24 +386,19 @@ async def generate_section_content(project_id: str, request: GenerateContentRequ
         if not project:
             raise HTTPException(status_code=404, detail="项目不存在")
 
-        # 获取所有文档ID
-        document_ids = []
-        for folder_id in project.get("folderIds", []):
-            from app.models.document import storage as doc_storage
-            documents, _ = doc_storage.list_documents(folder=folder_id)
-            document_ids.extend([doc["id"] for doc in documents])
-
         # 获取完整大纲（用于上下文）
         outline = project.get("outline", [])
 
-        # 生成内容
-        result = document_generator_service.generate_section_content(
+        # 生成内容（检索和 LLM 调用是同步的，放到线程池中，不阻塞事件循环）
+        result = await asyncio.to_thread(
+            document_generator_service.generate_section_content,
             section_title=request.sectionTitle,
             section_id=request.sectionId,
-            document_ids=document_ids,
+            document_ids=None,
             context_sections=request.contextSections if request.contextSections else None,
             custom_prompt=request.customPrompt if request.customPrompt else None,
-            full_outline=outline  # 传递完整大纲
+            full_outline=outline,  # 传递完整大纲
+            folder_ids=project.get("folderIds", [])  # 按知识库分区检索
         )
 
         # 保存到项目
@@ -429,77 +425,42 @@ async def regenerate_paragraph(project_id: str, request: RegenerateParagraphRequ
     """
     重新生成段落
 
-    重新生成指定章节的段落内容，保存旧版本到versions中
+    重新生成指定章节的段落内容，旧版本保存到历史版本中
     """
     try:
         project = document_project_storage.get_project(project_id)
         if not project:
             raise HTTPException(status_code=404, detail="项目不存在")
 
-        # 获取所有文档ID
-        document_ids = []
-        for folder_id in project.get("folderIds", []):
-            from app.models.document import storage as doc_storage
-            documents, _ = doc_storage.list_documents(folder=folder_id)
-            document_ids.extend([doc["id"] for doc in documents])
-
-        # 获取当前段落（用于保存版本）
-        sections = project.get("sections", {})
-        section = sections.get(request.sectionId, {})
-        paragraphs = section.get("paragraphs", [])
-
-        # 准备当前段落信息和版本历史
-        current_paragraph = None
-        existing_versions = []
-
-        if paragraphs:
-            # 获取最新的段落
-            current_paragraph = paragraphs[-1]
-            # 获取已有的历史版本
-            existing_versions = current_paragraph.get("versions", [])
-
         # 获取完整大纲（用于上下文）
         outline = project.get("outline", [])
 
-        # 重新生成
-        new_paragraph_data = document_generator_service.regenerate_paragraph(
+        # 重新生成（同上，在线程池中执行）
+        new_paragraph_data = await asyncio.to_thread(
+            document_generator_service.regenerate_paragraph,
             section_title=request.sectionTitle,
             section_id=request.sectionId,
-            document_ids=document_ids,
+            document_ids=None,
             context_sections=request.contextSections if request.contextSections else None,
             custom_prompt=request.customPrompt if request.customPrompt else None,
-            full_outline=outline  # 传递完整大纲
+            full_outline=outline,  # 传递完整大纲
+            folder_ids=project.get("folderIds", [])  # 按知识库分区检索
         )
 
-        # 如果有当前段落，保存到版本历史
-        if current_paragraph:
-            # 将当前段落添加到版本历史
-            existing_versions.append({
-                "content": current_paragraph.get("content", ""),
-                "timestamp": current_paragraph.get("timestamp", ""),
-                "sources": current_paragraph.get("sources", [])
-            })
-
-        # 创建新段落（包含历史版本）
-        updated_paragraph = {
-            "paragraph_id": new_paragraph_data.get("paragraph_id"),
-            "section_id": new_paragraph_data.get("section_id"),
-            "content": new_paragraph_data.get("content"),
-            "sources": new_paragraph_data.get("sources", []),
-            "timestamp": new_paragraph_data.get("timestamp"),
-            "versions": existing_versions  # 保存所有历史版本
-        }
-
-        # 更新项目（只保留一个段落，历史在versions中）
-        document_project_storage.add_section_content(
+        # 更新项目（只保留一个段落，当前段落以差量形式并入历史版本）
+        updated_paragraph = document_project_storage.regenerate_paragraph(
             project_id=project_id,
             section_id=request.sectionId,
-            content={
-                "sectionId": request.sectionId,
-                "paragraphs": [updated_paragraph],  # 只保留当前段落
-                "sources": updated_paragraph.get("sources", [])
-            }
+            paragraph={
+                "paragraph_id": new_paragraph_data.get("paragraph_id"),
+                "section_id": new_paragraph_data.get("section_id"),
+                "content": new_paragraph_data.get("content"),
+                "sources": new_paragraph_data.get("sources", []),
+                "timestamp": new_paragraph_data.get("timestamp"),
+            },
         )
+        if updated_paragraph is None:
+            raise HTTPException(status_code=404, detail="项目不存在")
 
         return updated_paragraph
 
@@ -569,6 +530,30 @@ async def restore_paragraph_version(project_id: str, request: RestoreParagraphVe
         raise HTTPException(status_code=500, detail=f"恢复失败: {str(e)}")
 
 
+@router.get("/{project_id}/sections/{section_id}/paragraphs/{paragraph_id}/versions")
+async def get_paragraph_versions(project_id: str, section_id: str, paragraph_id: str):
+    """
+    获取段落历史版本
+
+    项目详情只包含段落的当前内容，历史版本通过此接口按需加载
+    """
+    try:
+        versions = document_project_storage.get_paragraph_versions(
+            project_id=project_id,
+            section_id=section_id,
+            paragraph_id=paragraph_id,
+        )
+        if versions is None:
+            raise HTTPException(status_code=404, detail="段落不存在")
+
+        return {"versions": versions}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取历史版本失败: {str(e)}")
+
+
 @router.get("/{project_id}/export-word")
 async def export_word(
     project_id: str,
@@ -1,14 +1,16 @@
 """
 文档相关 API 路由
 """
+import asyncio
 import os
 import shutil
 import base64
+import hashlib
 import logging
 from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Depends
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Depends, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -17,11 +19,12 @@ from app.schemas.document import (
     DocumentCreate,
     DocumentUpdate,
     DocumentResponse,
+    DocumentSummary,
     DocumentListResponse,
     UploadResponse,
     ParseResponse,
 )
-from app.models.document import storage
+from app.models.document import storage, encode_cursor
 from app.api.folders import update_folder_timestamp
 from app.services.mineru_service import mineru_service
 from app.core.config import settings
@@ -258,22 +261,63 @@ async def get_parse_status(document_id: str):
     }
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否包含 etag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
 @router.get("", response_model=DocumentListResponse)
 async def list_documents(
+    request: Request,
     folder: Optional[str] = Query(None, description="文件夹 ID"),
     tag: Optional[str] = Query(None, description="标签"),
     search: Optional[str] = Query(None, description="搜索关键词"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(100, ge=1, le=1000, description="返回数量"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的 nextCursor）"),
+    fields: Optional[str] = Query(None, description="只返回指定字段（逗号分隔，总是包含 id）"),
 ):
     """
-    获取文档列表
+    获取文档列表（摘要，不含正文）
+
+    按上传时间排序；使用 cursor 翻页时，翻页期间新增或删除文档不会导致重复或遗漏。
+    响应带 ETag，文档没有变化时对 If-None-Match 返回 304。
     """
-    documents, total = storage.list_documents(
-        folder=folder, tag=tag, search=search, skip=skip, limit=limit
-    )
+    include = None
+    if fields:
+        include = {name.strip() for name in fields.split(",") if name.strip()} | {"id"}
+        unknown = include - DocumentSummary.model_fields.keys()
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(sorted(unknown))}")
+
+    # 数据版本未变化时直接返回 304，不再查询和序列化
+    version_key = f"{storage.version()}?{request.url.query}"
+    etag = f'"{hashlib.sha1(version_key.encode("utf-8")).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
 
-    return DocumentListResponse(documents=documents, total=total)
+    try:
+        documents, total = storage.list_documents(
+            folder=folder, tag=tag, search=search, skip=skip, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(
+        {
+            "documents": [
+                DocumentSummary(**doc).model_dump(mode="json", include=include)
+                for doc in documents
+            ],
+            "total": total,
+            "nextCursor": encode_cursor(documents[-1]) if len(documents) == limit else None,
+        },
+        headers=headers,
+    )
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
@@ -281,7 +325,7 @@ async def get_document(document_id: str):
     """
     获取文档详情
     """
-    doc = storage.get_document(document_id)
+    doc = storage.get_document(document_id, with_content=True)
     if not doc:
         raise HTTPException(status_code=404, detail="文档不存在")
 
@@ -293,6 +337,7 @@ async def update_document(document_id: str, data: DocumentUpdate):
     """
     更新文档
     """
+    old_doc = storage.get_document(document_id)
     doc = storage.update_document(document_id, data)
     if not doc:
         raise HTTPException(status_code=404, detail="文档不存在")
@@ -301,6 +346,15 @@ async def update_document(document_id: str, data: DocumentUpdate):
     folder_id = doc.get("folderId", "root")
     update_folder_timestamp(folder_id)
 
+    # 移动到其他知识库：同步向量的 folder_id 分区键
+    # （向量化中的文档可能已有分块在批量插入缓冲或 Milvus 中，同样需要移动）
+    if old_doc and old_doc.get("folderId") != doc.get("folderId") \
+            and doc.get("vectorizeStatus") in ("success", "processing"):
+        try:
+            await asyncio.to_thread(vector_store.move_document, document_id, doc.get("folderId"))
+        except Exception as e:
+            logger.warning(f"移动文档 {document_id} 的向量失败: {e}")
+
     return DocumentResponse(**doc)
 
 
@@ -341,6 +395,17 @@ async def delete_document(document_id: str):
     if not success:
         raise HTTPException(status_code=404, detail="文档不存在")
 
+    # 删除向量（知识库检索按 folder_id 分区过滤，不删除会检索到已删除文档的分块）
+    if doc.get("chunked") or doc.get("vectorizeStatus") == "success":
+        def delete_vectors():
+            vector_store.ensure_loaded()
+            vector_store.delete_document(document_id)
+
+        try:
+            await asyncio.to_thread(delete_vectors)
+        except Exception as e:
+            logger.warning(f"删除文档 {document_id} 的向量失败: {e}")
+
     # 更新知识库时间戳
     update_folder_timestamp(folder_id)
 
@@ -362,7 +427,7 @@ async def download_document(
 
     if format == "markdown":
         # 下载 Markdown 文件
-        markdown_content = doc.get("markdownContent", "")
+        markdown_content = storage.get_markdown(document_id)
         if not markdown_content:
             raise HTTPException(status_code=400, detail="文档未解析或无内容")
 
@@ -524,6 +589,9 @@ async def get_word_extracted_image(image_name: str):
 from app.services.chunker import chunker
 from app.services.embedding import embedding_service
 from app.services.vector_store import vector_store
+from app.services.rag import rag_service
+from app.services.ollama_health import ollama_health
+from app.services.model_residency import model_residency
 
 
 @router.post("/{document_id}/chunk")
@@ -537,7 +605,7 @@ async def chunk_document(document_id: str):
     if not doc:
         raise HTTPException(status_code=404, detail="文档不存在")
 
-    markdown_content = doc.get("markdownContent")
+    markdown_content = storage.get_markdown(document_id)
     if not markdown_content:
         raise HTTPException(status_code=400, detail="文档未解析，无法分块")
 
@@ -608,7 +676,7 @@ async def vectorize_document(document_id: str):
     if not doc:
         raise HTTPException(status_code=404, detail="文档不存在")
 
-    markdown_content = doc.get("markdownContent")
+    markdown_content = storage.get_markdown(document_id)
     if not markdown_content:
         raise HTTPException(status_code=400, detail="文档未解析，无法分块")
 
@@ -630,7 +698,7 @@ async def vectorize_document(document_id: str):
 
             # 2. 生成向量（同时返回成功的索引）
             texts = [chunk.content for chunk in chunks_data]
-            successful_indices, embeddings = embedding_service.encode_with_indices(texts)
+            successful_indices, embeddings = await embedding_service.encode_with_indices_async(texts)
 
             # 检查是否有成功编码的向量
             if len(embeddings) == 0:
@@ -659,10 +727,13 @@ async def vectorize_document(document_id: str):
                 print(f"删除旧块时出错（可能首次向量化）: {e}")
 
             # 准备数据（只包含成功编码的分块）
+            # 按写入时所在的知识库取 folder_id（向量化期间文档可能被移动）
+            folder_id = (storage.get_document(document_id) or doc).get("folderId")
             chunk_dicts = [
                 {
                     "id": chunk.id,
                     "document_id": document_id,
+                    "folder_id": folder_id,
                     "chunk_index": idx,
                     "title": chunk.title,
                     "content": chunk.content,
@@ -677,22 +748,18 @@ async def vectorize_document(document_id: str):
             # 更新状态为成功
             storage.update_vectorize_status(document_id, "success", len(chunk_dicts))
 
-            # 4. 释放 GPU 显存
-            embedding_service.unload_model()
-
         except Exception as e:
             storage.update_vectorize_status(document_id, "error")
             print(f"向量化任务失败: {e}")
             import traceback
             traceback.print_exc()
-            # 即使失败也尝试释放GPU
-            try:
-                embedding_service.unload_model()
-            except:
-                pass
+        finally:
+            # 不再立即卸载嵌入模型，空闲后由 model_residency 卸载
+            model_residency.unpin(embedding_service.model_name)
 
-    # 提交到后台任务管理器
+    # 提交到后台任务管理器；排队期间即固定嵌入模型，队列处理完之前不会被卸载
     from app.services.task_manager import task_manager
+    model_residency.pin(embedding_service.model_name)
     await task_manager.submit_task(task_id, vectorize_task)
 
     return {
@@ -728,18 +795,17 @@ async def search_chunks(
     使用向量相似度搜索文档块
     """
     try:
-        # 测试 Ollama 连接
-        if not embedding_service.test_connection():
+        # 检查 Ollama 状态（读取后台监控的缓存结果，不发起请求）
+        if not ollama_health.is_available(embedding_service.model_name):
             raise HTTPException(status_code=503, detail="Ollama 服务不可用")
 
-        # 生成查询向量
-        query_vector = embedding_service.encode_single(query)
+        # 生成查询向量（同一查询命中缓存时不再请求 Ollama）
+        query_vector = await rag_service.query_vector_async(query)
 
-        # 向量搜索
-        if not vector_store.connected:
-            vector_store.connect()
-
-        results = vector_store.search(query_vector, top_k, document_id)
+        # 向量搜索（结果按文档的向量数据版本缓存）
+        results = await asyncio.to_thread(
+            rag_service.search_with_vector, query_vector, document_id, None, top_k
+        )
 
         return {
             "query": query,
@@ -772,8 +838,8 @@ async def batch_parse_folder(folder_id: str, mode: dict = None):
             mode = {}
         process_mode = mode.get("mode", "incremental")  # 默认增量模式
 
-        # 获取知识库下的所有文档
-        documents, total = storage.list_documents(folder=folder_id, skip=0, limit=1000)
+        # 先查文件夹统计，空文件夹无需列出文档
+        total = storage.folder_stats(folder_id)["documentCount"]
 
         if total == 0:
             return {
@@ -784,6 +850,9 @@ async def batch_parse_folder(folder_id: str, mode: dict = None):
                 "message": "知识库中没有文档"
             }
 
+        # 获取知识库下的所有文档
+        documents, total = storage.list_documents(folder=folder_id, skip=0, limit=total)
+
         # 统计
         parse_count = 0
         skipped_count = 0
@@ -828,50 +897,53 @@ async def batch_parse_folder(folder_id: str, mode: dict = None):
             """批量解析任务"""
             nonlocal parse_count, skipped_count, failed_count
 
-            for doc in docs_to_parse:
-                doc_id = doc["id"]
-                file_path = doc.get("filePath")
-
-                if not file_path:
-                    logger.warning(f"文档 {doc_id} 没有文件路径，跳过")
-                    skipped_count += 1
-                    continue
-
-                # 检查文件是否存在
-                if not os.path.exists(file_path):
-                    logger.warning(f"文档 {doc_id} 的文件不存在: {file_path}")
-                    storage.update_parse_status(doc_id, ParseStatus.ERROR)
-                    failed_count += 1
-                    continue
+            # 状态更新在任务内合并提交
+            with storage.write_batch():
+                for doc in docs_to_parse:
+                    doc_id = doc["id"]
+                    file_path = doc.get("filePath")
 
-                try:
-                    logger.info(f"开始批量解析文档 {doc_id}")
+                    if not file_path:
+                        logger.warning(f"文档 {doc_id} 没有文件路径，跳过")
+                        skipped_count += 1
+                        continue
 
-                    # 更新状态为解析中
-                    storage.update_parse_status(doc_id, ParseStatus.PARSING)
+                    # 检查文件是否存在
+                    if not os.path.exists(file_path):
+                        logger.warning(f"文档 {doc_id} 的文件不存在: {file_path}")
+                        storage.update_parse_status(doc_id, ParseStatus.ERROR)
+                        failed_count += 1
+                        continue
 
-                    # 使用MinerU解析
-                    markdown_content, error, images = await mineru_service.parse_pdf(
-                        file_path, doc_id
-                    )
+                    try:
+                        logger.info(f"开始批量解析文档 {doc_id}")
+
+                        # 更新状态为解析中
+                        storage.update_parse_status(doc_id, ParseStatus.PARSING)
+
+                        # 使用MinerU解析
+                        markdown_content, error, images = await mineru_service.parse_pdf(
+                            file_path, doc_id
+                        )
+
+                        if error:
+                            logger.error(f"文档 {doc_id} 解析失败: {error}")
+                            storage.update_parse_status(doc_id, ParseStatus.ERROR)
+                            failed_count += 1
+                        else:
+                            # 保存解析结果
+                            storage.update_parse_status(
+                                doc_id, ParseStatus.SUCCESS, markdown_content=markdown_content
+                            )
+                            parse_count += 1
+                            logger.info(f"文档 {doc_id} 解析完成")
 
-                    if error:
-                        logger.error(f"文档 {doc_id} 解析失败: {error}")
+                    except Exception as e:
+                        logger.error(f"文档 {doc_id} 解析异常: {e}")
                         storage.update_parse_status(doc_id, ParseStatus.ERROR)
                         failed_count += 1
-                    else:
-                        # 保存解析结果
-                        storage.save_parse_result(doc_id, markdown_content, images)
-                        storage.update_parse_status(doc_id, ParseStatus.COMPLETED)
-                        parse_count += 1
-                        logger.info(f"文档 {doc_id} 解析完成")
-
-                except Exception as e:
-                    logger.error(f"文档 {doc_id} 解析异常: {e}")
-                    storage.update_parse_status(doc_id, ParseStatus.ERROR)
-                    failed_count += 1
-                    import traceback
-                    traceback.print_exc()
+                        import traceback
+                        traceback.print_exc()
 
             # 更新知识库时间戳
             update_folder_timestamp(folder_id)
@@ -918,8 +990,8 @@ async def batch_vectorize_folder(folder_id: str, mode: dict = None):
             mode = {}
         process_mode = mode.get("mode", "incremental")  # 默认增量模式
 
-        # 获取知识库下的所有文档
-        documents, total = storage.list_documents(folder=folder_id, skip=0, limit=1000)
+        # 先查文件夹统计，空文件夹无需列出文档
+        total = storage.folder_stats(folder_id)["documentCount"]
 
         if total == 0:
             return {
@@ -930,6 +1002,9 @@ async def batch_vectorize_folder(folder_id: str, mode: dict = None):
                 "message": "知识库中没有文档"
             }
 
+        # 获取知识库下的所有文档
+        documents, total = storage.list_documents(folder=folder_id, skip=0, limit=total)
+
         # 统计
         vectorized_count = 0
         skipped_count = 0
@@ -942,118 +1017,133 @@ async def batch_vectorize_folder(folder_id: str, mode: dict = None):
             """批量向量化任务"""
             nonlocal vectorized_count, skipped_count, already_vectorized
 
-            # 如果是清空重建模式，先删除所有文档的向量数据
-            if process_mode == "full":
-                print(f"清空重建模式：开始删除知识库 {folder_id} 中所有文档的向量数据")
-                for doc in documents:
-                    doc_id = doc["id"]
-                    try:
-                        vector_store.delete_document(doc_id)
-                        print(f"已删除文档 {doc_id} 的向量数据")
-                        # 重置文档的向量化状态
-                        storage.update_vectorize_status(doc_id, "pending", None)
-                    except Exception as e:
-                        print(f"删除文档 {doc_id} 的向量数据时出错: {e}")
-
-                print(f"清空完成，开始重新处理所有文档")
-
-            for doc in documents:
-                doc_id = doc["id"]
-                markdown_content = doc.get("markdownContent")
-
-                # 检查是否已解析
-                if not markdown_content:
-                    skipped_count += 1
-                    print(f"文档 {doc_id} 未解析，跳过")
-                    continue
-
-                # 增量模式：检查是否已向量化
-                if process_mode == "incremental":
-                    if doc.get("vectorizeStatus") == "success" and doc.get("chunked"):
-                        already_vectorized += 1
-                        print(f"文档 {doc_id} 已向量化，跳过")
-                        continue
-
-                try:
-                    # 更新状态为处理中
-                    storage.update_vectorize_status(doc_id, "processing")
-
-                    # 1. 分块
-                    chunks_data = chunker.chunk(markdown_content, doc_id)
-
-                    if not chunks_data:
-                        storage.update_vectorize_status(doc_id, "error")
-                        skipped_count += 1
-                        continue
-
-                    # 2. 生成向量
-                    texts = [chunk.content for chunk in chunks_data]
-                    successful_indices, embeddings = embedding_service.encode_with_indices(texts)
-
-                    if len(embeddings) == 0:
-                        storage.update_vectorize_status(doc_id, "error")
-                        skipped_count += 1
-                        continue
-
-                    # 只保留成功编码的分块
-                    successful_chunks = [chunks_data[i] for i in successful_indices]
-
-                    # 3. 存储到向量数据库
-                    if not vector_store.connected:
-                        vector_store.connect()
-
-                    # 创建集合（如果不存在）
-                    vector_store.create_collection(
-                        dimension=embedding_service.dimension,
-                        drop_existing=False
-                    )
-
-                    # 先删除该文档的旧块（如果是full模式，前面已经删除过了，这里会失败但不影响）
-                    try:
-                        vector_store.delete_document(doc_id)
-                    except Exception as e:
-                        print(f"删除文档 {doc_id} 的旧块时出错: {e}")
-
-                    # 准备数据
-                    chunk_dicts = [
-                        {
-                            "id": chunk.id,
-                            "document_id": doc_id,
-                            "chunk_index": idx,
-                            "title": chunk.title,
-                            "content": chunk.content,
-                            "level": chunk.level
-                        }
-                        for idx, chunk in enumerate(successful_chunks)
-                    ]
-
-                    # 插入向量
-                    vector_store.insert_chunks(chunk_dicts, embeddings.tolist())
-
-                    # 更新状态为成功
-                    storage.update_vectorize_status(doc_id, "success", len(chunk_dicts))
-                    vectorized_count += 1
-
-                    print(f"文档 {doc_id} 向量化完成，共 {len(chunk_dicts)} 个块")
-
-                except Exception as e:
+            # 分块实际写入 Milvus 后才标记为成功：
+            # 状态变化会改变知识库的向量数据版本号，过早标记会让检索以新版本号缓存不完整的结果
+            def mark_inserted(chunk_counts: dict):
+                for inserted_id, count in chunk_counts.items():
+                    storage.update_vectorize_status(inserted_id, "success", count)
+
+            # 状态更新在任务内合并提交；向量跨文档缓冲后批量写入 Milvus，最后只 flush 一次
+            with storage.write_batch():
+                with vector_store.write_batch(on_inserted=mark_inserted) as vector_batch:
+                    # 如果是清空重建模式，先删除所有文档的向量数据
+                    if process_mode == "full":
+                        print(f"清空重建模式：开始删除知识库 {folder_id} 中所有文档的向量数据")
+                        for doc in documents:
+                            doc_id = doc["id"]
+                            try:
+                                vector_store.delete_document(doc_id)
+                                print(f"已删除文档 {doc_id} 的向量数据")
+                                # 重置文档的向量化状态
+                                storage.update_vectorize_status(doc_id, "pending", None)
+                            except Exception as e:
+                                print(f"删除文档 {doc_id} 的向量数据时出错: {e}")
+
+                        print(f"清空完成，开始重新处理所有文档")
+
+                    for doc in documents:
+                        doc_id = doc["id"]
+
+                        # 检查是否已解析
+                        if not doc.get("markdownRef"):
+                            skipped_count += 1
+                            print(f"文档 {doc_id} 未解析，跳过")
+                            continue
+
+                        # 增量模式：检查是否已向量化
+                        if process_mode == "incremental":
+                            if doc.get("vectorizeStatus") == "success" and doc.get("chunked"):
+                                already_vectorized += 1
+                                print(f"文档 {doc_id} 已向量化，跳过")
+                                continue
+
+                        try:
+                            # 更新状态为处理中
+                            storage.update_vectorize_status(doc_id, "processing")
+
+                            # 1. 分块（此时才加载正文）
+                            markdown_content = storage.get_markdown(doc_id) or ""
+                            chunks_data = chunker.chunk(markdown_content, doc_id)
+
+                            if not chunks_data:
+                                storage.update_vectorize_status(doc_id, "error")
+                                skipped_count += 1
+                                continue
+
+                            # 2. 生成向量
+                            texts = [chunk.content for chunk in chunks_data]
+                            successful_indices, embeddings = await embedding_service.encode_with_indices_async(texts)
+
+                            if len(embeddings) == 0:
+                                storage.update_vectorize_status(doc_id, "error")
+                                skipped_count += 1
+                                continue
+
+                            # 只保留成功编码的分块
+                            successful_chunks = [chunks_data[i] for i in successful_indices]
+
+                            # 3. 存储到向量数据库
+                            if not vector_store.connected:
+                                vector_store.connect()
+
+                            # 创建集合（如果不存在）
+                            vector_store.create_collection(
+                                dimension=embedding_service.dimension,
+                                drop_existing=False
+                            )
+
+                            # 先删除该文档的旧块（如果是full模式，前面已经删除过了，这里会失败但不影响）
+                            try:
+                                vector_store.delete_document(doc_id)
+                            except Exception as e:
+                                print(f"删除文档 {doc_id} 的旧块时出错: {e}")
+
+                            # 准备数据（按写入时所在的知识库取 folder_id，向量化期间文档可能被移动）
+                            doc_folder_id = (storage.get_document(doc_id) or doc).get("folderId")
+                            chunk_dicts = [
+                                {
+                                    "id": chunk.id,
+                                    "document_id": doc_id,
+                                    "folder_id": doc_folder_id,
+                                    "chunk_index": idx,
+                                    "title": chunk.title,
+                                    "content": chunk.content,
+                                    "level": chunk.level
+                                }
+                                for idx, chunk in enumerate(successful_chunks)
+                            ]
+
+                            # 插入向量（进入缓冲，写入 Milvus 后由 mark_inserted 更新状态为成功）
+                            vector_store.insert_chunks(chunk_dicts, embeddings.tolist())
+                            vectorized_count += 1
+
+                            print(f"文档 {doc_id} 向量化完成，共 {len(chunk_dicts)} 个块")
+
+                        except Exception as e:
+                            storage.update_vectorize_status(doc_id, "error")
+                            skipped_count += 1
+                            print(f"文档 {doc_id} 向量化失败: {e}")
+                            import traceback
+                            traceback.print_exc()
+
+                # 批量写入失败的文档：状态改为失败
+                for doc_id in vector_batch.failed_document_ids:
                     storage.update_vectorize_status(doc_id, "error")
-                    skipped_count += 1
-                    print(f"文档 {doc_id} 向量化失败: {e}")
-                    import traceback
-                    traceback.print_exc()
-
-            # 释放 GPU 显存
-            try:
-                embedding_service.unload_model()
-            except:
-                pass
+                vectorized_count -= len(vector_batch.failed_document_ids)
+                skipped_count += len(vector_batch.failed_document_ids)
 
             print(f"批量向量化完成：向量化 {vectorized_count} 个，已存在 {already_vectorized} 个，跳过 {skipped_count} 个")
 
-        # 提交到后台任务管理器
+        async def pinned_batch_vectorize_task():
+            try:
+                await batch_vectorize_task()
+            finally:
+                model_residency.unpin(embedding_service.model_name)
+
+        # 提交到后台任务管理器；排队期间即固定嵌入模型，队列处理完之前不会被卸载
         from app.services.task_manager import task_manager
-        await task_manager.submit_task(task_id, batch_vectorize_task)
+        model_residency.pin(embedding_service.model_name)
+        await task_manager.submit_task(task_id, pinned_batch_vectorize_task)
 
         mode_text = "清空重建" if process_mode == "full" else "增量处理"
         return {
@@ -1,13 +1,16 @@
 """
 文件夹相关 API 路由
 """
+import asyncio
+import logging
 from fastapi import APIRouter, HTTPException
 from typing import List
 
-from app.schemas.document import FolderCreate, FolderResponse
+from app.schemas.document import FolderCreate, FolderResponse, FolderStatsResponse
 from app.models.document import storage
-import uuid
-from datetime import datetime
+from app.services.vector_store import vector_store
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -18,17 +21,7 @@ def update_folder_timestamp(folder_id: str):
 
     当文件夹内的文档发生变化时（上传、删除、更新等），调用此函数更新 updatedAt
     """
-    import json
-
-    for i, folder in enumerate(storage.folders):
-        if folder["id"] == folder_id:
-            folder["updatedAt"] = datetime.now().isoformat()
-            storage.folders[i] = folder
-
-            # 保存到文件
-            with open(storage.folders_file, "w", encoding="utf-8") as f:
-                json.dump(storage.folders, f, ensure_ascii=False, indent=2)
-            return
+    storage.touch_folder(folder_id)
 
 
 @router.get("", response_model=List[FolderResponse])
@@ -37,7 +30,7 @@ async def list_folders():
     获取文件夹列表
     """
     # 排除根目录
-    folders = [f for f in storage.folders if f["id"] != "root"]
+    folders = [f for f in storage.list_folders() if f["id"] != "root"]
     return folders
 
 
@@ -46,28 +39,22 @@ async def create_folder(data: FolderCreate):
     """
     创建文件夹
     """
-    import json
+    folder = storage.create_folder(data.name, data.parentId)
 
-    # 生成新 ID
-    folder_id = str(uuid.uuid4())
+    return FolderResponse(**folder)
 
-    # 创建文件夹对象
-    folder = {
-        "id": folder_id,
-        "name": data.name,
-        "parentId": data.parentId,
-        "createdAt": datetime.now().isoformat(),
-        "updatedAt": datetime.now().isoformat(),
-    }
 
-    # 保存到存储
-    storage.folders.append(folder)
+@router.get("/{folder_id}/stats", response_model=FolderStatsResponse)
+async def get_folder_stats(folder_id: str):
+    """
+    获取文件夹统计（文档数、解析 / 向量化状态、分块数、总字节数）
 
-    # 保存到文件
-    with open(storage.folders_file, "w", encoding="utf-8") as f:
-        json.dump(storage.folders, f, ensure_ascii=False, indent=2)
+    统计随文档写入增量维护，无需扫描文档
+    """
+    if storage.get_folder(folder_id) is None:
+        raise HTTPException(status_code=404, detail="文件夹不存在")
 
-    return FolderResponse(**folder)
+    return FolderStatsResponse(folderId=folder_id, **storage.folder_stats(folder_id))
 
 
 @router.delete("/{folder_id}")
@@ -75,22 +62,26 @@ async def delete_folder(folder_id: str):
     """
     删除文件夹（级联删除所有文档）
     """
-    import json
-
     # 获取文件夹中的所有文档
-    documents, _ = storage.list_documents(folder=folder_id)
+    document_ids = storage.folder_document_ids([folder_id])
 
     # 级联删除所有文档
-    for doc in documents:
-        doc_id = doc["id"]
+    for doc_id in document_ids:
         # 删除文档文件
         storage.delete_document(doc_id)
 
-    # 删除文件夹
-    storage.folders = [f for f in storage.folders if f["id"] != folder_id]
+    # 一次删除整个知识库的向量
+    def delete_vectors():
+        vector_store.ensure_loaded()
+        vector_store.delete_folder(folder_id, document_ids)
 
-    # 保存到文件
-    with open(storage.folders_file, "w", encoding="utf-8") as f:
-        json.dump(storage.folders, f, ensure_ascii=False, indent=2)
+    if document_ids:
+        try:
+            await asyncio.to_thread(delete_vectors)
+        except Exception as e:
+            logger.warning(f"删除知识库 {folder_id} 的向量失败: {e}")
+
+    # 删除文件夹
+    storage.delete_folder(folder_id)
 
-    return {"message": f"删除成功（已删除 {len(documents)} 个文档）"}
+    return {"message": f"删除成功（已删除 {len(document_ids)} 个文档）"}
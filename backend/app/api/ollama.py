@@ -5,6 +5,9 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
 from app.services.ollama_controller import ollama_controller
+from app.services.embedding import embedding_service
+from app.services.ollama_health import ollama_health
+from app.services.model_residency import model_residency
 
 router = APIRouter()
 
@@ -26,6 +29,7 @@ async def start_ollama(request: StartOllamaRequest = None):
             ollama_controller.ollama_path = request.ollamaPath
 
         success = ollama_controller.start()
+        await ollama_health.refresh()
         if success:
             return {
                 "message": "Ollama服务启动成功",
@@ -49,6 +53,7 @@ async def stop_ollama():
     """
     try:
         success = ollama_controller.stop()
+        await ollama_health.refresh()
         if success:
             return {"message": "Ollama服务已停止"}
         else:
@@ -69,6 +74,7 @@ async def restart_ollama():
     """
     try:
         success = ollama_controller.restart()
+        await ollama_health.refresh()
         if success:
             return {
                 "message": "Ollama服务重启成功",
@@ -88,17 +94,23 @@ async def get_ollama_status():
     """
     获取Ollama服务状态
 
-    返回Ollama服务是否运行以及已加载的模型信息
+    返回Ollama服务是否运行以及已加载的模型信息（来自后台健康监控的缓存）
     """
     try:
-        is_running = ollama_controller.is_running()
-        models = ollama_controller.get_loaded_models() if is_running else []
+        # 读取后台监控缓存的状态；监控尚未完成第一次检查时立即检查一次
+        if ollama_health.checked_at is None:
+            await ollama_health.refresh()
+        models = ollama_health.models if ollama_health.running else []
 
         return {
-            "running": is_running,
+            "running": ollama_health.running,
             "host": ollama_controller.host,
             "loaded_models": models,
-            "model_count": len(models)
+            "model_count": len(models),
+            "health": ollama_health.snapshot(),
+            "residency": model_residency.snapshot(),
+            "embedding_cache": embedding_service.cache.stats() if embedding_service.cache else None,
+            "embedding_usage": embedding_service.stats.snapshot()
         }
 
     except Exception as e:
@@ -31,6 +31,48 @@ class Settings(BaseSettings):
     MINERU_OUTPUT_DIR: str = "./parsed_output"
     MINERU_LANG: str = "ch"
 
+    # 数据存储配置
+    STORAGE_BACKEND: str = "json"  # 存储后端：json / sqlite
+    SQLITE_PATH: str = "./data/ai_writer.db"  # STORAGE_BACKEND=sqlite 时的数据库文件
+    BLOB_COMPRESSION: str = "zstd"  # Markdown 正文压缩方式：zstd / none（未安装 zstandard 时自动退回 none）
+    STATUS_FLUSH_INTERVAL: float = 1.0  # 文档状态写入合并窗口（秒），0 表示立即写入
+    STATUS_FLUSH_MAX_PENDING: int = 50  # 待写入的文档状态达到该数量时立即提交，0 表示不限
+
+    # 向量化配置
+    EMBED_BATCH_SIZE: int = 64  # 每次请求 Ollama /api/embed 的最大文本数
+    EMBED_BATCH_MAX_CHARS: int = 32000  # 每批文本的最大总字符数
+    EMBED_BATCH_TARGET_SECONDS: float = 5.0  # 每批的目标耗时（秒），据此自适应调整批大小
+    EMBED_MAX_CONCURRENCY: int = 4  # 异步编码时同时在途的 Ollama 请求数上限
+    EMBED_KEEPALIVE_SECONDS: float = 60.0  # 空闲连接保持时间（秒）
+    EMBED_CLEAN_TEXT: bool = True  # 向量化前去掉图片链接、表格符号、HTML 标签并压缩长公式（只影响模型输入）
+    EMBED_CACHE_ENABLED: bool = True  # 是否缓存文本向量（内容未变的分块重新向量化时直接取缓存）
+    EMBED_CACHE_DIR: str = "./data/embedding_cache"  # 向量缓存目录
+    EMBED_CACHE_MAX_ENTRIES: int = 200000  # 每个模型最多缓存的向量数，超出后淘汰最久未使用的
+    EMBED_CACHE_DTYPE: str = "float16"  # 缓存向量的存储类型：float16 / float32
+    VECTOR_ENCODING: str = "float32"  # Milvus 向量字段编码：float32 / float16 / bfloat16（新建集合时生效）
+    VECTOR_INDEX_TYPE: str = "IVF_FLAT"  # 向量索引类型：FLAT / IVF_FLAT / IVF_SQ8 / HNSW（新建集合时生效）
+    VECTOR_INDEX_NLIST: int = 128  # IVF 索引的聚类数
+    VECTOR_SEARCH_NPROBE: int = 10  # IVF 索引搜索时探查的聚类数
+    VECTOR_NUM_PARTITIONS: int = 16  # folder_id 分区键对应的分区数（新建集合时生效）
+    VECTOR_INSERT_BATCH_ROWS: int = 2000  # 批量向量化时每次写入 Milvus 的最大分块数
+    VECTOR_INSERT_BATCH_MB: float = 32  # 批量向量化时每次写入 Milvus 的最大数据量（MB）
+
+    # 检索缓存配置（进程内，条目数为 0 表示关闭）
+    QUERY_CACHE_SIZE: int = 1024  # 缓存的查询向量数
+    QUERY_CACHE_TTL_SECONDS: float = 3600.0  # 查询向量缓存有效期（秒）
+    SEARCH_CACHE_SIZE: int = 512  # 缓存的检索结果数
+    SEARCH_CACHE_TTL_SECONDS: float = 300.0  # 检索结果缓存有效期（秒）
+
+    # Ollama 健康检查配置
+    OLLAMA_HEALTH_INTERVAL: float = 10.0  # 后台刷新 Ollama 状态的间隔（秒）
+    OLLAMA_HEALTH_TIMEOUT: float = 2.0  # 健康检查请求超时（秒）
+    OLLAMA_BREAKER_FAILURES: int = 3  # 连续失败多少次后熔断
+    OLLAMA_BREAKER_RESET_SECONDS: float = 15.0  # 熔断后多久探测一次是否恢复（秒）
+
+    # 模型驻留配置
+    MODEL_IDLE_SECONDS: float = 600.0  # 模型空闲多久后卸载（秒），0 表示不按空闲时间卸载
+    MODEL_MEMORY_BUDGET_MB: float = 0  # 已加载模型的总内存上限（MB），超出时卸载最久未使用的，0 表示不限制
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,6 +1,7 @@
 """
 AI Writer Backend - FastAPI 主入口
 """
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -10,6 +11,11 @@ from pathlib import Path
 
 from app.api import documents, folders, chat, document_projects, ollama
 from app.core.config import settings
+from app.models.document import storage
+from app.services.embedding import embedding_service
+from app.services.ollama_health import ollama_health
+from app.services.model_residency import model_residency
+from app.services.vector_store import vector_store
 
 
 @asynccontextmanager
@@ -17,9 +23,18 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时初始化
     print(f"🚀 {settings.APP_NAME} v{settings.APP_VERSION} 启动中...")
+    ollama_health.start()  # 后台定期刷新 Ollama 状态
+    model_residency.start()  # 后台按空闲时间 / 内存预算卸载模型
+    # 后台预加载向量集合，第一次检索不再等待加载（Milvus 未启动时不影响应用启动）
+    warm_up = asyncio.create_task(asyncio.to_thread(vector_store.warm_up))
 
     yield
     # 关闭时清理
+    warm_up.cancel()
+    await model_residency.stop()
+    await ollama_health.stop()
+    storage.flush()  # 提交尚未写入的文档状态
+    await embedding_service.aclose()
     print("👋 应用关闭")
 
 
@@ -69,7 +84,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """健康检查"""
-    return {"status": "healthy"}
+    return {"status": "healthy", "vector_store_ready": vector_store.ready}
 
 
 if __name__ == "__main__":
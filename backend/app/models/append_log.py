@@ -0,0 +1,171 @@
+"""
+追加写日志（JSON Lines）
+
+配合快照文件使用：每次变更只在日志末尾追加一行记录，
+由存储类在后台把「快照 + 日志」合并为新的快照（压缩）。
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class AppendLog:
+    """
+    追加写日志文件
+
+    记录已读取到的字节位置（offset），其他进程追加的记录
+    可以通过 read_new 只读取新增部分。
+    """
+
+    def __init__(self, log_file: str):
+        self.log_file = log_file
+        self.rotated_file = f"{log_file}.old"
+        self.entry_count = 0
+        self.offset = 0  # 当前日志中已读取 / 写入的字节数（只计完整的行）
+        self.inode = None  # 当前日志文件的 inode，用于发现日志被其他进程轮转
+        self._lock = threading.Lock()
+        self._fp = None
+
+    def _open(self):
+        """以追加模式打开日志文件"""
+        if self._fp is None:
+            self._fp = open(self.log_file, "ab")
+            self.inode = os.fstat(self._fp.fileno()).st_ino
+            # 上次崩溃时写了一半的行先补上换行，避免与新记录粘连
+            size = self._fp.tell()
+            if size > 0:
+                with open(self.log_file, "rb") as f:
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        self._fp.write(b"\n")
+                        self._fp.flush()
+                        self.offset = self._fp.tell()
+        return self._fp
+
+    def append(self, record: Dict):
+        """追加一条记录（单行 JSON）"""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]):
+        """追加多条记录，只刷新一次"""
+        if not records:
+            return
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for record in records
+        ).encode("utf-8")
+        with self._lock:
+            fp = self._open()
+            fp.write(data)
+            fp.flush()
+            self.offset += len(data)
+            self.entry_count += len(records)
+
+    def _read_lines(self, path: str, start: int = 0) -> Iterator[tuple]:
+        """从 start 开始读取完整的行，产出 (记录, 该行结束位置)"""
+        with open(path, "rb") as f:
+            f.seek(start)
+            position = start
+            for line_no, raw in enumerate(f, 1):
+                if not raw.endswith(b"\n"):
+                    break  # 写了一半的行（崩溃或其他进程正在写入）
+                position += len(raw)
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning(f"日志 {path} 第 {line_no} 行损坏，已跳过")
+                    continue
+                yield record, position
+
+    def replay(self) -> Iterator[Dict]:
+        """
+        按写入顺序回放记录
+
+        先回放压缩过程中被轮转出去的旧日志，再回放当前日志。
+        末尾因崩溃写了一半的行会被忽略。
+        """
+        if os.path.exists(self.rotated_file):
+            for record, _ in self._read_lines(self.rotated_file):
+                yield record
+
+        self.offset = 0
+        self.inode = None
+        if not os.path.exists(self.log_file):
+            return
+        self.inode = os.stat(self.log_file).st_ino
+        for record, position in self._read_lines(self.log_file):
+            self.offset = position
+            self.entry_count += 1
+            yield record
+
+    def read_new(self) -> Iterator[Dict]:
+        """读取其他进程在 offset 之后追加的记录"""
+        if not os.path.exists(self.log_file):
+            return
+        for record, position in self._read_lines(self.log_file, self.offset):
+            self.offset = position
+            self.entry_count += 1
+            yield record
+
+    def is_replaced(self) -> bool:
+        """日志是否已被其他进程轮转或截断（需要重新加载快照）"""
+        try:
+            stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            return self.inode is not None
+        if self.inode is None:
+            return False  # 本进程尚未见过日志文件，新文件从头读取即可
+        return stat.st_ino != self.inode or stat.st_size < self.offset
+
+    def rotate(self):
+        """
+        轮转日志：当前日志改名为 .old，后续写入进入新的空日志
+
+        调用方需保证此时内存状态已包含 .old 中的全部变更，
+        新快照落盘后再调用 discard_rotated 删除旧日志。
+        """
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+            self.offset = 0
+            self.inode = None
+            if os.path.exists(self.log_file):
+                if os.path.exists(self.rotated_file):
+                    # 上一次压缩未完成，旧日志仍需保留，合并到一起
+                    with open(self.rotated_file, "ab") as dst, \
+                            open(self.log_file, "rb") as src:
+                        dst.write(src.read())
+                    os.remove(self.log_file)
+                else:
+                    os.replace(self.log_file, self.rotated_file)
+            self.entry_count = 0
+
+    def discard_rotated(self):
+        """删除已合并进快照的旧日志"""
+        if os.path.exists(self.rotated_file):
+            os.remove(self.rotated_file)
+
+    def close(self):
+        """关闭日志文件"""
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+
+def write_snapshot(path: str, content: str) -> None:
+    """原子写入快照文件（先写临时文件再替换）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,95 @@
+"""
+内容寻址的文本块存储
+
+大段文本（如文档的 Markdown 正文）按内容的 SHA-256 存成独立文件，
+记录中只保存哈希引用，需要时再按引用读取。
+"""
+import hashlib
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时以明文存储
+    zstandard = None
+
+
+class BlobStore:
+    """内容寻址的文本存储（可选 zstd 压缩）"""
+
+    def __init__(self, blob_dir: str, compression: str = "zstd", level: int = 3):
+        """
+        初始化存储
+
+        Args:
+            blob_dir: 存储目录
+            compression: 压缩方式，zstd 或 none
+            level: zstd 压缩级别
+        """
+        self.blob_dir = blob_dir
+        self.compress = compression == "zstd" and zstandard is not None
+        self.level = level
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard 未安装，Markdown 将以明文存储。安装: pip install zstandard")
+        os.makedirs(blob_dir, exist_ok=True)
+
+    def _path(self, ref: str, compressed: bool) -> str:
+        """引用对应的文件路径（按哈希前两位分目录）"""
+        suffix = ".md.zst" if compressed else ".md"
+        return os.path.join(self.blob_dir, ref[:2], ref + suffix)
+
+    def put(self, content: str) -> str:
+        """
+        写入文本，返回内容哈希引用
+
+        相同内容只会存储一份。
+        """
+        data = content.encode("utf-8")
+        ref = hashlib.sha256(data).hexdigest()
+        if self.exists(ref):
+            return ref
+
+        path = self._path(ref, self.compress)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.compress:
+            data = zstandard.ZstdCompressor(level=self.level).compress(data)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return ref
+
+    def get(self, ref: str) -> Optional[str]:
+        """按引用读取文本，不存在时返回 None"""
+        path = self._path(ref, compressed=True)
+        if os.path.exists(path):
+            if zstandard is None:
+                raise RuntimeError("读取压缩的 Markdown 需要 zstandard。安装: pip install zstandard")
+            with open(path, "rb") as f:
+                return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+
+        path = self._path(ref, compressed=False)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        logger.warning(f"Markdown 内容不存在: {ref}")
+        return None
+
+    def exists(self, ref: str) -> bool:
+        """引用是否存在"""
+        return (
+            os.path.exists(self._path(ref, compressed=True))
+            or os.path.exists(self._path(ref, compressed=False))
+        )
+
+    def delete(self, ref: str):
+        """删除引用对应的文件"""
+        for compressed in (True, False):
+            path = self._path(ref, compressed)
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,37 +1,237 @@
 """
-对话数据模型（使用 JSON 文件存储）
+对话数据模型（每个对话一个日志文件或 SQLite 存储，由 Settings.STORAGE_BACKEND 选择）
 """
 import json
+import logging
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Optional, Dict
 import uuid
 
+from app.core.config import settings
+from app.models.append_log import write_snapshot
+from app.models.database import get_database
+from app.models.file_lock import InterProcessLock
+
+logger = logging.getLogger(__name__)
+
 
 class ConversationStorage:
-    """对话存储类（基于 JSON 文件）"""
+    """
+    对话存储类（每个对话一个追加写日志）
+
+    每个对话的消息存放在 conversations/{id}.jsonl 中，添加消息只需在
+    该文件末尾追加一行；对话列表所需的元数据（标题、时间、消息数）
+    常驻内存，并定期写入 conversations/index.json。索引中记录了每个
+    日志已索引到的字节位置，启动时只需读取未写入索引的日志尾部。
 
-    def __init__(self, storage_dir: str = "./data"):
+    多进程：写入时持有 conversations/.lock 上的排他锁并递增变更代数，
+    其他进程发现代数变化后同样只补读各日志新增的尾部。
+    """
+
+    def __init__(self, storage_dir: str = "./data", flush_delay: float = 1.0):
         self.storage_dir = storage_dir
-        self.conversations_file = os.path.join(storage_dir, "conversations.json")
+        self.conversations_dir = os.path.join(storage_dir, "conversations")
+        self.index_file = os.path.join(self.conversations_dir, "index.json")
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._index: Dict[str, Dict] = {}  # id -> 元数据（按创建顺序）
+        self._flush_timer: Optional[threading.Timer] = None
         self._ensure_storage_dir()
+        self._file_lock = InterProcessLock(os.path.join(self.conversations_dir, ".lock"))
+        self._generation = 0  # 本进程内存索引对应的变更代数
+        with self._file_lock.exclusive():
+            self._load_index()
+            self._generation = self._file_lock.generation()
 
     def _ensure_storage_dir(self):
         """确保存储目录存在"""
-        os.makedirs(self.storage_dir, exist_ok=True)
-        if not os.path.exists(self.conversations_file):
-            with open(self.conversations_file, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
+        os.makedirs(self.conversations_dir, exist_ok=True)
+
+    def _log_path(self, conversation_id: str) -> str:
+        return os.path.join(self.conversations_dir, f"{conversation_id}.jsonl")
+
+    # ---------- 索引 ----------
+
+    def _load_index(self):
+        """加载索引，补读索引之后追加的日志，必要时从旧的 conversations.json 迁移"""
+        if not os.path.exists(self.index_file):
+            self._migrate_from_json()
+
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    self._index[entry["id"]] = entry
+
+        if self._scan_logs():
+            self._flush_index()
+
+    def _scan_logs(self) -> bool:
+        """按日志文件校正索引：移除已删除的对话，补读新增内容，返回索引是否有变化"""
+        dirty = False
+        log_ids = {
+            name[: -len(".jsonl")]
+            for name in os.listdir(self.conversations_dir)
+            if name.endswith(".jsonl")
+        }
+        for conversation_id in list(self._index):
+            if conversation_id not in log_ids:
+                del self._index[conversation_id]
+                dirty = True
+        new_ids = log_ids - self._index.keys()
+        for conversation_id in list(self._index) + list(new_ids):
+            dirty |= self._catch_up(conversation_id)
+        if new_ids:
+            # 新发现的对话按创建时间归位，保持列表的先后顺序
+            self._index = dict(sorted(self._index.items(), key=lambda item: item[1].get("createdAt") or ""))
+        return dirty
+
+    # ---------- 多进程同步 ----------
+
+    def _refresh(self):
+        """同步其他进程写入的变更（需持有文件锁）"""
+        generation = self._file_lock.generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            self._scan_logs()
+            self._generation = generation
+
+    def _sync(self):
+        """读取前检查变更代数，其他进程有写入时才同步"""
+        if self._file_lock.generation() != self._generation:
+            with self._file_lock.exclusive():
+                self._refresh()
+
+    @contextmanager
+    def _write(self):
+        """写入范围：持有文件锁，先同步其他进程的变更，结束后递增变更代数"""
+        with self._file_lock.exclusive():
+            self._refresh()
+            with self._lock:
+                yield
+                self._generation = self._file_lock.bump()
+
+    def _catch_up(self, conversation_id: str) -> bool:
+        """读取日志中尚未计入索引的部分，返回索引是否有变化（需持有文件锁）"""
+        path = self._log_path(conversation_id)
+        entry = self._index.get(conversation_id)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return self._index.pop(conversation_id, None) is not None
+        if entry is not None and entry.get("offset", 0) == size:
+            return False
+        if entry is not None and entry.get("offset", 0) > size:
+            # 日志比索引记录的短（被截断），整个重新读取
+            del self._index[conversation_id]
+            entry = None
+
+        torn = False
+        with open(path, "rb") as f:
+            if entry is not None:
+                f.seek(entry["offset"])
+            offset = f.tell()
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    torn = True  # 崩溃时写了一半的行
+                    break
+                offset += len(raw)
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError:
+                    logger.warning(f"对话日志 {path} 存在损坏的行，已跳过")
+                    continue
+                if record.get("op") == "create":
+                    entry = {**record["conversation"], "messageCount": 0}
+                    self._index[conversation_id] = entry
+                elif record.get("op") == "message" and entry is not None:
+                    self._count_message(entry, record["message"], record.get("title"))
+
+        if torn:
+            # 持有文件锁时不会有其他进程正在写入：截掉半行，之后追加的记录不会与它粘连
+            os.truncate(path, offset)
+            logger.warning(f"对话日志 {path} 末尾存在写了一半的行，已截断")
+        if entry is None:
+            logger.warning(f"对话日志 {path} 缺少对话信息，已忽略")
+            return False
+        entry["offset"] = offset
+        return True
+
+    @staticmethod
+    def _count_message(entry: Dict, message: Dict, title: Optional[str] = None):
+        """把一条消息计入对话元数据"""
+        if title is not None:
+            entry["title"] = title
+        entry["messageCount"] += 1
+        if message.get("timestamp"):
+            entry["updatedAt"] = message["timestamp"]
+
+    def _flush_index(self):
+        """立即写入索引（索引只在启动时使用，写入前先同步其他进程的变更）"""
+        with self._file_lock.exclusive(), self._lock:
+            self._refresh()
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            content = json.dumps(list(self._index.values()), ensure_ascii=False, indent=2)
+            write_snapshot(self.index_file, content)
+
+    def _schedule_flush(self):
+        """延迟写入索引，合并短时间内的多次变更"""
+        with self._lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self._flush_index)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _append(self, conversation_id: str, record: Dict):
+        """向对话日志追加一条记录，并推进索引中的字节位置"""
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self._log_path(conversation_id), "ab") as f:
+            f.write(line)
+        self._index[conversation_id]["offset"] += len(line)
+
+    def _migrate_from_json(self):
+        """一次性把旧的 conversations.json 拆分为每个对话一个日志"""
+        conversations_file = os.path.join(self.storage_dir, "conversations.json")
+        if not os.path.exists(conversations_file):
+            return
 
-    def _load_conversations(self) -> List[Dict]:
-        """加载对话数据"""
-        with open(self.conversations_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(conversations_file, "r", encoding="utf-8") as f:
+            conversations = json.load(f)
 
-    def _save_conversations(self, conversations: List[Dict]):
-        """保存对话数据"""
-        with open(self.conversations_file, "w", encoding="utf-8") as f:
-            json.dump(conversations, f, ensure_ascii=False, indent=2)
+        # 旧文件中新对话在前，按创建顺序写入
+        for conv in reversed(conversations):
+            messages = conv.get("messages", [])
+            entry = {
+                "id": conv["id"],
+                "title": conv.get("title"),
+                "folderId": conv.get("folderId"),
+                "createdAt": conv.get("createdAt"),
+                "updatedAt": conv.get("updatedAt"),
+                "messageCount": 0,
+                "offset": 0,
+            }
+            self._index[conv["id"]] = entry
+            open(self._log_path(conv["id"]), "wb").close()
+            self._append(conv["id"], {"op": "create", "conversation": self._public(entry)})
+            for message in messages:
+                self._append(conv["id"], {"op": "message", "message": message})
+            entry["messageCount"] = len(messages)
+
+        self._flush_index()
+        self._index.clear()
+        logger.info(f"已将 {len(conversations)} 个对话迁移为独立日志")
+
+    @staticmethod
+    def _public(entry: Dict) -> Dict:
+        """索引条目中对外可见的字段"""
+        return {k: v for k, v in entry.items() if k not in ("offset", "messageCount")}
+
+    # ---------- 业务方法 ----------
 
     def create_conversation(
         self,
@@ -40,8 +240,200 @@ class ConversationStorage:
         first_message: Dict
     ) -> Dict:
         """创建对话"""
-        conversations = self._load_conversations()
+        conversation = {
+            "id": str(uuid.uuid4()),
+            "title": title,
+            "folderId": folder_id,
+            "createdAt": datetime.now().isoformat(),
+            "updatedAt": datetime.now().isoformat(),
+        }
+
+        with self._write():
+            self._index[conversation["id"]] = {**conversation, "messageCount": 1, "offset": 0}
+            self._append(conversation["id"], {"op": "create", "conversation": conversation})
+            self._append(conversation["id"], {"op": "message", "message": first_message})
+            self._schedule_flush()
+
+        return {**conversation, "messages": [first_message]}
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict]:
+        """获取单个对话（只读取该对话的日志）"""
+        self._sync()
+        with self._lock:
+            entry = self._index.get(conversation_id)
+            if entry is None:
+                return None
+            conversation = self._public(entry)
+
+        messages = []
+        try:
+            with open(self._log_path(conversation_id), "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(raw)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("op") == "message":
+                        messages.append(record["message"])
+        except FileNotFoundError:  # 读取期间对话被删除
+            return None
+
+        conversation["messages"] = messages
+        return conversation
+
+    def list_conversations(
+        self,
+        folder_id: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict]:
+        """
+        列出对话（只返回元数据，不含消息内容）
+
+        新对话在前；每项包含 messageCount。
+        """
+        self._sync()
+        conversations = []
+        with self._lock:
+            for entry in reversed(self._index.values()):
+                if folder_id and entry.get("folderId") != folder_id:
+                    continue
+                conversations.append({**self._public(entry), "messageCount": entry["messageCount"]})
+                if len(conversations) >= limit:
+                    break
+        return conversations
+
+    def add_message(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        sources: List[Dict] = None
+    ) -> Optional[Dict]:
+        """添加消息到对话，返回新消息"""
+        message = {
+            "id": str(uuid.uuid4()),
+            "role": role,  # "user" or "assistant"
+            "content": content,
+            "sources": sources or [],
+            "timestamp": datetime.now().isoformat()
+        }
+
+        with self._write():
+            entry = self._index.get(conversation_id)
+            if entry is None:
+                return None
+
+            record = {"op": "message", "message": message}
+            # 更新标题（使用第一条用户消息的前30个字符）
+            if entry["messageCount"] == 0 and role == "user":
+                record["title"] = content[:30] + ("..." if len(content) > 30 else "")
+
+            self._append(conversation_id, record)
+            self._count_message(entry, message, record.get("title"))
+            self._schedule_flush()
+
+        return message
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """删除对话"""
+        with self._write():
+            if self._index.pop(conversation_id, None) is None:
+                return False
+            path = self._log_path(conversation_id)
+            if os.path.exists(path):
+                os.remove(path)
+            self._flush_index()
+        return True
+
+
+class SQLiteConversationStorage(ConversationStorage):
+    """
+    对话存储类（SQLite）
+
+    对话元数据和消息分表存储，添加消息只需插入一行并更新对话的 updatedAt。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id TEXT PRIMARY KEY,
+        folderId TEXT,
+        title TEXT,
+        createdAt TEXT,
+        updatedAt TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_conversations_folder ON conversations (folderId, createdAt);
+    CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations (updatedAt);
 
+    CREATE TABLE IF NOT EXISTS conversation_messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_conversation_messages_conv
+        ON conversation_messages (conversation_id, seq);
+    """
+
+    def __init__(self, db_path: str, storage_dir: str = "./data"):
+        self.storage_dir = storage_dir
+        self.db = get_database(db_path)
+        self.db.executescript(self.SCHEMA)
+        self._migrate_from_json()
+
+    def _migrate_from_json(self):
+        """一次性从 JSON 存储迁移"""
+        if self.db.get_meta("migrated:conversations"):
+            return
+
+        with self.db.transaction() as conn:
+            if self.db.get_meta("migrated:conversations"):
+                return
+            if os.path.exists(os.path.join(self.storage_dir, "conversations.json")) or \
+                    os.path.isdir(os.path.join(self.storage_dir, "conversations")):
+                # 借助 JSON 存储读取（同时兼容旧的 conversations.json）
+                json_storage = ConversationStorage(self.storage_dir)
+                summaries = json_storage.list_conversations(limit=len(json_storage._index))
+                for summary in reversed(summaries):
+                    conv = json_storage.get_conversation(summary["id"])
+                    if conv is not None:
+                        self._insert(conn, conv)
+                logger.info(f"已从 JSON 迁移 {len(summaries)} 个对话到 SQLite")
+            self.db.set_meta("migrated:conversations", datetime.now().isoformat())
+
+    def _insert(self, conn, conversation: Dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO conversations (id, folderId, title, createdAt, updatedAt) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                conversation["id"],
+                conversation.get("folderId"),
+                conversation.get("title"),
+                conversation.get("createdAt"),
+                conversation.get("updatedAt"),
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO conversation_messages (conversation_id, data) VALUES (?, ?)",
+            [
+                (conversation["id"], json.dumps(message, ensure_ascii=False))
+                for message in conversation.get("messages", [])
+            ],
+        )
+
+    def _messages(self, conversation_id: str) -> List[Dict]:
+        rows = self.db.execute(
+            "SELECT data FROM conversation_messages WHERE conversation_id = ? ORDER BY seq",
+            (conversation_id,),
+        ).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def create_conversation(
+        self,
+        title: str,
+        folder_id: str,
+        first_message: Dict
+    ) -> Dict:
         conversation = {
             "id": str(uuid.uuid4()),
             "title": title,
@@ -51,31 +443,39 @@ class ConversationStorage:
             "messages": [first_message]
         }
 
-        conversations.insert(0, conversation)  # 新对话放在最前面
-        self._save_conversations(conversations)
+        with self.db.transaction() as conn:
+            self._insert(conn, conversation)
         return conversation
 
     def get_conversation(self, conversation_id: str) -> Optional[Dict]:
-        """获取单个对话"""
-        conversations = self._load_conversations()
-        for conv in conversations:
-            if conv["id"] == conversation_id:
-                return conv
-        return None
+        row = self.db.execute(
+            "SELECT id, title, folderId, createdAt, updatedAt FROM conversations WHERE id = ?",
+            (conversation_id,),
+        ).fetchone()
+        if not row:
+            return None
+        conversation = dict(row)
+        conversation["messages"] = self._messages(conversation_id)
+        return conversation
 
     def list_conversations(
         self,
         folder_id: Optional[str] = None,
         limit: int = 50
     ) -> List[Dict]:
-        """列出对话"""
-        conversations = self._load_conversations()
-
-        # 筛选
+        sql = (
+            "SELECT id, title, folderId, createdAt, updatedAt, "
+            "(SELECT COUNT(*) FROM conversation_messages m WHERE m.conversation_id = c.id) "
+            "AS messageCount FROM conversations c"
+        )
+        params: List = []
         if folder_id:
-            conversations = [c for c in conversations if c["folderId"] == folder_id]
+            sql += " WHERE folderId = ?"
+            params.append(folder_id)
+        sql += " ORDER BY createdAt DESC LIMIT ?"
+        params.append(limit)
 
-        return conversations[:limit]
+        return [dict(row) for row in self.db.execute(sql, params).fetchall()]
 
     def add_message(
         self,
@@ -84,43 +484,56 @@ class ConversationStorage:
         content: str,
         sources: List[Dict] = None
     ) -> Optional[Dict]:
-        """添加消息到对话"""
-        conversations = self._load_conversations()
-
-        for i, conv in enumerate(conversations):
-            if conv["id"] == conversation_id:
-                message = {
-                    "id": str(uuid.uuid4()),
-                    "role": role,  # "user" or "assistant"
-                    "content": content,
-                    "sources": sources or [],
-                    "timestamp": datetime.now().isoformat()
-                }
-                conv["messages"].append(message)
-                conv["updatedAt"] = datetime.now().isoformat()
-
-                # 更新标题（使用第一条用户消息的前30个字符）
-                if len(conv["messages"]) == 1 and role == "user":
-                    conv["title"] = content[:30] + ("..." if len(content) > 30 else "")
-
-                conversations[i] = conv
-                self._save_conversations(conversations)
-                return conv
-
-        return None
+        message = {
+            "id": str(uuid.uuid4()),
+            "role": role,  # "user" or "assistant"
+            "content": content,
+            "sources": sources or [],
+            "timestamp": datetime.now().isoformat()
+        }
+
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM conversation_messages WHERE conversation_id = c.id) AS n "
+                "FROM conversations c WHERE c.id = ?",
+                (conversation_id,),
+            ).fetchone()
+            if not row:
+                return None
+
+            conn.execute(
+                "INSERT INTO conversation_messages (conversation_id, data) VALUES (?, ?)",
+                (conversation_id, json.dumps(message, ensure_ascii=False)),
+            )
+            conn.execute(
+                "UPDATE conversations SET updatedAt = ? WHERE id = ?",
+                (datetime.now().isoformat(), conversation_id),
+            )
+
+            # 更新标题（使用第一条用户消息的前30个字符）
+            if row["n"] == 0 and role == "user":
+                conn.execute(
+                    "UPDATE conversations SET title = ? WHERE id = ?",
+                    (content[:30] + ("..." if len(content) > 30 else ""), conversation_id),
+                )
+
+        return message
 
     def delete_conversation(self, conversation_id: str) -> bool:
-        """删除对话"""
-        conversations = self._load_conversations()
+        with self.db.transaction() as conn:
+            cursor = conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            conn.execute(
+                "DELETE FROM conversation_messages WHERE conversation_id = ?", (conversation_id,)
+            )
+        return cursor.rowcount > 0
 
-        for i, conv in enumerate(conversations):
-            if conv["id"] == conversation_id:
-                conversations.pop(i)
-                self._save_conversations(conversations)
-                return True
 
-        return False
+def create_conversation_storage() -> ConversationStorage:
+    """按配置创建对话存储"""
+    if settings.STORAGE_BACKEND == "sqlite":
+        return SQLiteConversationStorage(settings.SQLITE_PATH)
+    return ConversationStorage()
 
 
 # 全局存储实例
-conversation_storage = ConversationStorage()
+conversation_storage = create_conversation_storage()
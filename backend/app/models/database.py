@@ -0,0 +1,110 @@
+"""
+SQLite 数据库连接（STORAGE_BACKEND=sqlite 时使用）
+
+每个线程使用独立连接，数据库以 WAL 模式打开，
+读写可以并发，多个写入者之间由 SQLite 的写锁串行化。
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+def _py_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+class Database:
+    """SQLite 数据库"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None：由 transaction() 显式控制事务
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            # SQLite 自带的 lower() 只转换 ASCII 字母，检索统一用 Python 的 str.lower()
+            conn.create_function("py_lower", 1, _py_lower, deterministic=True)
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        写事务（BEGIN IMMEDIATE）
+
+        事务开始时即获取写锁，读-改-写之间不会被其他写入者插入；
+        嵌套调用时并入最外层事务。
+        """
+        conn = self.conn
+        if self._local.depth > 0:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """执行单条语句"""
+        return self.conn.execute(sql, params)
+
+    def executescript(self, script: str):
+        """执行建表脚本"""
+        self.conn.executescript(script)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """读取元数据"""
+        self._ensure_meta()
+        row = self.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str):
+        """写入元数据"""
+        self._ensure_meta()
+        self.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _ensure_meta(self):
+        self.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> Database:
+    """获取路径对应的共享 Database 实例"""
+    path = os.path.abspath(path)
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path)
+        return _databases[path]
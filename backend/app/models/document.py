@@ -1,62 +1,378 @@
 """
-文档数据模型（使用 JSON 文件存储）
+文档数据模型
+
+支持两种存储后端（由 Settings.STORAGE_BACKEND 选择）：
+- json：内存索引 + JSON 快照 + 追加写日志（默认）
+- sqlite：SQLite（WAL 模式）
+
+两种后端都可以被多个 worker 进程共用：json 后端通过锁文件互斥写入，
+并在读取前按变更代数同步其他进程的写入。
 """
+import base64
+import bisect
+import contextvars
+import heapq
 import json
+import logging
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Optional, Dict
 import uuid
 from app.schemas.document import DocumentCreate, DocumentUpdate, ParseStatus, FileType
+from app.core.config import settings
+from app.models.append_log import AppendLog, write_snapshot
+from app.models.blob_store import BlobStore
+from app.models.file_lock import InterProcessLock
+from app.models.folder_stats import (
+    STAT_FIELDS,
+    FolderStats,
+    FolderVersions,
+    add_stats,
+    document_stats,
+    empty_stats,
+    vector_changed,
+)
+from app.models.database import get_database
+from app.models.search_index import DocumentSearchIndex, ngrams, query_grams
 
+logger = logging.getLogger(__name__)
 
-class DocumentStorage:
-    """文档存储类（基于 JSON 文件）"""
 
-    def __init__(self, storage_dir: str = "./data"):
-        self.storage_dir = storage_dir
-        self.documents_file = os.path.join(storage_dir, "documents.json")
-        self.folders_file = os.path.join(storage_dir, "folders.json")
-        self._ensure_storage_dir()
-        self.folders = self._load_folders()
+def _file_identity(path: str) -> Optional[tuple]:
+    """文件的 (inode, 修改时间)，用于判断文件是否被其他进程替换或改写"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
 
-    def _ensure_storage_dir(self):
-        """确保存储目录存在"""
-        os.makedirs(self.storage_dir, exist_ok=True)
-        if not os.path.exists(self.documents_file):
-            with open(self.documents_file, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-        if not os.path.exists(self.folders_file):
-            # 初始化默认文件夹
-            default_folders = [
-                {
-                    "id": "root",
-                    "name": "根目录",
-                    "parentId": None,
-                    "createdAt": datetime.now().isoformat(),
-                }
-            ]
-            with open(self.folders_file, "w", encoding="utf-8") as f:
-                json.dump(default_folders, f, ensure_ascii=False, indent=2)
 
-    def _load_documents(self) -> List[Dict]:
-        """加载文档数据"""
-        with open(self.documents_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+def sort_key(doc: Dict) -> tuple:
+    """文档列表的排序键：(上传时间, ID)，各进程、各后端一致且不随插入变化"""
+    return doc.get("uploadTime") or "", doc["id"]
 
-    def _load_folders(self) -> List[Dict]:
-        """加载文件夹数据"""
-        with open(self.folders_file, "r", encoding="utf-8") as f:
-            return json.load(f)
 
-    def _save_documents(self, documents: List[Dict]):
-        """保存文档数据"""
-        with open(self.documents_file, "w", encoding="utf-8") as f:
-            json.dump(documents, f, ensure_ascii=False, indent=2)
+def encode_cursor(doc: Dict) -> str:
+    """由一页的最后一个文档生成下一页的游标"""
+    data = json.dumps(list(sort_key(doc)), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """解析分页游标，无效时抛出 ValueError"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        upload_time, doc_id = json.loads(data)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    if not isinstance(upload_time, str) or not isinstance(doc_id, str):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return upload_time, doc_id
+
+
+def _default_folders() -> List[Dict]:
+    """初始化默认文件夹"""
+    return [
+        {
+            "id": "root",
+            "name": "根目录",
+            "parentId": None,
+            "createdAt": datetime.now().isoformat(),
+        }
+    ]
+
+
+class BaseDocumentStorage:
+    """
+    文档存储基类
+
+    实现与存储后端无关的业务方法；子类负责 _insert / _patch / _remove
+    三个写入原语，以及查询和文件夹相关方法。
+    Markdown 正文按内容哈希单独存放在 blobs/ 下，记录中只保留
+    markdownRef 引用，需要正文时再通过 get_markdown 读取。
+
+    解析 / 分块 / 向量化状态的写入会先进入内存中的待写队列，
+    在 flush_interval 秒内或一个 write_batch() 范围内合并为一次提交；
+    读取时叠加待写队列，状态变化对读者立即可见。
+    """
+
+    blobs: BlobStore
+
+    def __init__(self, flush_interval: float = 0.0, max_pending: int = 0):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending  # 待写队列达到该文档数时立即提交，0 表示不限
+        self._pending: Dict[str, Dict] = {}  # 文档 ID -> 待写入的状态字段
+        self._pending_lock = threading.RLock()
+        # write_batch 嵌套深度按调用方（协程 / 线程）的上下文记录：
+        # 一个批量任务的范围不会让其他请求和任务的状态写入也进入待写队列
+        self._batch_depth = contextvars.ContextVar(f"document_batch_{id(self)}", default=0)
+        self._flush_timer: Optional[threading.Timer] = None
+        self._pending_version = 0  # 待写队列每次变化时递增
+        self._instance_id = uuid.uuid4().hex[:8]
+
+    # ---------- 写入原语（由子类实现） ----------
+
+    def _insert(self, doc: Dict):
+        raise NotImplementedError
+
+    def _patch(self, document_id: str, fields: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def _remove(self, document_id: str):
+        raise NotImplementedError
+
+    def _patch_many(self, patches: Dict[str, Dict]):
+        """一次提交多个文档的字段更新（子类可覆盖为单次写入）"""
+        for document_id, fields in patches.items():
+            self._patch(document_id, fields)
+
+    def _release_blob(self, ref: Optional[str]):
+        """正文不再被任何文档（包括待写队列）引用时删除文件（由子类实现）"""
+        raise NotImplementedError
+
+    # ---------- 状态写入合并 ----------
+
+    @contextmanager
+    def write_batch(self):
+        """
+        批量写入范围
+
+        范围只对当前调用方（所在的协程或线程）生效，其他请求的状态仍按原方式写入。
+        范围内的状态更新合并提交（flush_interval > 0 时仍按窗口定期提交，
+        待写队列达到 max_pending 个文档时立即提交），退出最外层范围时提交剩余部分。
+        """
+        depth = self._batch_depth.get()
+        token = self._batch_depth.set(depth + 1)
+        try:
+            yield self
+        finally:
+            self._batch_depth.reset(token)
+            if depth == 0:
+                self.flush()
+
+    def flush(self):
+        """立即提交所有待写入的状态更新"""
+        with self._pending_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            # 提交完成前保持待写队列可见，读者不会读到旧状态
+            try:
+                self._patch_many(self._pending)
+            except Exception as e:
+                logger.error(f"文档状态提交失败: {e}")
+                raise
+            self._pending = {}
+
+    def _patch_status(self, document_id: str, fields: Dict) -> Optional[Dict]:
+        """写入状态字段：立即写入，或放入待写队列等待合并提交"""
+        if self._batch_depth.get() == 0 and self.flush_interval <= 0:
+            return self._patch(document_id, fields)
+
+        if self.get_document(document_id) is None:
+            return None
+        with self._pending_lock:
+            # 在锁内外置正文：与 _release_blob 的引用检查互斥，刚写入的正文不会被误删
+            fields = self._externalize(fields)
+            pending = self._pending.setdefault(document_id, {})
+            replaced = pending.get("markdownRef") if "markdownRef" in fields else None
+            pending.update(fields)
+            self._pending_version += 1
+            # 长时间的批量任务中已完成的结果不必等到任务结束才落盘
+            overflow = 0 < self.max_pending <= len(self._pending)
+            if not overflow and self.flush_interval > 0 and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if overflow:
+            self.flush()
+        # 被替换的正文不会再被提交，没有其他引用时删除
+        if replaced and replaced != fields["markdownRef"]:
+            self._release_blob(replaced)
+        return self.get_document(document_id)
+
+    def _pending_refs(self) -> set:
+        """待写队列中引用的正文（尚未提交，同样不能删除）"""
+        with self._pending_lock:
+            return {fields["markdownRef"] for fields in self._pending.values() if fields.get("markdownRef")}
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            pass  # flush 已记录日志，待写队列保留到下一次提交
+
+    def _overlay(self, doc: Dict) -> Dict:
+        """叠加尚未提交的状态字段"""
+        with self._pending_lock:
+            fields = self._pending.get(doc["id"])
+        return {**doc, **fields} if fields else doc
+
+    def version(self) -> str:
+        """
+        文档数据的版本号，任何文档变化（包括待写队列中的状态）都会改变它
+
+        用作文档列表接口的 ETag。待写队列只在本进程可见，
+        非空时版本号带上实例标识，不同 worker 之间不会误判为相同。
+        """
+        version = self._data_version()
+        with self._pending_lock:
+            if self._pending:
+                version = f"{version}-{self._instance_id}.{self._pending_version}"
+        return version
+
+    def _data_version(self) -> str:
+        """已持久化数据的版本号（由子类实现）"""
+        raise NotImplementedError
+
+    def folder_stats(self, folder_id: str) -> Dict[str, int]:
+        """
+        文件夹统计：文档数、已解析、已向量化、失败、分块总数、文件总字节数
+
+        已提交部分由子类在写入时增量维护，这里只叠加待写队列中的状态变化。
+        """
+        # 持有待写队列锁期间 flush 不会提交，已提交统计与待写队列保持一致
+        with self._pending_lock:
+            stats = self._stored_folder_stats(folder_id)
+            for document_id, fields in self._pending.items():
+                doc = self._stored_document(document_id)
+                if doc is None or doc.get("folderId") != folder_id:
+                    continue
+                add_stats(stats, document_stats({**doc, **fields}))
+                add_stats(stats, document_stats(doc), -1)
+        return stats
+
+    def _stored_folder_stats(self, folder_id: str) -> Dict[str, int]:
+        """已提交的文件夹统计（由子类实现）"""
+        raise NotImplementedError
+
+    def _stored_document(self, document_id: str) -> Optional[Dict]:
+        """已提交的文档记录，不叠加待写队列（由子类实现）"""
+        raise NotImplementedError
+
+    def vector_version(self, document_ids: List[str]) -> str:
+        """
+        一组文档所在文件夹的向量数据版本号
+
+        文件夹中的文档重新向量化、移动或删除后版本号改变，
+        用于让检索结果缓存失效。待写队列中有这些文件夹的向量化状态变化时，
+        版本号带上实例标识和待写队列版本。
+        """
+        with self._pending_lock:
+            return self.folder_vector_version(self._document_folders(document_ids))
+
+    def folder_vector_version(self, folder_ids) -> str:
+        """若干文件夹的向量数据版本号（规则同 vector_version）"""
+        with self._pending_lock:
+            folder_ids = sorted(set(folder_ids), key=lambda f: f or "")
+            version = ",".join(
+                f"{folder_id or ''}:{self._stored_folder_version(folder_id)}" for folder_id in folder_ids
+            )
+            for document_id, fields in self._pending.items():
+                doc = self._stored_document(document_id)
+                if doc is not None and doc.get("folderId") in folder_ids \
+                        and vector_changed(doc, {**doc, **fields}):
+                    return f"{version}-{self._instance_id}.{self._pending_version}"
+        return version
+
+    def _document_folders(self, document_ids: List[str]) -> set:
+        """文档所在的文件夹 ID 集合（由子类实现）"""
+        raise NotImplementedError
+
+    def _stored_folder_version(self, folder_id: Optional[str]) -> str:
+        """已提交数据中文件夹的向量数据版本号（由子类实现）"""
+        raise NotImplementedError
+
+    # ---------- 查询（由子类实现） ----------
+
+    def get_document(self, document_id: str, with_content: bool = False) -> Optional[Dict]:
+        """
+        获取单个文档
+
+        Args:
+            document_id: 文档 ID
+            with_content: 是否同时加载 Markdown 正文（markdownContent）
+        """
+        raise NotImplementedError
+
+    def list_documents(
+        self,
+        folder: Optional[str] = None,
+        tag: Optional[str] = None,
+        search: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> tuple[List[Dict], int]:
+        """
+        列出文档（按上传时间排序）
+
+        Args:
+            cursor: 分页游标（encode_cursor 生成），只返回排在游标之后的文档；
+                翻页期间有新文档插入或删除也不会重复或遗漏
+            skip: 跳过数量（与 cursor 同时使用时在游标之后跳过）
+
+        Returns:
+            (当前页文档, 符合条件的文档总数)
+        """
+        raise NotImplementedError
+
+    def folder_document_ids(self, folder_ids: List[str]) -> List[str]:
+        """若干文件夹中全部文档的 ID（不分页，用于限定检索范围）"""
+        raise NotImplementedError
+
+    # ---------- 文件夹（由子类实现） ----------
+
+    def list_folders(self) -> List[Dict]:
+        """获取所有文件夹"""
+        raise NotImplementedError
+
+    def get_folder(self, folder_id: str) -> Optional[Dict]:
+        """获取单个文件夹"""
+        raise NotImplementedError
+
+    def create_folder(self, name: str, parent_id: Optional[str] = None) -> Dict:
+        """创建文件夹"""
+        raise NotImplementedError
+
+    def delete_folder(self, folder_id: str) -> bool:
+        """删除文件夹记录（不包含其中的文档）"""
+        raise NotImplementedError
+
+    def touch_folder(self, folder_id: str):
+        """更新文件夹的 updatedAt"""
+        raise NotImplementedError
+
+    # ---------- Markdown 正文 ----------
+
+    def _externalize(self, fields: Dict) -> Dict:
+        """把 markdownContent 写入 blob 存储，替换为 markdownRef 引用"""
+        if "markdownContent" not in fields:
+            return fields
+        fields = dict(fields)
+        content = fields.pop("markdownContent")
+        fields["markdownRef"] = self.blobs.put(content) if content else None
+        return fields
+
+    def _read_markdown(self, doc: Dict) -> Optional[str]:
+        ref = doc.get("markdownRef")
+        return self.blobs.get(ref) if ref else None
+
+    def get_markdown(self, document_id: str) -> Optional[str]:
+        """获取文档的 Markdown 正文"""
+        doc = self.get_document(document_id)
+        if doc is None:
+            return None
+        return self._read_markdown(doc)
+
+    # ---------- 业务方法 ----------
 
     def create_document(self, data: DocumentCreate, file_path: str, pdf_path: Optional[str] = None) -> Dict:
         """创建文档"""
-        documents = self._load_documents()
-
         doc = {
             "id": str(uuid.uuid4()),
             "title": data.title,
@@ -74,9 +390,8 @@ class DocumentStorage:
             "pdfPath": pdf_path,  # 转换后的 PDF 路径（如果原始文件不是 PDF）
         }
 
-        documents.append(doc)
-        self._save_documents(documents)
-        return doc
+        self._insert(doc)
+        return dict(doc)
 
     def create_document_with_markdown(
         self,
@@ -86,8 +401,6 @@ class DocumentStorage:
         markdown_content: Optional[str] = None
     ) -> Dict:
         """创建文档（带 Markdown 内容）"""
-        documents = self._load_documents()
-
         doc = {
             "id": str(uuid.uuid4()),
             "title": data.title,
@@ -106,17 +419,423 @@ class DocumentStorage:
             "pdfPath": pdf_path,
         }
 
-        documents.append(doc)
-        self._save_documents(documents)
+        self._insert(doc)
+        return dict(doc)
+
+    def update_document(self, document_id: str, data: DocumentUpdate) -> Optional[Dict]:
+        """更新文档"""
+        update_data = data.model_dump(exclude_unset=True)
+
+        # 先提交待写入的状态，避免其中的 markdownRef 覆盖本次修改
+        self.flush()
+
+        # 只允许更新以下字段
+        fields = {
+            key: update_data[key]
+            for key in ("markdownContent", "tags", "title", "folderId")
+            if key in update_data
+        }
+
+        return self._patch(document_id, fields)
+
+    def delete_document(self, document_id: str) -> bool:
+        """删除文档"""
+        doc = self.get_document(document_id)
+        if doc is None:
+            return False
+
+        # 删除文件
+        file_path = doc.get("filePath")
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+        # 先移出待写队列：其中的正文不再算作引用，随文档一起释放
+        with self._pending_lock:
+            pending = self._pending.pop(document_id, None)
+            self._remove(document_id)
+        if pending:
+            self._release_blob(pending.get("markdownRef"))
+        return True
+
+    def update_parse_status(
+        self,
+        document_id: str,
+        status: ParseStatus,
+        markdown_content: Optional[str] = None,
+        error_message: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """更新解析状态"""
+        fields = {
+            "parseStatus": status.value,
+            "parsed": status == ParseStatus.SUCCESS,
+        }
+
+        if markdown_content is not None:
+            fields["markdownContent"] = markdown_content
+
+        if error_message is not None:
+            fields["errorMessage"] = error_message
+
+        return self._patch_status(document_id, fields)
+
+    def update_chunked_status(self, document_id: str, chunked: bool = True) -> Optional[Dict]:
+        """更新分块状态"""
+        return self._patch_status(document_id, {"chunked": chunked})
+
+    def update_vectorize_status(
+        self, document_id: str, status: str, chunk_count: int = None
+    ) -> Optional[Dict]:
+        """更新向量化状态"""
+        fields = {"vectorizeStatus": status}
+        if status == "success":
+            fields["chunked"] = True
+        if chunk_count is not None:
+            fields["chunkCount"] = chunk_count
+        return self._patch_status(document_id, fields)
+
+
+class DocumentStorage(BaseDocumentStorage):
+    """
+    文档存储类（内存索引 + 追加写日志）
+
+    文档元数据全部常驻内存，按 id 和 folderId 建立索引；
+    每次变更只向 documents.log 追加一行，日志过长时在后台线程中
+    合并为新的 documents.json 快照。
+
+    多进程：写入前持有 documents.lock 上的排他锁并同步其他进程的变更，
+    写入后递增锁文件中的变更代数；读取前只比较代数，
+    代数变化时回放日志新增的部分，快照或日志被替换时整体重新加载。
+    """
+
+    def __init__(
+        self,
+        storage_dir: str = "./data",
+        compact_threshold: int = 1000,
+        flush_interval: float = 0.0,
+        max_pending: int = 0,
+    ):
+        super().__init__(flush_interval, max_pending)
+        self.storage_dir = storage_dir
+        self.documents_file = os.path.join(storage_dir, "documents.json")
+        self.log_file = os.path.join(storage_dir, "documents.log")
+        self.folders_file = os.path.join(storage_dir, "folders.json")
+        self.compact_threshold = compact_threshold
+        self._file_lock = InterProcessLock(os.path.join(storage_dir, "documents.lock"))
+        self._generation = 0  # 本进程内存状态对应的变更代数
+        self._documents_identity: Optional[tuple] = None
+        self._folders_identity: Optional[tuple] = None
+
+        self._lock = threading.RLock()
+        self._reset_index()
+        self.blobs = BlobStore(
+            os.path.join(storage_dir, "blobs"),
+            compression=settings.BLOB_COMPRESSION,
+        )
+        self._log = AppendLog(self.log_file)
+        self._compacting = False
+        with self._file_lock.exclusive():
+            self._ensure_storage_dir()
+            self.folders = self._load_folders()
+            self._load_documents()
+            self._generation = self._file_lock.generation()
+
+    def _reset_index(self):
+        """清空内存索引"""
+        self._documents: Dict[str, Dict] = {}  # id -> 文档（保持插入顺序）
+        self._folder_index: Dict[str, Dict[str, None]] = {}  # folderId -> 有序 id 集合
+        self._blob_refs: Dict[str, int] = {}  # markdownRef -> 引用计数
+        self._order: Dict[str, tuple] = {}  # id -> 排序键（上传时间, id）
+        self._sorted: Dict[Optional[str], List[tuple]] = {}  # folderId（None 表示全部）-> 有序排序键
+        self._search_index = DocumentSearchIndex()
+        self._folder_stats = FolderStats()
+        self._folder_versions = FolderVersions()
+        # 重新加载后版本号从 0 开始计数，以新的纪元区分
+        self._index_epoch = uuid.uuid4().hex[:8]
+
+    def _ensure_storage_dir(self):
+        """确保存储目录和数据文件存在"""
+        if not os.path.exists(self.documents_file):
+            with open(self.documents_file, "w", encoding="utf-8") as f:
+                json.dump([], f, ensure_ascii=False, indent=2)
+        if not os.path.exists(self.folders_file):
+            with open(self.folders_file, "w", encoding="utf-8") as f:
+                json.dump(_default_folders(), f, ensure_ascii=False, indent=2)
+
+    def _load_documents(self):
+        """加载快照并回放日志，重建内存索引"""
+        migrated = False
+        self._documents_identity = _file_identity(self.documents_file)
+        with open(self.documents_file, "r", encoding="utf-8") as f:
+            for doc in json.load(f):
+                migrated |= "markdownContent" in doc
+                self._index_put(self._externalize(doc))
+
+        for record in self._log.replay():
+            migrated |= "markdownContent" in record.get("doc", record.get("fields", {}))
+            self._apply(self._externalize_record(record))
+
+        # 旧数据中内联的 Markdown 已迁出，重写快照使其不再包含正文
+        if migrated:
+            logger.info("已将内联的 Markdown 正文迁移到独立文件")
+            self._compacting = True
+            threading.Thread(target=self._compact, daemon=True).start()
+
+    def _load_folders(self) -> List[Dict]:
+        """加载文件夹数据"""
+        self._folders_identity = _file_identity(self.folders_file)
+        with open(self.folders_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_folders(self):
+        """保存文件夹数据（原子替换，其他进程不会读到写了一半的文件）"""
+        write_snapshot(
+            self.folders_file,
+            json.dumps(self.folders, ensure_ascii=False, indent=2),
+        )
+        self._folders_identity = _file_identity(self.folders_file)
+
+    # ---------- 多进程同步 ----------
+
+    def _refresh(self):
+        """同步其他进程写入的变更（需持有文件锁）"""
+        generation = self._file_lock.generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if _file_identity(self.folders_file) != self._folders_identity:
+                self.folders = self._load_folders()
+
+            if (_file_identity(self.documents_file) != self._documents_identity
+                    or self._log.is_replaced()):
+                # 其他进程完成了压缩：重新加载快照和日志
+                self._log.close()
+                self._reset_index()
+                self._load_documents()
+            else:
+                for record in self._log.read_new():
+                    self._apply(record)
+            self._generation = generation
+
+    def _sync(self):
+        """读取前检查变更代数，其他进程有写入时才同步"""
+        if self._file_lock.generation() != self._generation:
+            with self._file_lock.exclusive():
+                self._refresh()
+
+    @contextmanager
+    def _write(self):
+        """
+        写入范围：持有文件锁，先同步其他进程的变更，结束后递增变更代数
+
+        加锁顺序固定为 待写队列锁 -> 文件锁 -> 进程内锁：flush、folder_stats、vector_version
+        持有待写队列锁时会读取已提交数据，所有写入都经过这里先取待写队列锁，不会反向加锁。
+        """
+        with self._pending_lock, self._file_lock.exclusive():
+            self._refresh()
+            with self._lock:
+                yield
+                self._generation = self._file_lock.bump()
+
+    # ---------- 内存索引 ----------
+
+    def _index_put(self, doc: Dict):
+        """写入文档并维护 folderId 索引和检索索引"""
+        old = self._documents.get(doc["id"])
+        key = sort_key(doc)
+        if old is not None:
+            self._folder_stats.remove(old)
+            if vector_changed(old, doc):
+                self._folder_versions.bump(old, doc)
+            if old.get("folderId") != doc.get("folderId") or self._order[doc["id"]] != key:
+                self._folder_index.get(old.get("folderId"), {}).pop(doc["id"], None)
+                self._unsort(old)
+                self._sort(doc)
+            self._unref_blob(old.get("markdownRef"))
+        else:
+            self._sort(doc)
+        self._ref_blob(doc.get("markdownRef"))
+        self._documents[doc["id"]] = doc
+        self._folder_index.setdefault(doc.get("folderId"), {})[doc["id"]] = None
+        self._search_index.add(doc)
+        self._folder_stats.add(doc)
+
+    def _index_delete(self, document_id: str) -> Optional[Dict]:
+        """删除文档并维护 folderId 索引和检索索引"""
+        doc = self._documents.pop(document_id, None)
+        if doc is not None:
+            self._folder_index.get(doc.get("folderId"), {}).pop(document_id, None)
+            self._unref_blob(doc.get("markdownRef"))
+            self._unsort(doc)
+            self._search_index.remove(document_id)
+            self._folder_stats.remove(doc)
+            self._folder_versions.bump(doc)
         return doc
 
-    def get_document(self, document_id: str) -> Optional[Dict]:
-        """获取单个文档"""
-        documents = self._load_documents()
-        for doc in documents:
-            if doc["id"] == document_id:
-                return doc
-        return None
+    def _sort(self, doc: Dict):
+        """把文档的排序键插入全部文档和所在文件夹的有序列表"""
+        key = sort_key(doc)
+        self._order[doc["id"]] = key
+        for scope in {None, doc.get("folderId")}:
+            bisect.insort(self._sorted.setdefault(scope, []), key)
+
+    def _unsort(self, doc: Dict):
+        key = self._order.pop(doc["id"], None)
+        if key is None:
+            return
+        for scope in {None, doc.get("folderId")}:
+            keys = self._sorted.get(scope, [])
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    def _ref_blob(self, ref: Optional[str]):
+        if ref:
+            self._blob_refs[ref] = self._blob_refs.get(ref, 0) + 1
+
+    def _unref_blob(self, ref: Optional[str]):
+        if ref:
+            count = self._blob_refs.get(ref, 0) - 1
+            if count > 0:
+                self._blob_refs[ref] = count
+            else:
+                self._blob_refs.pop(ref, None)
+
+    def _release_blob(self, ref: Optional[str]):
+        if not ref:
+            return
+        with self._pending_lock, self._file_lock.exclusive():
+            self._refresh()
+            with self._lock:
+                if ref not in self._blob_refs and ref not in self._pending_refs():
+                    self.blobs.delete(ref)
+
+    def _apply(self, record: Dict):
+        """把一条日志记录应用到内存状态"""
+        op = record.get("op")
+        if op == "put":
+            self._index_put(record["doc"])
+        elif op == "patch":
+            doc = self._documents.get(record["id"])
+            if doc is not None:
+                self._index_put({**doc, **record["fields"]})
+        elif op == "delete":
+            self._index_delete(record["id"])
+
+    # ---------- 持久化 ----------
+
+    def _externalize_record(self, record: Dict) -> Dict:
+        """对日志记录中的文档或字段做正文外置"""
+        if "doc" in record:
+            return {**record, "doc": self._externalize(record["doc"])}
+        if "fields" in record:
+            return {**record, "fields": self._externalize(record["fields"])}
+        return record
+
+    def _commit(self, record: Dict):
+        """应用变更并追加到日志"""
+        self._commit_many([record])
+
+    def _commit_many(self, records: List[Dict]) -> Dict[str, Dict]:
+        """
+        应用多条变更，并作为一次写入追加到日志
+
+        文档不存在的 patch 跳过（存在性在同一个写入范围内检查）。
+
+        Returns:
+            已应用的 put / patch 对应的文档 ID -> 应用后的文档
+        """
+        if not records:
+            return {}
+        # _write 先取待写队列锁，引用检查期间待写队列不变
+        with self._write():
+            old_refs = []
+            applied = []
+            for record in records:
+                if record.get("op") == "patch" and record["id"] not in self._documents:
+                    continue
+                record = self._externalize_record(record)
+                old = self._documents.get(record.get("id") or record.get("doc", {}).get("id"))
+                if old and old.get("markdownRef"):
+                    old_refs.append(old["markdownRef"])
+                self._apply(record)
+                applied.append(record)
+            self._log.append_many(applied)
+
+            # 不再被任何文档引用的正文文件随之删除（待写队列中的引用同样有效）
+            pending_refs = self._pending_refs()
+            for old_ref in old_refs:
+                if old_ref not in self._blob_refs and old_ref not in pending_refs:
+                    self.blobs.delete(old_ref)
+
+            if self._log.entry_count >= self.compact_threshold and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self._compact, daemon=True).start()
+
+            results = {}
+            for record in applied:
+                document_id = record.get("id") or record.get("doc", {}).get("id")
+                if document_id in self._documents:
+                    results[document_id] = dict(self._documents[document_id])
+            return results
+
+    def _insert(self, doc: Dict):
+        self._commit({"op": "put", "doc": doc})
+
+    def _patch(self, document_id: str, fields: Dict) -> Optional[Dict]:
+        """更新文档的部分字段"""
+        if not fields:
+            self._sync()
+            doc = self._documents.get(document_id)
+            return dict(doc) if doc is not None else None
+        return self._commit_many([{"op": "patch", "id": document_id, "fields": fields}]).get(document_id)
+
+    def _remove(self, document_id: str):
+        self._commit({"op": "delete", "id": document_id})
+
+    def _patch_many(self, patches: Dict[str, Dict]):
+        self._commit_many([
+            {"op": "patch", "id": document_id, "fields": fields}
+            for document_id, fields in patches.items()
+            if fields
+        ])
+
+    def _compact(self):
+        """后台压缩：把内存状态写成新快照，丢弃已合并的日志"""
+        try:
+            # 压缩期间持有文件锁，其他进程不会写入即将轮转的日志；
+            # 内存中的文档只会被整体替换、不会原地修改，
+            # 因此进程内的锁只需在取引用时持有，序列化放到锁外进行
+            with self._file_lock.exclusive():
+                self._refresh()
+                with self._lock:
+                    documents = list(self._documents.values())
+                    self._log.rotate()
+
+                write_snapshot(
+                    self.documents_file,
+                    json.dumps(documents, ensure_ascii=False, indent=2),
+                )
+                self._log.discard_rotated()
+                with self._lock:
+                    self._documents_identity = _file_identity(self.documents_file)
+                    self._generation = self._file_lock.bump()
+            logger.info(f"文档日志压缩完成，共 {len(documents)} 个文档")
+        except Exception as e:
+            logger.error(f"文档日志压缩失败: {e}")
+        finally:
+            self._compacting = False
+
+    # ---------- 查询 ----------
+
+    def get_document(self, document_id: str, with_content: bool = False) -> Optional[Dict]:
+        self._sync()
+        doc = self._documents.get(document_id)
+        if doc is None:
+            return None
+        doc = self._overlay(dict(doc))
+        if with_content:
+            doc["markdownContent"] = self._read_markdown(doc)
+        return doc
 
     def list_documents(
         self,
@@ -125,134 +844,573 @@ class DocumentStorage:
         search: Optional[str] = None,
         skip: int = 0,
         limit: int = 100,
+        cursor: Optional[str] = None,
     ) -> tuple[List[Dict], int]:
-        """列出文档"""
-        documents = self._load_documents()
+        after = decode_cursor(cursor) if cursor else None
+        self._sync()
+        with self._lock:
+            scope = self._folder_index.get(folder, {}) if folder else self._documents
 
-        # 筛选
-        if folder:
-            documents = [doc for doc in documents if doc["folderId"] == folder]
-        if tag:
-            documents = [doc for doc in documents if tag in doc.get("tags", [])]
-        if search:
-            search_lower = search.lower()
-            documents = [
-                doc
-                for doc in documents
-                if search_lower in doc["title"].lower()
-                or search_lower in doc["fileName"].lower()
-            ]
+            # 无筛选条件：在有序排序键上二分定位游标，直接切片
+            if not tag and not search:
+                keys = self._sorted.get(folder or None, [])
+                start = skip + (bisect.bisect_right(keys, after) if after else 0)
+                documents = [self._documents[doc_id] for _, doc_id in keys[start:start + limit]]
+                total = len(keys)
+            else:
+                # 有筛选条件：在倒排表上求交集，只对当前页的文档取值
+                if tag:
+                    tagged = self._search_index.tagged(tag)
+                    matched = tagged & scope.keys() if folder else set(tagged)
+                else:
+                    matched = scope.keys()
+                if search:
+                    matched = self._search_index.search(search, within=matched)
 
-        total = len(documents)
+                total = len(matched)
+                if after:
+                    matched = [doc_id for doc_id in matched if self._order[doc_id] > after]
+                page = heapq.nsmallest(skip + limit, matched, key=self._order.__getitem__)[skip:]
+                documents = [self._documents[doc_id] for doc_id in page]
 
-        # 分页
-        documents = documents[skip : skip + limit]
+        # 状态字段不参与筛选，叠加待写队列不影响结果集
+        return [self._overlay(dict(doc)) for doc in documents], total
 
-        return documents, total
+    def _data_version(self) -> str:
+        # 变更代数在每次写入（包括其他进程的写入）后递增
+        self._sync()
+        return str(self._generation)
 
-    def update_document(self, document_id: str, data: DocumentUpdate) -> Optional[Dict]:
-        """更新文档"""
-        documents = self._load_documents()
+    def _stored_folder_stats(self, folder_id: str) -> Dict[str, int]:
+        self._sync()
+        with self._lock:
+            return self._folder_stats.get(folder_id)
 
-        for i, doc in enumerate(documents):
-            if doc["id"] == document_id:
-                update_data = data.model_dump(exclude_unset=True)
+    def _stored_document(self, document_id: str) -> Optional[Dict]:
+        return self._documents.get(document_id)
 
-                # 处理特殊字段
-                if "markdownContent" in update_data:
-                    doc["markdownContent"] = update_data["markdownContent"]
+    def folder_document_ids(self, folder_ids: List[str]) -> List[str]:
+        self._sync()
+        with self._lock:
+            return [
+                document_id
+                for folder_id in dict.fromkeys(folder_ids)
+                for document_id in self._folder_index.get(folder_id, {})
+            ]
 
-                if "tags" in update_data:
-                    doc["tags"] = update_data["tags"]
+    def _document_folders(self, document_ids: List[str]) -> set:
+        self._sync()
+        with self._lock:
+            return {
+                self._documents[document_id].get("folderId")
+                for document_id in document_ids
+                if document_id in self._documents
+            }
 
-                if "title" in update_data:
-                    doc["title"] = update_data["title"]
+    def _stored_folder_version(self, folder_id: Optional[str]) -> str:
+        with self._lock:
+            return f"{self._index_epoch}.{self._folder_versions.get(folder_id)}"
 
-                if "folderId" in update_data:
-                    doc["folderId"] = update_data["folderId"]
+    # ---------- 文件夹 ----------
 
-                documents[i] = doc
-                self._save_documents(documents)
-                return doc
+    def list_folders(self) -> List[Dict]:
+        self._sync()
+        return [dict(folder) for folder in self.folders]
 
+    def get_folder(self, folder_id: str) -> Optional[Dict]:
+        self._sync()
+        for folder in self.folders:
+            if folder["id"] == folder_id:
+                return dict(folder)
         return None
 
-    def delete_document(self, document_id: str) -> bool:
-        """删除文档"""
-        documents = self._load_documents()
+    def create_folder(self, name: str, parent_id: Optional[str] = None) -> Dict:
+        now = datetime.now().isoformat()
+        folder = {
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "parentId": parent_id,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        with self._write():
+            self.folders.append(folder)
+            self._save_folders()
+        return dict(folder)
 
-        for i, doc in enumerate(documents):
-            if doc["id"] == document_id:
-                # 删除文件
-                file_path = doc.get("filePath")
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
+    def delete_folder(self, folder_id: str) -> bool:
+        with self._write():
+            folders = [f for f in self.folders if f["id"] != folder_id]
+            if len(folders) == len(self.folders):
+                return False
+            self.folders = folders
+            self._save_folders()
+            return True
 
-                documents.pop(i)
-                self._save_documents(documents)
-                return True
+    def touch_folder(self, folder_id: str):
+        with self._write():
+            for folder in self.folders:
+                if folder["id"] == folder_id:
+                    folder["updatedAt"] = datetime.now().isoformat()
+                    self._save_folders()
+                    return
 
-        return False
 
-    def update_parse_status(
+class SQLiteDocumentStorage(BaseDocumentStorage):
+    """
+    文档存储类（SQLite）
+
+    文档完整记录以 JSON 存在 data 列中，folderId、parseStatus、
+    vectorizeStatus、updatedAt 等筛选字段单独成列并建索引，标签拆到
+    document_tags 表，标题和文件名的 n-gram 倒排表存在 document_grams 表，
+    各文件夹的统计计数存在 folder_stats 表，随文档写入在同一事务中增减。
+    每次写入都在 BEGIN IMMEDIATE 事务中完成，多个写入者之间不会互相覆盖。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        folderId TEXT,
+        title TEXT NOT NULL DEFAULT '',
+        fileName TEXT NOT NULL DEFAULT '',
+        parseStatus TEXT,
+        vectorizeStatus TEXT,
+        markdownRef TEXT,
+        uploadTime TEXT,
+        updatedAt TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_documents_folder ON documents (folderId, seq);
+    CREATE INDEX IF NOT EXISTS idx_documents_parse_status ON documents (parseStatus);
+    CREATE INDEX IF NOT EXISTS idx_documents_vectorize_status ON documents (vectorizeStatus);
+    CREATE INDEX IF NOT EXISTS idx_documents_updated_at ON documents (updatedAt);
+    CREATE INDEX IF NOT EXISTS idx_documents_markdown_ref ON documents (markdownRef);
+    CREATE INDEX IF NOT EXISTS idx_documents_upload_time ON documents (uploadTime, id);
+    CREATE INDEX IF NOT EXISTS idx_documents_folder_upload_time ON documents (folderId, uploadTime, id);
+
+    CREATE TABLE IF NOT EXISTS document_tags (
+        document_id TEXT NOT NULL,
+        tag TEXT NOT NULL,
+        PRIMARY KEY (document_id, tag)
+    );
+    CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags (tag, document_id);
+
+    CREATE TABLE IF NOT EXISTS document_grams (
+        gram TEXT NOT NULL,
+        document_id TEXT NOT NULL,
+        PRIMARY KEY (gram, document_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_document_grams_document ON document_grams (document_id);
+
+    CREATE TABLE IF NOT EXISTS folder_stats (
+        folderId TEXT PRIMARY KEY,
+        documentCount INTEGER NOT NULL DEFAULT 0,
+        parsedCount INTEGER NOT NULL DEFAULT 0,
+        vectorizedCount INTEGER NOT NULL DEFAULT 0,
+        failedCount INTEGER NOT NULL DEFAULT 0,
+        chunkCount INTEGER NOT NULL DEFAULT 0,
+        totalBytes INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS folders (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        parentId TEXT,
+        createdAt TEXT,
+        updatedAt TEXT
+    );
+    """
+
+    def __init__(
         self,
-        document_id: str,
-        status: ParseStatus,
-        markdown_content: Optional[str] = None,
-        error_message: Optional[str] = None,
-    ) -> Optional[Dict]:
-        """更新解析状态"""
-        documents = self._load_documents()
+        db_path: str,
+        storage_dir: str = "./data",
+        flush_interval: float = 0.0,
+        max_pending: int = 0,
+    ):
+        super().__init__(flush_interval, max_pending)
+        self.storage_dir = storage_dir
+        self.db = get_database(db_path)
+        self.db.executescript(self.SCHEMA)
+        self.blobs = BlobStore(
+            os.path.join(storage_dir, "blobs"),
+            compression=settings.BLOB_COMPRESSION,
+        )
+        self._migrate_from_json()
+        self._build_gram_index()
+        self._build_folder_stats()
 
-        for i, doc in enumerate(documents):
-            if doc["id"] == document_id:
-                doc["parseStatus"] = status.value
-                doc["parsed"] = status == ParseStatus.SUCCESS
+    def _migrate_from_json(self):
+        """一次性从 JSON 存储迁移文档和文件夹"""
+        if self.db.get_meta("migrated:documents"):
+            return
 
-                if markdown_content is not None:
-                    doc["markdownContent"] = markdown_content
+        with self.db.transaction() as conn:
+            if self.db.get_meta("migrated:documents"):
+                return
 
-                if error_message is not None:
-                    doc["errorMessage"] = error_message
+            documents_file = os.path.join(self.storage_dir, "documents.json")
+            if os.path.exists(documents_file):
+                # 借助 JSON 存储回放快照和日志，并把内联正文迁移到 blob
+                json_storage = DocumentStorage(self.storage_dir)
+                documents, _ = json_storage.list_documents(limit=len(json_storage._documents))
+                for doc in documents:
+                    self._write_row(conn, doc, insert=True)
+                for folder in json_storage.list_folders():
+                    self._write_folder(conn, folder)
+                logger.info(f"已从 JSON 迁移 {len(documents)} 个文档到 SQLite")
+            elif not conn.execute("SELECT 1 FROM folders LIMIT 1").fetchone():
+                for folder in _default_folders():
+                    self._write_folder(conn, folder)
 
-                documents[i] = doc
-                self._save_documents(documents)
-                return doc
+            self.db.set_meta("migrated:documents", datetime.now().isoformat())
 
-        return None
+    def _build_gram_index(self):
+        """为建立倒排表之前写入的文档补建 n-gram 索引"""
+        if self.db.get_meta("index:document_grams"):
+            return
 
-    def update_chunked_status(self, document_id: str, chunked: bool = True) -> Optional[Dict]:
-        """更新分块状态"""
-        documents = self._load_documents()
+        with self.db.transaction() as conn:
+            if self.db.get_meta("index:document_grams"):
+                return
+            conn.execute("DELETE FROM document_grams")
+            rows = conn.execute("SELECT id, title, fileName FROM documents").fetchall()
+            for row in rows:
+                self._write_grams(conn, row["id"], row["title"], row["fileName"])
+            self.db.set_meta("index:document_grams", datetime.now().isoformat())
 
-        for i, doc in enumerate(documents):
-            if doc["id"] == document_id:
-                doc["chunked"] = chunked
-                documents[i] = doc
-                self._save_documents(documents)
-                return doc
+    def _build_folder_stats(self):
+        """为建立统计表之前写入的文档补建文件夹统计"""
+        if self.db.get_meta("index:folder_stats"):
+            return
 
-        return None
+        with self.db.transaction() as conn:
+            if self.db.get_meta("index:folder_stats"):
+                return
+            conn.execute("DELETE FROM folder_stats")
+            for row in conn.execute("SELECT data FROM documents").fetchall():
+                self._add_folder_stats(conn, json.loads(row["data"]))
+            self.db.set_meta("index:folder_stats", datetime.now().isoformat())
 
-    def update_vectorize_status(
-        self, document_id: str, status: str, chunk_count: int = None
-    ) -> Optional[Dict]:
-        """更新向量化状态"""
-        documents = self._load_documents()
-
-        for i, doc in enumerate(documents):
-            if doc["id"] == document_id:
-                doc["vectorizeStatus"] = status
-                if status == "success":
-                    doc["chunked"] = True
-                if chunk_count is not None:
-                    doc["chunkCount"] = chunk_count
-                documents[i] = doc
-                self._save_documents(documents)
-                return doc
+    def _add_folder_stats(self, conn, doc: Dict, sign: int = 1):
+        """把文档计入（sign=-1 时移出）所在文件夹的统计"""
+        delta = document_stats(doc)
+        columns = ", ".join(STAT_FIELDS)
+        updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in STAT_FIELDS)
+        conn.execute(
+            f"INSERT INTO folder_stats (folderId, {columns}) VALUES (?{', ?' * len(STAT_FIELDS)}) "
+            f"ON CONFLICT(folderId) DO UPDATE SET {updates}",
+            [doc.get("folderId") or ""] + [sign * delta[field] for field in STAT_FIELDS],
+        )
 
-        return None
+    def _write_grams(self, conn, document_id: str, title: str, file_name: str):
+        """重建文档标题和文件名的 n-gram 索引"""
+        conn.execute("DELETE FROM document_grams WHERE document_id = ?", (document_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO document_grams (gram, document_id) VALUES (?, ?)",
+            [(gram, document_id) for gram in ngrams(title or "") | ngrams(file_name or "")],
+        )
+
+    def _write_row(self, conn, doc: Dict, insert: bool = False, old: Optional[Dict] = None):
+        """
+        写入文档行及其标签
+
+        传入更新前的记录 old 时，标题和文件名未变化则不重建 n-gram 索引。
+        """
+        now = datetime.now().isoformat()
+        values = (
+            doc.get("folderId"),
+            doc.get("title", ""),
+            doc.get("fileName", ""),
+            doc.get("parseStatus"),
+            doc.get("vectorizeStatus"),
+            doc.get("markdownRef"),
+            doc.get("uploadTime"),
+            now,
+            json.dumps(doc, ensure_ascii=False),
+            doc["id"],
+        )
+        if insert:
+            conn.execute(
+                "INSERT INTO documents (folderId, title, fileName, parseStatus, vectorizeStatus, "
+                "markdownRef, uploadTime, updatedAt, data, id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values,
+            )
+        else:
+            conn.execute(
+                "UPDATE documents SET folderId = ?, title = ?, fileName = ?, parseStatus = ?, "
+                "vectorizeStatus = ?, markdownRef = ?, uploadTime = ?, updatedAt = ?, data = ? "
+                "WHERE id = ?",
+                values,
+            )
+        conn.execute("DELETE FROM document_tags WHERE document_id = ?", (doc["id"],))
+        conn.executemany(
+            "INSERT OR IGNORE INTO document_tags (document_id, tag) VALUES (?, ?)",
+            [(doc["id"], tag) for tag in doc.get("tags") or []],
+        )
+        if old is None or (old.get("title"), old.get("fileName")) != (doc.get("title"), doc.get("fileName")):
+            self._write_grams(conn, doc["id"], doc.get("title"), doc.get("fileName"))
+        if old is None:
+            self._add_folder_stats(conn, doc)
+        elif (old.get("folderId"), document_stats(old)) != (doc.get("folderId"), document_stats(doc)):
+            self._add_folder_stats(conn, old, -1)
+            self._add_folder_stats(conn, doc)
+        if vector_changed(old, doc):
+            self._bump_folder_version(conn, old, doc)
+
+    def _write_folder(self, conn, folder: Dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO folders (id, name, parentId, createdAt, updatedAt) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                folder["id"],
+                folder["name"],
+                folder.get("parentId"),
+                folder.get("createdAt"),
+                folder.get("updatedAt"),
+            ),
+        )
+
+    def _release_blob(self, ref: Optional[str]):
+        """正文不再被任何文档（包括待写队列）引用时删除文件"""
+        if not ref:
+            return
+        with self._pending_lock:
+            if ref in self._pending_refs():
+                return
+            row = self.db.execute(
+                "SELECT 1 FROM documents WHERE markdownRef = ? LIMIT 1", (ref,)
+            ).fetchone()
+            if not row:
+                self.blobs.delete(ref)
+
+    # ---------- 写入原语 ----------
+
+    def _bump_version(self, conn):
+        """文档数据版本号加一（在写事务中调用）"""
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version:documents', 1) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+        )
+
+    def _bump_folder_version(self, conn, *docs: Dict):
+        """文档所在文件夹的向量数据版本号加一（在写事务中调用）"""
+        for folder_id in {doc.get("folderId") for doc in docs}:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, 1) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                (f"version:folder:{folder_id or ''}",),
+            )
+
+    def _insert(self, doc: Dict):
+        doc = self._externalize(doc)
+        with self.db.transaction() as conn:
+            self._write_row(conn, doc, insert=True)
+            self._bump_version(conn)
+
+    def _patch(self, document_id: str, fields: Dict) -> Optional[Dict]:
+        fields = self._externalize(fields)
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM documents WHERE id = ?", (document_id,)
+            ).fetchone()
+            if not row:
+                return None
+            old = json.loads(row["data"])
+            if not fields:
+                return old
+            doc = {**old, **fields}
+            self._write_row(conn, doc, old=old)
+            self._bump_version(conn)
+
+        if old.get("markdownRef") != doc.get("markdownRef"):
+            self._release_blob(old.get("markdownRef"))
+        return doc
+
+    def _remove(self, document_id: str):
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT markdownRef, data FROM documents WHERE id = ?", (document_id,)
+            ).fetchone()
+            conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+            conn.execute("DELETE FROM document_tags WHERE document_id = ?", (document_id,))
+            conn.execute("DELETE FROM document_grams WHERE document_id = ?", (document_id,))
+            if row:
+                old = json.loads(row["data"])
+                self._add_folder_stats(conn, old, -1)
+                self._bump_folder_version(conn, old)
+                self._bump_version(conn)
+        if row:
+            self._release_blob(row["markdownRef"])
+
+    def _patch_many(self, patches: Dict[str, Dict]):
+        with self.db.transaction():
+            for document_id, fields in patches.items():
+                self._patch(document_id, fields)
+
+    # ---------- 查询 ----------
+
+    def get_document(self, document_id: str, with_content: bool = False) -> Optional[Dict]:
+        row = self.db.execute(
+            "SELECT data FROM documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        if not row:
+            return None
+        doc = self._overlay(json.loads(row["data"]))
+        if with_content:
+            doc["markdownContent"] = self._read_markdown(doc)
+        return doc
+
+    def list_documents(
+        self,
+        folder: Optional[str] = None,
+        tag: Optional[str] = None,
+        search: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> tuple[List[Dict], int]:
+        after = decode_cursor(cursor) if cursor else None
+        conditions = []
+        params: List = []
+        if folder:
+            conditions.append("folderId = ?")
+            params.append(folder)
+        if tag:
+            conditions.append("id IN (SELECT document_id FROM document_tags WHERE tag = ?)")
+            params.append(tag)
+        if search:
+            # 先用 n-gram 倒排表缩小候选集，再用子串匹配剔除误命中
+            grams = sorted(query_grams(search))
+            placeholders = ", ".join("?" * len(grams))
+            conditions.append(
+                f"id IN (SELECT document_id FROM document_grams WHERE gram IN ({placeholders}) "
+                "GROUP BY document_id HAVING COUNT(*) = ?)"
+            )
+            params.extend(grams + [len(grams)])
+            # 按 str.lower() 匹配，与 n-gram 倒排表和 JSON 后端一致
+            conditions.append("(instr(py_lower(title), ?) > 0 OR instr(py_lower(fileName), ?) > 0)")
+            params.extend([search.lower(), search.lower()])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        total = self.db.execute(
+            f"SELECT COUNT(*) AS n FROM documents {where}", params
+        ).fetchone()["n"]
+        if after:
+            # 游标条件走 (folderId, uploadTime, id) 索引，不随页数增加而变慢
+            conditions.append("(uploadTime, id) > (?, ?)")
+            params.extend(after)
+            where = f"WHERE {' AND '.join(conditions)}"
+        rows = self.db.execute(
+            f"SELECT data FROM documents {where} ORDER BY uploadTime, id LIMIT ? OFFSET ?",
+            params + [limit, skip],
+        ).fetchall()
+
+        return [self._overlay(json.loads(row["data"])) for row in rows], total
+
+    def _data_version(self) -> str:
+        return self.db.get_meta("version:documents") or "0"
+
+    def _stored_folder_stats(self, folder_id: str) -> Dict[str, int]:
+        row = self.db.execute(
+            f"SELECT {', '.join(STAT_FIELDS)} FROM folder_stats WHERE folderId = ?",
+            (folder_id,),
+        ).fetchone()
+        return {field: row[field] for field in STAT_FIELDS} if row else empty_stats()
+
+    def _stored_document(self, document_id: str) -> Optional[Dict]:
+        row = self.db.execute(
+            "SELECT data FROM documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def folder_document_ids(self, folder_ids: List[str]) -> List[str]:
+        folder_ids = list(dict.fromkeys(folder_ids))
+        if not folder_ids:
+            return []
+        rows = self.db.execute(
+            f"SELECT id FROM documents WHERE folderId IN ({', '.join('?' * len(folder_ids))})",
+            folder_ids,
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+    def _document_folders(self, document_ids: List[str]) -> set:
+        folders = set()
+        ids = list(document_ids)
+        for start in range(0, len(ids), 500):  # 受 SQLite 参数个数限制分批查询
+            part = ids[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT DISTINCT folderId FROM documents WHERE id IN ({', '.join('?' * len(part))})",
+                part,
+            ).fetchall()
+            folders.update(row["folderId"] for row in rows)
+        return folders
+
+    def _stored_folder_version(self, folder_id: Optional[str]) -> str:
+        return self.db.get_meta(f"version:folder:{folder_id or ''}") or "0"
+
+    # ---------- 文件夹 ----------
+
+    def list_folders(self) -> List[Dict]:
+        rows = self.db.execute(
+            "SELECT id, name, parentId, createdAt, updatedAt FROM folders ORDER BY seq"
+        ).fetchall()
+        return [self._folder_dict(row) for row in rows]
+
+    def get_folder(self, folder_id: str) -> Optional[Dict]:
+        row = self.db.execute(
+            "SELECT id, name, parentId, createdAt, updatedAt FROM folders WHERE id = ?",
+            (folder_id,),
+        ).fetchone()
+        return self._folder_dict(row) if row else None
+
+    def _folder_dict(self, row) -> Dict:
+        folder = dict(row)
+        if folder.get("updatedAt") is None:
+            folder.pop("updatedAt")
+        return folder
+
+    def create_folder(self, name: str, parent_id: Optional[str] = None) -> Dict:
+        now = datetime.now().isoformat()
+        folder = {
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "parentId": parent_id,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        with self.db.transaction() as conn:
+            self._write_folder(conn, folder)
+        return folder
+
+    def delete_folder(self, folder_id: str) -> bool:
+        with self.db.transaction() as conn:
+            cursor = conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+        return cursor.rowcount > 0
+
+    def touch_folder(self, folder_id: str):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "UPDATE folders SET updatedAt = ? WHERE id = ?",
+                (datetime.now().isoformat(), folder_id),
+            )
+
+
+def create_document_storage() -> BaseDocumentStorage:
+    """按配置创建文档存储"""
+    if settings.STORAGE_BACKEND == "sqlite":
+        return SQLiteDocumentStorage(
+            settings.SQLITE_PATH,
+            flush_interval=settings.STATUS_FLUSH_INTERVAL,
+            max_pending=settings.STATUS_FLUSH_MAX_PENDING,
+        )
+    return DocumentStorage(
+        flush_interval=settings.STATUS_FLUSH_INTERVAL,
+        max_pending=settings.STATUS_FLUSH_MAX_PENDING,
+    )
 
 
 # 全局存储实例
-storage = DocumentStorage()
+storage = create_document_storage()
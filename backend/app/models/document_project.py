@@ -1,37 +1,238 @@
 """
-文档项目数据模型（使用 JSON 文件存储）
+文档项目数据模型（每个项目一个目录或 SQLite 存储，由 Settings.STORAGE_BACKEND 选择）
 """
+import hashlib
 import json
+import logging
 import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Optional, Dict
 import uuid
 
+from app.core.config import settings
+from app.models.append_log import write_snapshot
+from app.models.database import get_database
+from app.models.file_lock import InterProcessLock
+from app.models.paragraph_versions import (
+    expand_versions,
+    pack_versions,
+    push_version,
+    replace_content,
+    strip_versions,
+)
+
+logger = logging.getLogger(__name__)
+
 
 class DocumentProjectStorage:
-    """文档项目存储类（基于 JSON 文件）"""
+    """
+    文档项目存储类（每个项目一个目录）
+
+    项目元数据（标题、大纲等）存放在 projects/{id}/project.json，
+    每个章节单独存放在 projects/{id}/sections/ 下。修改段落或生成章节
+    只重写对应章节文件和很小的元数据文件；写入按项目加锁，
+    不同项目之间互不阻塞。
+
+    多进程：项目锁同时是 projects/.locks/ 下的文件锁，读-改-写期间
+    从磁盘读取最新的元数据；每次写入元数据后递增 projects.lock 中的
+    变更代数，其他进程读取前发现代数变化，只重新加载有变化的 project.json。
+    """
 
     def __init__(self, storage_dir: str = "./data"):
         self.storage_dir = storage_dir
-        self.projects_file = os.path.join(storage_dir, "document_projects.json")
-        self._ensure_storage_dir()
+        self.projects_dir = os.path.join(storage_dir, "projects")
+        self._lock = threading.Lock()
+        self._project_locks: Dict[str, list] = {}  # 项目 ID -> [锁, 持有或等待的操作数]
+        self._meta: Dict[str, Dict] = {}  # id -> 项目元数据（不含章节内容）
+        self._meta_identity: Dict[str, tuple] = {}  # id -> project.json 的 (inode, 修改时间)
+        self._store_lock = InterProcessLock(os.path.join(storage_dir, "projects.lock"))
+        self._generation = 0  # 本进程元数据缓存对应的变更代数
+        with self._store_lock.exclusive():
+            self._ensure_storage_dir()
+            self._generation = self._store_lock.generation()
+            self._load_meta()
 
     def _ensure_storage_dir(self):
-        """确保存储目录存在"""
-        os.makedirs(self.storage_dir, exist_ok=True)
-        if not os.path.exists(self.projects_file):
-            with open(self.projects_file, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-
-    def _load_projects(self) -> List[Dict]:
-        """加载项目数据"""
-        with open(self.projects_file, "r", encoding="utf-8") as f:
+        """确保存储目录存在，必要时从旧的 document_projects.json 迁移"""
+        if not os.path.isdir(self.projects_dir):
+            self._migrate_from_json()
+            os.makedirs(self.projects_dir, exist_ok=True)
+
+    def _migrate_from_json(self):
+        """一次性把 document_projects.json 拆分为每个项目一个目录"""
+        projects_file = os.path.join(self.storage_dir, "document_projects.json")
+        if not os.path.exists(projects_file):
+            return
+
+        with open(projects_file, "r", encoding="utf-8") as f:
+            projects = json.load(f)
+
+        # 先写到临时目录，全部完成后再改名，中途失败不会留下半迁移的数据
+        final_dir, self.projects_dir = self.projects_dir, f"{self.projects_dir}.tmp"
+        shutil.rmtree(self.projects_dir, ignore_errors=True)
+        try:
+            for project in projects:
+                self._write_project(project)
+        finally:
+            self.projects_dir = final_dir
+        os.replace(f"{final_dir}.tmp", final_dir)
+        logger.info(f"已将 {len(projects)} 个文档项目拆分为独立目录")
+
+    def _load_meta(self):
+        """
+        加载所有项目的元数据
+
+        已缓存且 project.json 未变化的项目不会重新读取，
+        因此也用于同步其他进程的写入。
+        """
+        project_ids = set()
+        for project_id in os.listdir(self.projects_dir):
+            if project_id.startswith("."):
+                continue
+            identity = self._identity(project_id)
+            if identity is None:
+                continue
+            project_ids.add(project_id)
+            if self._meta_identity.get(project_id) != identity:
+                self._read_meta(project_id)
+        for project_id in list(self._meta):
+            if project_id not in project_ids:
+                self._meta.pop(project_id, None)
+                self._meta_identity.pop(project_id, None)
+
+    def _identity(self, project_id: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._meta_file(project_id))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_meta(self, project_id: str) -> Optional[Dict]:
+        """从磁盘读取项目元数据并更新缓存"""
+        identity = self._identity(project_id)
+        if identity is None:
+            self._meta.pop(project_id, None)
+            self._meta_identity.pop(project_id, None)
+            return None
+        with open(self._meta_file(project_id), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._meta[project_id] = meta
+        self._meta_identity[project_id] = identity
+        return meta
+
+    def _sync(self):
+        """读取前检查变更代数，其他进程有写入时才重新加载元数据"""
+        generation = self._store_lock.generation()
+        if generation != self._generation:
+            self._load_meta()
+            self._generation = generation
+
+    def _changed(self):
+        """元数据写入完成后递增变更代数，通知其他进程"""
+        with self._store_lock.exclusive():
+            self._store_lock.bump()
+
+    # ---------- 文件布局 ----------
+
+    def _project_dir(self, project_id: str) -> str:
+        return os.path.join(self.projects_dir, project_id)
+
+    def _meta_file(self, project_id: str) -> str:
+        return os.path.join(self._project_dir(project_id), "project.json")
+
+    def _section_file(self, project_id: str, section_id: str) -> str:
+        # 章节 ID 一般形如 node-1 / section-2，其他字符的 ID 用哈希作文件名
+        if not re.fullmatch(r"[\w.-]{1,100}", section_id) or section_id.startswith("."):
+            section_id = hashlib.sha1(section_id.encode("utf-8")).hexdigest()
+        return os.path.join(self._project_dir(project_id), "sections", f"{section_id}.json")
+
+    def _write_json(self, path: str, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_snapshot(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+    def _write_project(self, project: Dict):
+        """写入完整项目（元数据 + 全部章节）"""
+        meta = {k: v for k, v in project.items() if k != "sections"}
+        meta["sectionIds"] = list(project.get("sections", {}))
+        for section_id, section in project.get("sections", {}).items():
+            self._write_json(self._section_file(project["id"], section_id), section)
+        self._save_meta(project["id"], meta)
+
+    def _save_meta(self, project_id: str, meta: Dict):
+        """写入项目元数据并更新缓存"""
+        self._write_json(self._meta_file(project_id), meta)
+        self._meta[project_id] = meta
+        self._meta_identity[project_id] = self._identity(project_id)
+
+    @contextmanager
+    def _project_lock(self, project_id: str):
+        """
+        项目级写锁（跨进程，同一线程可重入）
+
+        锁文件只在有操作持有或等待时打开，最后一个操作退出后关闭，
+        长时间运行的 worker 不会为访问过的每个项目常驻一个文件描述符。
+        同一进程内并发的操作共用一个锁对象（flock 对同一文件的两次打开互斥，嵌套时会自锁）。
+        """
+        with self._lock:
+            entry = self._project_locks.get(project_id)
+            if entry is None:
+                lock = InterProcessLock(os.path.join(self.projects_dir, ".locks", f"{project_id}.lock"))
+                entry = self._project_locks[project_id] = [lock, 0]
+            entry[1] += 1
+        try:
+            with entry[0].exclusive():
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._project_locks[project_id]
+                    entry[0].close()
+
+    # ---------- 章节读写 ----------
+
+    def _get_section(self, project_id: str, section_id: str) -> Optional[Dict]:
+        """读取单个章节"""
+        path = self._section_file(project_id, section_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
 
-    def _save_projects(self, projects: List[Dict]):
-        """保存项目数据"""
-        with open(self.projects_file, "w", encoding="utf-8") as f:
-            json.dump(projects, f, ensure_ascii=False, indent=2)
+    def _put_sections(self, project_id: str, sections: Dict[str, Dict]) -> bool:
+        """写入（新增或覆盖）若干章节，并更新项目的 updatedAt"""
+        with self._project_lock(project_id):
+            meta = self._read_meta(project_id)
+            if meta is None:
+                return False
+            meta = dict(meta)
+            section_ids = list(meta.get("sectionIds", []))
+            for section_id, section in sections.items():
+                self._write_json(self._section_file(project_id, section_id), section)
+                if section_id not in section_ids:
+                    section_ids.append(section_id)
+            meta["sectionIds"] = section_ids
+            meta["updatedAt"] = datetime.now().isoformat()
+            self._save_meta(project_id, meta)
+        self._changed()
+        return True
+
+    def _update_meta(self, project_id: str, fields: Dict) -> bool:
+        """更新项目元数据字段"""
+        with self._project_lock(project_id):
+            meta = self._read_meta(project_id)
+            if meta is None:
+                return False
+            meta = {**meta, **fields, "updatedAt": datetime.now().isoformat()}
+            self._save_meta(project_id, meta)
+        self._changed()
+        return True
+
+    # ---------- 业务方法 ----------
 
     def create_project(
         self,
@@ -41,8 +242,6 @@ class DocumentProjectStorage:
         content: Optional[List[Dict]] = None,
     ) -> Dict:
         """创建项目"""
-        projects = self._load_projects()
-
         # 初始化 sections
         sections = {}
 
@@ -64,17 +263,52 @@ class DocumentProjectStorage:
             "updatedAt": datetime.now().isoformat(),
         }
 
-        projects.append(project)
-        self._save_projects(projects)
+        with self._project_lock(project["id"]):
+            self._write_project(project)
+        self._changed()
         return project
 
     def get_project(self, project_id: str) -> Optional[Dict]:
-        """获取单个项目"""
-        projects = self._load_projects()
-        for project in projects:
-            if project["id"] == project_id:
-                return project
-        return None
+        """
+        获取单个项目
+
+        段落只包含当前内容和版本数量（versionCount），
+        历史版本通过 get_paragraph_versions 按需读取。
+        """
+        self._sync()
+        project = self._load_project(project_id)
+        if project is None:
+            return None
+        project["sections"] = {
+            section_id: self._public_section(section)
+            for section_id, section in project["sections"].items()
+        }
+        return project
+
+    @staticmethod
+    def _public_section(section: Dict) -> Dict:
+        """去掉章节中各段落的历史版本"""
+        if not section.get("paragraphs"):
+            return section
+        return {
+            **section,
+            "paragraphs": [strip_versions(para) for para in section["paragraphs"]],
+        }
+
+    def _load_project(self, project_id: str) -> Optional[Dict]:
+        """读取项目的存储形式（包含差量编码的历史版本）"""
+        meta = self._meta.get(project_id)
+        if meta is None:
+            return None
+
+        project = {k: v for k, v in meta.items() if k != "sectionIds"}
+        sections = {}
+        for section_id in meta.get("sectionIds", []):
+            section = self._get_section(project_id, section_id)
+            if section is not None:
+                sections[section_id] = section
+        project["sections"] = sections
+        return project
 
     def list_projects(
         self,
@@ -82,17 +316,18 @@ class DocumentProjectStorage:
         limit: int = 100,
     ) -> tuple[List[Dict], int]:
         """列出项目"""
-        projects = self._load_projects()
+        self._sync()
+        metas = list(self._meta.values())
 
         # 按更新时间倒序排序
-        projects.sort(key=lambda x: x.get("updatedAt", ""), reverse=True)
+        metas.sort(key=lambda x: x.get("updatedAt", ""), reverse=True)
 
-        total = len(projects)
+        total = len(metas)
 
-        # 分页
-        projects = projects[skip : skip + limit]
+        # 分页（只读取当前页项目的章节）
+        projects = [self.get_project(meta["id"]) for meta in metas[skip : skip + limit]]
 
-        return projects, total
+        return [project for project in projects if project is not None], total
 
     def update_project(
         self,
@@ -100,24 +335,15 @@ class DocumentProjectStorage:
         **update_data
     ) -> Optional[Dict]:
         """更新项目"""
-        projects = self._load_projects()
-
-        for i, project in enumerate(projects):
-            if project["id"] == project_id:
-                # 更新字段
-                for key, value in update_data.items():
-                    if key == "sections":
-                        # 合并 sections
-                        project["sections"].update(value)
-                    else:
-                        project[key] = value
+        fields = {k: v for k, v in update_data.items() if k != "sections"}
+        with self._project_lock(project_id):
+            # 合并 sections：只写入传入的章节
+            if "sections" in update_data and not self._put_sections(project_id, update_data["sections"]):
+                return None
+            if (fields or "sections" not in update_data) and not self._update_meta(project_id, fields):
+                return None
 
-                project["updatedAt"] = datetime.now().isoformat()
-                projects[i] = project
-                self._save_projects(projects)
-                return project
-
-        return None
+            return self.get_project(project_id)
 
     def update_outline(
         self,
@@ -134,14 +360,10 @@ class DocumentProjectStorage:
         section_id: str,
         content: Dict,
     ) -> Optional[Dict]:
-        """添加章节内容"""
-        project = self.get_project(project_id)
-        if not project:
+        """添加章节内容（只写入该章节）"""
+        if not self._put_sections(project_id, {section_id: content}):
             return None
-
-        sections = project.get("sections", {})
-        sections[section_id] = content
-        return self.update_project(project_id, sections=sections)
+        return self.get_project(project_id)
 
     def update_paragraph(
         self,
@@ -152,33 +374,27 @@ class DocumentProjectStorage:
         save_version: bool = True,
     ) -> Optional[Dict]:
         """更新段落内容（支持版本管理）"""
-        project = self.get_project(project_id)
-        if not project:
-            return None
-
-        sections = project.get("sections", {})
-        section = sections.get(section_id, {})
-        paragraphs = section.get("paragraphs", [])
+        with self._project_lock(project_id):
+            section = self._get_section(project_id, section_id)
+            if not section:
+                return None
+
+            paragraphs = section.get("paragraphs", [])
+
+            # 找到段落（使用 paragraph_id 字段）
+            for para in paragraphs:
+                if para.get("paragraph_id") == paragraph_id:
+                    # 保存旧版本（以差量形式）并更新内容
+                    if save_version:
+                        push_version(para, content, {
+                            "timestamp": para.get("timestamp", datetime.now().isoformat()),
+                        })
+                    else:
+                        replace_content(para, content)
+                    para["timestamp"] = datetime.now().isoformat()
 
-        # 找到段落（使用 paragraph_id 字段）
-        for para in paragraphs:
-            if para.get("paragraph_id") == paragraph_id:
-                # 保存旧版本
-                if save_version:
-                    versions = para.get("versions", [])
-                    versions.append({
-                        "content": para.get("content", ""),
-                        "timestamp": para.get("timestamp", datetime.now().isoformat()),
-                    })
-                    para["versions"] = versions
-
-                # 更新内容
-                para["content"] = content
-                para["timestamp"] = datetime.now().isoformat()
-
-                section["paragraphs"] = paragraphs
-                sections[section_id] = section
-                return self.update_project(project_id, sections=sections)
+                    section["paragraphs"] = paragraphs
+                    return self.add_section_content(project_id, section_id, section)
 
         return None
 
@@ -190,53 +406,306 @@ class DocumentProjectStorage:
         version_index: int,
     ) -> Optional[Dict]:
         """恢复段落到指定版本"""
-        project = self.get_project(project_id)
-        if not project:
-            return None
+        with self._project_lock(project_id):
+            section = self._get_section(project_id, section_id)
+            if not section:
+                return None
+
+            paragraphs = section.get("paragraphs", [])
+
+            # 找到段落（使用 paragraph_id 字段）
+            for para in paragraphs:
+                if para.get("paragraph_id") == paragraph_id:
+                    versions = expand_versions(para)
+                    if 0 <= version_index < len(versions):
+                        # 保存当前版本
+                        current_version = {
+                            "content": para.get("content", ""),
+                            "timestamp": para.get("timestamp", datetime.now().isoformat()),
+                            "sources": para.get("sources", [])
+                        }
+                        versions.append(current_version)
+
+                        # 恢复到指定版本
+                        target_version = versions[version_index]
+                        para["content"] = target_version.get("content", "")
+                        para["timestamp"] = datetime.now().isoformat()
+
+                        # 更新版本列表（移除被恢复的版本，因为它已成为当前版本）
+                        para["versions"] = pack_versions(
+                            para["content"],
+                            versions[:version_index] + versions[version_index + 1:],
+                        )
+
+                        section["paragraphs"] = paragraphs
+                        return self.add_section_content(project_id, section_id, section)
 
-        sections = project.get("sections", {})
-        section = sections.get(section_id, {})
-        paragraphs = section.get("paragraphs", [])
+        return None
 
-        # 找到段落（使用 paragraph_id 字段）
-        for para in paragraphs:
+    def regenerate_paragraph(
+        self,
+        project_id: str,
+        section_id: str,
+        paragraph: Dict,
+    ) -> Optional[Dict]:
+        """
+        用重新生成的段落替换章节内容，原段落及其历史版本并入新段落的 versions
+
+        Returns:
+            新段落（不含历史版本，带 versionCount），项目不存在时返回 None
+        """
+        with self._project_lock(project_id):
+            section = self._get_section(project_id, section_id) or {}
+            paragraphs = section.get("paragraphs") or []
+
+            # 只保留一个段落，历史在 versions 中
+            new_paragraph = {k: v for k, v in paragraph.items() if k != "versions"}
+            if paragraphs:
+                current = paragraphs[-1]
+                new_paragraph["versions"] = current.get("versions") or []
+                new_paragraph["content"] = current.get("content", "")
+                push_version(new_paragraph, paragraph.get("content") or "", {
+                    "timestamp": current.get("timestamp", ""),
+                    "sources": current.get("sources", []),
+                })
+
+            content = {
+                "sectionId": section_id,
+                "paragraphs": [new_paragraph],
+                "sources": new_paragraph.get("sources", []),
+            }
+            if not self._put_sections(project_id, {section_id: content}):
+                return None
+            return strip_versions(new_paragraph)
+
+    def get_paragraph_versions(
+        self,
+        project_id: str,
+        section_id: str,
+        paragraph_id: str,
+    ) -> Optional[List[Dict]]:
+        """获取段落的全部历史版本（从旧到新，带完整内容）"""
+        section = self._get_section(project_id, section_id)
+        if not section:
+            return None
+        for para in section.get("paragraphs", []):
             if para.get("paragraph_id") == paragraph_id:
-                versions = para.get("versions", [])
-                if 0 <= version_index < len(versions):
-                    # 保存当前版本
-                    current_version = {
-                        "content": para.get("content", ""),
-                        "timestamp": para.get("timestamp", datetime.now().isoformat()),
-                        "sources": para.get("sources", [])
-                    }
-                    versions.append(current_version)
-
-                    # 恢复到指定版本
-                    target_version = versions[version_index]
-                    para["content"] = target_version.get("content", "")
-                    para["timestamp"] = datetime.now().isoformat()
+                return expand_versions(para)
+        return None
 
-                    # 更新版本列表（移除被恢复的版本，因为它已成为当前版本）
-                    para["versions"] = versions[:version_index] + versions[version_index + 1:]
+    def delete_project(self, project_id: str) -> bool:
+        """删除项目"""
+        with self._project_lock(project_id):
+            if self._read_meta(project_id) is None:
+                return False
+            self._meta.pop(project_id, None)
+            self._meta_identity.pop(project_id, None)
+            shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
+        self._changed()
+        return True
+
+
+class SQLiteDocumentProjectStorage(DocumentProjectStorage):
+    """
+    文档项目存储类（SQLite）
+
+    项目元数据和章节分表存储，修改段落或生成章节只写入对应的章节行；
+    读-改-写在同一个 BEGIN IMMEDIATE 事务中完成，并发生成章节时不会互相覆盖。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS document_projects (
+        id TEXT PRIMARY KEY,
+        title TEXT,
+        createdAt TEXT,
+        updatedAt TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_document_projects_updated_at ON document_projects (updatedAt);
+
+    CREATE TABLE IF NOT EXISTS project_sections (
+        project_id TEXT NOT NULL,
+        section_id TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (project_id, section_id)
+    );
+    """
+
+    def __init__(self, db_path: str, storage_dir: str = "./data"):
+        self.storage_dir = storage_dir
+        self.db = get_database(db_path)
+        self.db.executescript(self.SCHEMA)
+        self._migrate_from_json()
+        self._split_sections()
+
+    def _migrate_from_json(self):
+        """一次性从 JSON 存储迁移"""
+        if self.db.get_meta("migrated:document_projects"):
+            return
+
+        with self.db.transaction() as conn:
+            if self.db.get_meta("migrated:document_projects"):
+                return
+            if os.path.exists(os.path.join(self.storage_dir, "document_projects.json")) or \
+                    os.path.isdir(os.path.join(self.storage_dir, "projects")):
+                # 借助 JSON 存储读取（同时兼容旧的 document_projects.json）
+                json_storage = DocumentProjectStorage(self.storage_dir)
+                project_ids = list(json_storage._meta)
+                for project_id in project_ids:
+                    self._write(conn, json_storage._load_project(project_id))
+                logger.info(f"已从 JSON 迁移 {len(project_ids)} 个文档项目到 SQLite")
+            self.db.set_meta("migrated:document_projects", datetime.now().isoformat())
+            self.db.set_meta("layout:project_sections", datetime.now().isoformat())
+
+    def _split_sections(self):
+        """把早期整行存储的项目拆分为元数据行和章节行"""
+        if self.db.get_meta("layout:project_sections"):
+            return
+
+        with self.db.transaction() as conn:
+            if self.db.get_meta("layout:project_sections"):
+                return
+            rows = conn.execute("SELECT data FROM document_projects").fetchall()
+            for row in rows:
+                self._write(conn, json.loads(row["data"]))
+            self.db.set_meta("layout:project_sections", datetime.now().isoformat())
+
+    def _write(self, conn, project: Dict):
+        """写入完整项目（元数据 + 全部章节）"""
+        self._write_meta(conn, {k: v for k, v in project.items() if k != "sections"})
+        conn.execute("DELETE FROM project_sections WHERE project_id = ?", (project["id"],))
+        for section_id, section in project.get("sections", {}).items():
+            self._write_section(conn, project["id"], section_id, section)
+
+    def _write_meta(self, conn, meta: Dict):
+        conn.execute(
+            "INSERT INTO document_projects (id, title, createdAt, updatedAt, data) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET title = excluded.title, "
+            "createdAt = excluded.createdAt, updatedAt = excluded.updatedAt, data = excluded.data",
+            (
+                meta["id"],
+                meta.get("title"),
+                meta.get("createdAt"),
+                meta.get("updatedAt"),
+                json.dumps(meta, ensure_ascii=False),
+            ),
+        )
+
+    def _write_section(self, conn, project_id: str, section_id: str, section: Dict):
+        # 更新已有章节时保留其 rowid，章节顺序不变
+        conn.execute(
+            "INSERT INTO project_sections (project_id, section_id, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(project_id, section_id) DO UPDATE SET data = excluded.data",
+            (project_id, section_id, json.dumps(section, ensure_ascii=False)),
+        )
+
+    def _read_meta(self, project_id: str) -> Optional[Dict]:
+        row = self.db.execute(
+            "SELECT data FROM document_projects WHERE id = ?", (project_id,)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def _project_lock(self, project_id: str):
+        return self.db.transaction()
+
+    def _sync(self):
+        pass  # 每次查询都直接读取数据库，无需同步
+
+    def _get_section(self, project_id: str, section_id: str) -> Optional[Dict]:
+        row = self.db.execute(
+            "SELECT data FROM project_sections WHERE project_id = ? AND section_id = ?",
+            (project_id, section_id),
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def _put_sections(self, project_id: str, sections: Dict[str, Dict]) -> bool:
+        with self.db.transaction() as conn:
+            if self._read_meta(project_id) is None:
+                return False
+            for section_id, section in sections.items():
+                self._write_section(conn, project_id, section_id, section)
+            self._touch(conn, project_id, {})
+            return True
+
+    def _update_meta(self, project_id: str, fields: Dict) -> bool:
+        with self.db.transaction() as conn:
+            return self._touch(conn, project_id, fields)
+
+    def _touch(self, conn, project_id: str, fields: Dict) -> bool:
+        """更新元数据字段和 updatedAt"""
+        meta = self._read_meta(project_id)
+        if meta is None:
+            return False
+        self._write_meta(conn, {**meta, **fields, "updatedAt": datetime.now().isoformat()})
+        return True
 
-                    section["paragraphs"] = paragraphs
-                    sections[section_id] = section
-                    return self.update_project(project_id, sections=sections)
+    def create_project(
+        self,
+        title: str,
+        folder_ids: List[str],
+        outline: Optional[List[Dict]] = None,
+        content: Optional[List[Dict]] = None,
+    ) -> Dict:
+        # 初始化 sections
+        sections = {}
+        if content:
+            for section_data in content:
+                section_id = section_data.get("sectionId")
+                if section_id:
+                    sections[section_id] = section_data
 
-        return None
+        project = {
+            "id": str(uuid.uuid4()),
+            "title": title,
+            "folderIds": folder_ids,
+            "outline": outline,
+            "outlineLocked": False,
+            "sections": sections,
+            "createdAt": datetime.now().isoformat(),
+            "updatedAt": datetime.now().isoformat(),
+        }
+
+        with self.db.transaction() as conn:
+            self._write(conn, project)
+        return project
+
+    def _load_project(self, project_id: str) -> Optional[Dict]:
+        project = self._read_meta(project_id)
+        if project is None:
+            return None
+        rows = self.db.execute(
+            "SELECT section_id, data FROM project_sections WHERE project_id = ? ORDER BY rowid",
+            (project_id,),
+        ).fetchall()
+        project["sections"] = {row["section_id"]: json.loads(row["data"]) for row in rows}
+        return project
+
+    def list_projects(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> tuple[List[Dict], int]:
+        total = self.db.execute("SELECT COUNT(*) AS n FROM document_projects").fetchone()["n"]
+        rows = self.db.execute(
+            "SELECT id FROM document_projects ORDER BY updatedAt DESC LIMIT ? OFFSET ?",
+            (limit, skip),
+        ).fetchall()
+        projects = [self.get_project(row["id"]) for row in rows]
+        return [project for project in projects if project is not None], total
 
     def delete_project(self, project_id: str) -> bool:
-        """删除项目"""
-        projects = self._load_projects()
+        with self.db.transaction() as conn:
+            cursor = conn.execute("DELETE FROM document_projects WHERE id = ?", (project_id,))
+            conn.execute("DELETE FROM project_sections WHERE project_id = ?", (project_id,))
+        return cursor.rowcount > 0
 
-        for i, project in enumerate(projects):
-            if project["id"] == project_id:
-                projects.pop(i)
-                self._save_projects(projects)
-                return True
 
-        return False
+def create_document_project_storage() -> DocumentProjectStorage:
+    """按配置创建文档项目存储"""
+    if settings.STORAGE_BACKEND == "sqlite":
+        return SQLiteDocumentProjectStorage(settings.SQLITE_PATH)
+    return DocumentProjectStorage()
 
 
 # 全局存储实例
-document_project_storage = DocumentProjectStorage()
+document_project_storage = create_document_project_storage()
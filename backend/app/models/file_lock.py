@@ -0,0 +1,83 @@
+"""
+跨进程文件锁 + 变更代数
+
+多个 uvicorn worker 共用同一个数据目录时，写入方持有锁文件上的排他锁
+（fcntl.flock），写完后递增锁文件中记录的代数（generation）。
+各进程在内存中缓存数据，读取前只需比较代数，
+代数变化时才重新加载其他进程写入的部分。
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 系统：只有进程内互斥，不支持多 worker
+    fcntl = None
+
+_GENERATION_WIDTH = 20
+
+
+class InterProcessLock:
+    """基于锁文件的跨进程排他锁（可重入），锁文件内容为变更代数"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        # flock 作用于打开的文件描述，同一进程内的线程之间另需互斥
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        if fcntl is None:
+            logger.warning("当前系统不支持 fcntl，跨进程文件锁不可用，请勿使用多个 worker")
+
+    @contextmanager
+    def exclusive(self):
+        """持有排他锁（同一线程可重入）"""
+        with self._thread_lock:
+            if self._depth == 0 and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def generation(self) -> int:
+        """当前变更代数（无需持有锁）"""
+        if hasattr(os, "pread"):
+            data = os.pread(self._fd, _GENERATION_WIDTH, 0)
+        else:
+            with self._thread_lock:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                data = os.read(self._fd, _GENERATION_WIDTH)
+        try:
+            return int(data.strip() or 0)
+        except ValueError:
+            return 0
+
+    def bump(self) -> int:
+        """递增变更代数并返回新值（需在 exclusive() 内调用）"""
+        generation = self.generation() + 1
+        data = str(generation).zfill(_GENERATION_WIDTH).encode("ascii")
+        if hasattr(os, "pwrite"):
+            os.pwrite(self._fd, data, 0)
+        else:
+            with self._thread_lock:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, data)
+        return generation
+
+    def close(self):
+        """关闭锁文件"""
+        with self._thread_lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,97 @@
+"""
+文件夹统计
+
+每个文档对所在文件夹的统计贡献固定（文档数、已解析、已向量化、失败、
+分块数、字节数），文档新增、移动、删除或状态变化时减去旧贡献、
+加上新贡献即可增量维护，查询时无需扫描文档。
+
+另外为每个文件夹维护向量数据版本号：文件夹中的文档重新向量化、
+移动或删除时递增，检索结果缓存据此失效。
+"""
+from typing import Dict, Optional
+
+STAT_FIELDS = (
+    "documentCount",
+    "parsedCount",
+    "vectorizedCount",
+    "failedCount",
+    "chunkCount",
+    "totalBytes",
+)
+
+_FAILED_STATUSES = ("error", "failed")
+
+
+def empty_stats() -> Dict[str, int]:
+    return dict.fromkeys(STAT_FIELDS, 0)
+
+
+def document_stats(doc: Dict) -> Dict[str, int]:
+    """单个文档对所在文件夹统计的贡献"""
+    vectorized = doc.get("vectorizeStatus") == "success"
+    return {
+        "documentCount": 1,
+        "parsedCount": int(doc.get("parseStatus") == "success"),
+        "vectorizedCount": int(vectorized),
+        "failedCount": int(
+            doc.get("parseStatus") in _FAILED_STATUSES
+            or doc.get("vectorizeStatus") in _FAILED_STATUSES
+        ),
+        # 重新向量化时状态回到 pending，旧的分块已删除，不再计入
+        "chunkCount": (doc.get("chunkCount") or 0) if vectorized else 0,
+        "totalBytes": doc.get("fileSize") or 0,
+    }
+
+
+def add_stats(stats: Dict[str, int], delta: Dict[str, int], sign: int = 1):
+    """把 delta 累加到 stats（sign=-1 时减去）"""
+    for field in STAT_FIELDS:
+        stats[field] += sign * delta[field]
+
+
+class FolderStats:
+    """按 folderId 维护的统计计数"""
+
+    def __init__(self):
+        self._stats: Dict[Optional[str], Dict[str, int]] = {}
+
+    def add(self, doc: Dict, sign: int = 1):
+        """计入（sign=-1 时移除）一个文档"""
+        folder_id = doc.get("folderId")
+        stats = self._stats.setdefault(folder_id, empty_stats())
+        add_stats(stats, document_stats(doc), sign)
+        if stats["documentCount"] == 0:
+            del self._stats[folder_id]
+
+    def remove(self, doc: Dict):
+        self.add(doc, -1)
+
+    def get(self, folder_id: str) -> Dict[str, int]:
+        return dict(self._stats.get(folder_id) or empty_stats())
+
+
+def vector_state(doc: Dict) -> tuple:
+    """影响向量检索结果的文档字段"""
+    return doc.get("folderId"), doc.get("vectorizeStatus"), doc.get("chunkCount")
+
+
+def vector_changed(old: Optional[Dict], doc: Optional[Dict]) -> bool:
+    """文档变化是否影响所在文件夹的检索结果（新建的文档尚无向量）"""
+    if old is None:
+        return False
+    return doc is None or vector_state(old) != vector_state(doc)
+
+
+class FolderVersions:
+    """按 folderId 维护的向量数据版本号"""
+
+    def __init__(self):
+        self._versions: Dict[Optional[str], int] = {}
+
+    def bump(self, *docs: Dict):
+        """文档所在文件夹的版本号加一（同一文件夹只加一次）"""
+        for folder_id in {doc.get("folderId") for doc in docs}:
+            self._versions[folder_id] = self._versions.get(folder_id, 0) + 1
+
+    def get(self, folder_id: Optional[str]) -> int:
+        return self._versions.get(folder_id, 0)
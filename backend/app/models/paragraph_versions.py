@@ -0,0 +1,120 @@
+"""
+段落历史版本（逆向差量存储）
+
+段落的 versions 列表按时间从旧到新排列，每个版本只保存相对于
+「比它新一个版本」文本的差量（最新的历史版本相对于当前内容），
+读取某个历史版本时从当前内容出发依次回放差量。
+早期数据中带完整 content 的版本可以与差量版本混合存在。
+"""
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Union
+
+# 差量：[起始行, 结束行] 表示复用基准文本的行区间，字符串表示新增文本
+Delta = List[Union[List[int], str]]
+
+
+def make_delta(base: str, target: str) -> Delta:
+    """计算从 base 得到 target 的差量（按行）"""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    delta: Delta = []
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            text = "".join(target_lines[j1:j2])
+            if delta and isinstance(delta[-1], str):
+                delta[-1] += text
+            else:
+                delta.append(text)
+    return delta
+
+
+def apply_delta(base: str, delta: Delta) -> str:
+    """对 base 应用差量"""
+    base_lines = base.splitlines(keepends=True)
+    return "".join(
+        item if isinstance(item, str) else "".join(base_lines[item[0]:item[1]])
+        for item in delta
+    )
+
+
+def _encode(entry: Dict, content: str, newer: str) -> Dict:
+    """把完整版本编码为相对于 newer 的差量版本"""
+    encoded = {k: v for k, v in entry.items() if k != "content"}
+    encoded["delta"] = make_delta(newer, content)
+    return encoded
+
+
+def expand_versions(paragraph: Dict) -> List[Dict]:
+    """还原段落的全部历史版本（从旧到新，每个版本带完整 content）"""
+    versions = paragraph.get("versions") or []
+    expanded: List[Optional[Dict]] = [None] * len(versions)
+    newer = paragraph.get("content") or ""
+    for index in range(len(versions) - 1, -1, -1):
+        entry = versions[index]
+        if "delta" in entry:
+            content = apply_delta(newer, entry["delta"])
+        else:
+            content = entry.get("content") or ""
+        expanded[index] = {
+            **{k: v for k, v in entry.items() if k != "delta"},
+            "content": content,
+        }
+        newer = content
+    return expanded
+
+
+def pack_versions(content: str, versions: List[Dict]) -> List[Dict]:
+    """把完整历史版本（从旧到新）编码为差量链，content 为当前内容"""
+    packed: List[Optional[Dict]] = [None] * len(versions)
+    newer = content
+    for index in range(len(versions) - 1, -1, -1):
+        entry = versions[index]
+        packed[index] = _encode(entry, entry.get("content") or "", newer)
+        newer = entry.get("content") or ""
+    return packed
+
+
+def _ensure_packed(paragraph: Dict):
+    """早期数据中保存完整 content 的版本，在下次写入时统一转为差量"""
+    versions = paragraph.get("versions") or []
+    if any("delta" not in entry for entry in versions):
+        paragraph["versions"] = pack_versions(paragraph.get("content") or "", expand_versions(paragraph))
+
+
+def push_version(paragraph: Dict, new_content: str, snapshot: Optional[Dict] = None):
+    """
+    把段落当前内容压入历史版本，并把当前内容改为 new_content
+
+    Args:
+        paragraph: 段落（原地修改）
+        new_content: 新的当前内容
+        snapshot: 作为历史版本保存的其他字段（如 timestamp、sources）
+    """
+    _ensure_packed(paragraph)
+    old_content = paragraph.get("content") or ""
+    versions = list(paragraph.get("versions") or [])
+    # 原最新版本的差量基准正是 old_content，无需重算
+    versions.append(_encode(snapshot or {}, old_content, new_content))
+    paragraph["versions"] = versions
+    paragraph["content"] = new_content
+
+
+def replace_content(paragraph: Dict, new_content: str):
+    """修改段落当前内容但不保存版本：只需重算最新历史版本的差量"""
+    _ensure_packed(paragraph)
+    versions = list(paragraph.get("versions") or [])
+    if versions:
+        latest = apply_delta(paragraph.get("content") or "", versions[-1]["delta"])
+        versions[-1] = _encode(versions[-1], latest, new_content)
+        paragraph["versions"] = versions
+    paragraph["content"] = new_content
+
+
+def strip_versions(paragraph: Dict) -> Dict:
+    """去掉历史版本，只保留版本数量（versionCount）"""
+    result = {k: v for k, v in paragraph.items() if k != "versions"}
+    result["versionCount"] = len(paragraph.get("versions") or [])
+    return result
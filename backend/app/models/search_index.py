@@ -0,0 +1,105 @@
+"""
+文档标题检索索引
+
+对标题和文件名建立字符级 n-gram（单字 + 相邻二字）倒排索引，
+对标签建立 tag -> 文档 ID 的倒排表。增删改时增量维护，
+检索时对各个 n-gram 的倒排表求交集，再用子串匹配剔除误命中。
+"""
+from typing import Collection, Dict, Optional, Set, Tuple
+
+
+def ngrams(text: str) -> Set[str]:
+    """文本的单字和二字 n-gram（不区分大小写）"""
+    text = text.lower()
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def query_grams(query: str) -> Set[str]:
+    """
+    检索词需要命中的 n-gram
+
+    两个字及以上只需二字 n-gram，单字检索退化为单字 n-gram。
+    """
+    query = query.lower()
+    if len(query) < 2:
+        return set(query)
+    return {query[i:i + 2] for i in range(len(query) - 1)}
+
+
+class DocumentSearchIndex:
+    """文档标题 / 文件名 n-gram 倒排索引 + 标签倒排表"""
+
+    def __init__(self):
+        self._grams: Dict[str, Set[str]] = {}  # n-gram -> 文档 ID 集合
+        self._tags: Dict[str, Set[str]] = {}  # 标签 -> 文档 ID 集合
+        self._entries: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {}  # 文档 ID -> (标题, 文件名, 标签)
+
+    def add(self, doc: Dict):
+        """加入或更新文档；标题、文件名和标签都未变化时不做任何事"""
+        entry = (
+            (doc.get("title") or "").lower(),
+            (doc.get("fileName") or "").lower(),
+            tuple(doc.get("tags") or []),
+        )
+        doc_id = doc["id"]
+        if self._entries.get(doc_id) == entry:
+            return
+
+        self.remove(doc_id)
+        self._entries[doc_id] = entry
+        title, file_name, tags = entry
+        for gram in ngrams(title) | ngrams(file_name):
+            self._grams.setdefault(gram, set()).add(doc_id)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(doc_id)
+
+    def remove(self, doc_id: str):
+        """移除文档"""
+        entry = self._entries.pop(doc_id, None)
+        if entry is None:
+            return
+        title, file_name, tags = entry
+        for gram in ngrams(title) | ngrams(file_name):
+            self._discard(self._grams, gram, doc_id)
+        for tag in tags:
+            self._discard(self._tags, tag, doc_id)
+
+    @staticmethod
+    def _discard(postings: Dict[str, Set[str]], key: str, doc_id: str):
+        ids = postings.get(key)
+        if ids is not None:
+            ids.discard(doc_id)
+            if not ids:
+                del postings[key]
+
+    def tagged(self, tag: str) -> Set[str]:
+        """带有指定标签的文档 ID"""
+        return self._tags.get(tag, set())
+
+    def search(self, query: str, within: Optional[Collection[str]] = None) -> Set[str]:
+        """
+        标题或文件名包含 query 的文档 ID
+
+        Args:
+            query: 检索词
+            within: 只在这些文档 ID 中检索（如已按文件夹或标签筛选）
+        """
+        postings = [self._grams.get(gram, set()) for gram in query_grams(query)]
+        if not postings:
+            return set()
+        if within is not None:
+            postings.append(within)
+
+        # 从最短的倒排表开始求交集
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+
+        # 二字 n-gram 全部命中不代表连续出现，用子串匹配确认
+        query = query.lower()
+        return {
+            doc_id
+            for doc_id in candidates
+            if query in self._entries[doc_id][0] or query in self._entries[doc_id][1]
+        }
@@ -45,25 +45,32 @@ class DocumentUpdate(BaseModel):
     folderId: Optional[str] = None
 
 
-class DocumentResponse(DocumentBase):
-    """文档响应"""
+class DocumentSummary(DocumentBase):
+    """文档摘要（列表项，不含正文）"""
     id: str
     uploadTime: datetime
     parsed: bool
     parseStatus: ParseStatus
     chunked: bool = False  # 是否已分块
-    markdownContent: Optional[str] = None
-    thumbnail: Optional[str] = None
+    vectorizeStatus: Optional[str] = None  # 向量化状态
+    chunkCount: Optional[int] = None  # 分块数量
     errorMessage: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class DocumentResponse(DocumentSummary):
+    """文档响应"""
+    markdownContent: Optional[str] = None
+    thumbnail: Optional[str] = None
+
+
 class DocumentListResponse(BaseModel):
     """文档列表响应"""
-    documents: List[DocumentResponse]
+    documents: List[DocumentSummary]
     total: int
+    nextCursor: Optional[str] = Field(None, description="下一页的游标，没有更多文档时为空")
 
 
 class UploadResponse(BaseModel):
@@ -98,3 +105,14 @@ class FolderResponse(FolderBase):
 
     class Config:
         from_attributes = True
+
+
+class FolderStatsResponse(BaseModel):
+    """文件夹统计"""
+    folderId: str
+    documentCount: int = Field(0, description="文档数")
+    parsedCount: int = Field(0, description="已解析文档数")
+    vectorizedCount: int = Field(0, description="已向量化文档数")
+    failedCount: int = Field(0, description="解析或向量化失败的文档数")
+    chunkCount: int = Field(0, description="已向量化的分块总数")
+    totalBytes: int = Field(0, description="文件总字节数")
@@ -3,6 +3,7 @@
 处理大纲生成、内容生成和Word导出
 """
 import logging
+import threading
 import httpx
 from typing import List, Dict, Optional
 import json
@@ -10,8 +11,10 @@ import re
 import uuid
 from datetime import datetime
 
+from app.core.config import settings
+from app.services.model_residency import model_residency
+from app.services.query_cache import LRUCache
 from app.services.rag import rag_service
-from app.models.document import storage
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +30,9 @@ class DocumentGeneratorService:
         self.ollama_base_url = ollama_base_url
         self.llm_model = llm_model
         self.client = httpx.Client(timeout=120.0)
+        # 已预取检索结果的大纲（有效期与检索结果缓存相同）
+        self.prefetched_outlines = LRUCache(64, settings.SEARCH_CACHE_TTL_SECONDS)
+        self._prefetch_lock = threading.Lock()
 
     def generate_outline(
         self,
@@ -44,19 +50,13 @@ class DocumentGeneratorService:
             树形大纲结构
         """
         try:
-            # 1. 获取所有文档ID
-            all_document_ids = []
-            for folder_id in folder_ids:
-                documents, _ = storage.list_documents(folder=folder_id)
-                all_document_ids.extend([doc["id"] for doc in documents])
-
-            # 2. RAG检索相关内容
+            # 1. RAG检索相关内容（按 folder_id 分区检索，不再展开为文档ID列表）
             context = ""
-            if all_document_ids:
-                logger.info(f"从 {len(all_document_ids)} 个文档中检索相关内容")
+            if folder_ids:
+                logger.info(f"从 {len(folder_ids)} 个知识库中检索相关内容")
                 chunks = rag_service.search_relevant_chunks(
                     query=topic,
-                    document_ids=all_document_ids,
+                    folder_ids=folder_ids,
                     top_k=5
                 )
 
@@ -137,6 +137,7 @@ class DocumentGeneratorService:
                         }
                     ],
                     "stream": False,
+                    "keep_alive": model_residency.keep_alive(self.llm_model),
                     "options": {
                         "temperature": 0.7,
                         "top_p": 0.9,
@@ -147,6 +148,7 @@ class DocumentGeneratorService:
             )
 
             response.raise_for_status()
+            model_residency.touch(self.llm_model)
             result = response.json()
             content = result.get("message", {}).get("content", "")
 
@@ -444,6 +446,43 @@ class DocumentGeneratorService:
                 count += self._count_outline_nodes(node["children"])
         return count
 
+    def _outline_queries(self, outline: List[Dict], path: List[str] = None) -> List[str]:
+        """大纲中每个章节的检索查询（与 generate_section_content 中的查询格式一致）"""
+        path = path or []
+        queries = []
+        for node in outline or []:
+            title = node.get("title", "")
+            if title:
+                queries.append(" > ".join(path + [title]))
+            queries.extend(self._outline_queries(node.get("children"), path + [title]))
+        return queries
+
+    def _prefetch_outline(
+        self,
+        queries: List[str],
+        document_ids: List[str] = None,
+        folder_ids: List[str] = None
+    ):
+        """
+        整份大纲的章节查询一次编码、一次多向量搜索，结果进入检索缓存
+
+        同一大纲在检索缓存有效期内只预取一次，之后各章节单独检索时直接命中缓存。
+        """
+        if len(queries) < 2 or not rag_service.search_results.enabled:
+            return
+        key = (tuple(folder_ids or ()), tuple(document_ids or ()), tuple(queries))
+        # 先记录：预取失败也不在每个章节重试，并发的章节生成（各自在线程池中）不会重复预取
+        with self._prefetch_lock:
+            if self.prefetched_outlines.get(key):
+                return
+            self.prefetched_outlines.put(key, True)
+        try:
+            rag_service.search_relevant_chunks_batch(
+                queries, document_ids=document_ids, top_k=3, folder_ids=folder_ids
+            )
+        except Exception as e:
+            logger.warning(f"预取大纲检索结果失败: {e}")
+
     def generate_section_content(
         self,
         section_title: str,
@@ -451,7 +490,8 @@ class DocumentGeneratorService:
         document_ids: List[str],
         context_sections: List[str] = None,
         custom_prompt: str = None,
-        full_outline: List[Dict] = None
+        full_outline: List[Dict] = None,
+        folder_ids: List[str] = None
     ) -> Dict:
         """
         生成章节内容
@@ -463,6 +503,7 @@ class DocumentGeneratorService:
             context_sections: 上下文章节（父级章节标题列表）
             custom_prompt: 自定义生成需求
             full_outline: 完整大纲结构（用于上下文理解）
+            folder_ids: 知识库ID列表（指定时按知识库检索，代替 document_ids）
 
         Returns:
             生成的内容和引用
@@ -475,12 +516,15 @@ class DocumentGeneratorService:
 
             # 2. RAG 检索相关内容
             sources = []
-            if document_ids:
+            if document_ids or folder_ids:
                 logger.info(f"为章节 '{section_title}' 检索相关内容")
+                # 整份大纲的检索每个缓存周期只预取一次，本章节的检索通常直接命中缓存
+                self._prefetch_outline(self._outline_queries(full_outline), document_ids, folder_ids)
                 chunks = rag_service.search_relevant_chunks(
-                    query=query,
+                    query,
                     document_ids=document_ids,
-                    top_k=3  # 取最相关的3个片段
+                    top_k=3,  # 取最相关的3个片段
+                    folder_ids=folder_ids
                 )
 
                 # 只保留最高相似度的1个片段作为引用
@@ -517,6 +561,7 @@ class DocumentGeneratorService:
                         }
                     ],
                     "stream": False,
+                    "keep_alive": model_residency.keep_alive(self.llm_model),
                     "options": {
                         "temperature": 0.7,
                         "top_p": 0.9,
@@ -527,6 +572,7 @@ class DocumentGeneratorService:
             )
 
             response.raise_for_status()
+            model_residency.touch(self.llm_model)
             result = response.json()
             content = result.get("message", {}).get("content", "")
 
@@ -551,7 +597,8 @@ class DocumentGeneratorService:
         document_ids: List[str],
         context_sections: List[str] = None,
         custom_prompt: str = None,
-        full_outline: List[Dict] = None
+        full_outline: List[Dict] = None,
+        folder_ids: List[str] = None
     ) -> Dict:
         """
         重新生成段落（用于段落重新生成功能）
@@ -564,7 +611,8 @@ class DocumentGeneratorService:
             document_ids=document_ids,
             context_sections=context_sections,
             custom_prompt=custom_prompt,
-            full_outline=full_outline
+            full_outline=full_outline,
+            folder_ids=folder_ids
         )
 
     def _build_content_prompt(
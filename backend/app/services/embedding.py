@@ -2,14 +2,107 @@
 文本向量化服务
 使用 Ollama 本地模型生成文本嵌入向量
 """
+import asyncio
 import logging
+import threading
+import time
 import httpx
-from typing import List, Union
+from typing import Iterator, List, Optional, Union
 import numpy as np
 
+from app.core.config import settings
+from app.services.embedding_cache import create_embedding_cache, text_key
+from app.services.embedding_text import clean_for_embedding, estimate_tokens
+from app.services.model_residency import model_residency
+from app.services.ollama_health import ollama_health
+
 logger = logging.getLogger(__name__)
 
 
+class BatchSizer:
+    """
+    自适应批大小
+
+    每批耗时低于目标耗时的一半时批大小翻倍，超过目标耗时时减半，
+    请求失败时减半；每批文本的总字符数另有上限，避免请求体过大。
+    """
+
+    def __init__(self, max_size: int, max_chars: int, target_seconds: float, initial_size: int = 8):
+        self.max_size = max(1, max_size)
+        self.max_chars = max_chars
+        self.target_seconds = target_seconds
+        self.size = min(initial_size, self.max_size)
+        self._lock = threading.Lock()
+
+    def batches(self, texts: List[str]) -> Iterator[List[int]]:
+        """
+        按当前批大小和字符数上限切分，产出每批文本的下标
+
+        先按长度排序，长度相近的文本分在同一批，避免短文本被填充到长文本的长度。
+        """
+        batch: List[int] = []
+        chars = 0
+        for i in sorted(range(len(texts)), key=lambda i: len(texts[i] or "")):
+            length = len(texts[i] or "")
+            if batch and (len(batch) >= self.size or chars + length > self.max_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append(i)
+            chars += length
+        if batch:
+            yield batch
+
+    def record(self, count: int, seconds: float):
+        """记录一批的耗时，调整批大小"""
+        with self._lock:
+            if count < self.size:
+                return  # 未满的批（末尾或受字符数限制）不代表当前批大小的耗时
+            if seconds > self.target_seconds:
+                self.size = max(1, self.size // 2)
+            elif seconds < self.target_seconds / 2:
+                self.size = min(self.max_size, self.size * 2)
+
+    def failed(self):
+        """请求失败（可能是超时或请求体过大），减小批大小"""
+        with self._lock:
+            self.size = max(1, self.size // 2)
+
+
+class EmbeddingStats:
+    """累计的编码用量：请求 Ollama 的文本数、token 数和耗时"""
+
+    def __init__(self):
+        self.texts = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, texts: int, tokens: int, seconds: float):
+        with self._lock:
+            self.texts += texts
+            self.tokens += tokens
+            self.seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "texts": self.texts,
+                "tokens": self.tokens,
+                "seconds": round(self.seconds, 3),
+                "tokensPerSecond": round(self.tokens / self.seconds, 1) if self.seconds else 0.0,
+            }
+
+
+class EmbedRun:
+    """一次编码调用中需要请求 Ollama 的文本，以及得到的向量和 token 数"""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        self.tokens = 0
+        self.started = time.monotonic()
+
+
 class EmbeddingService:
     """文本嵌入服务 - 使用 Ollama"""
 
@@ -28,7 +121,19 @@ class EmbeddingService:
         self.model_name = model_name
         self.ollama_base_url = ollama_base_url
         self.client = None
+        self.async_client: Optional[httpx.AsyncClient] = None
+        self.max_concurrency = max(1, settings.EMBED_MAX_CONCURRENCY)
+        self._async_loop = None  # async_client 和信号量所属的事件循环
+        self._semaphore: Optional[asyncio.Semaphore] = None
         self.dimension = 768  # qwen2.5 默认维度，会根据实际调整
+        self.batch_sizer = BatchSizer(
+            max_size=settings.EMBED_BATCH_SIZE,
+            max_chars=settings.EMBED_BATCH_MAX_CHARS,
+            target_seconds=settings.EMBED_BATCH_TARGET_SECONDS,
+        )
+        self.cache = create_embedding_cache(model_name)
+        self.clean_text = settings.EMBED_CLEAN_TEXT
+        self.stats = EmbeddingStats()
 
     def get_client(self):
         """获取 HTTP 客户端"""
@@ -36,119 +141,354 @@ class EmbeddingService:
             self.client = httpx.Client(timeout=300.0)  # 5分钟超时
         return self.client
 
-    async def encode_async(self, texts: Union[str, List[str]]) -> np.ndarray:
+    def get_async_client(self) -> httpx.AsyncClient:
         """
-        异步将文本编码为向量
+        获取异步 HTTP 客户端（连接池 + keep-alive）
+
+        客户端和限制并发请求数的信号量都绑定在当前事件循环上，
+        事件循环变化时重新创建。
+        """
+        loop = asyncio.get_running_loop()
+        if self.async_client is None or self._async_loop is not loop:
+            self.async_client = httpx.AsyncClient(
+                timeout=300.0,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=settings.EMBED_KEEPALIVE_SECONDS,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self.async_client
+
+    async def aclose(self):
+        """关闭异步客户端（应用关闭时调用）"""
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
+            self._async_loop = None
+
+    # ---------- 批量编码 ----------
+
+    def _parse_embed_response(self, response: httpx.Response, texts: List[str]) -> tuple:
+        """
+        解析 /api/embed 响应，返回 (向量列表, token 数)
+
+        解析成功才记为健康；5xx 说明服务端出错，和连接失败一样计入熔断器，4xx 不计入。
+        """
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                ollama_health.record_failure(e)
+            raise
+        data = response.json()
+        embeddings = data.get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise ValueError(f"返回的向量数 ({len(embeddings)}) 与文本数 ({len(texts)}) 不一致")
+        # 旧版本 Ollama 不返回 prompt_eval_count，按字符估算
+        tokens = data.get("prompt_eval_count") or sum(estimate_tokens(text) for text in texts)
+        vectors = [np.array(embedding, dtype=np.float32) for embedding in embeddings]
+        ollama_health.record_success()
+        model_residency.touch(self.model_name)
+        return vectors, tokens
+
+    def _embed_request(self, texts: List[str]) -> tuple:
+        """一次请求编码多个文本（Ollama /api/embed，input 为列表），返回 (向量列表, token 数)"""
+        client = self.get_client()
+        try:
+            response = client.post(
+                f"{self.ollama_base_url}/api/embed",
+                json={
+                    "model": self.model_name,
+                    "input": texts,
+                    "keep_alive": model_residency.keep_alive(self.model_name)
+                }
+            )
+        except httpx.TransportError as e:
+            ollama_health.record_failure(e)
+            raise
+        return self._parse_embed_response(response, texts)
+
+    def _embed_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        分批编码文本，返回与 texts 一一对应的向量（失败的为 None）
+
+        文本先经过预处理（clean_for_embedding），再查向量缓存，
+        只有未命中的文本才请求 Ollama。批大小由 BatchSizer 根据耗时自适应调整；整批失败时对半拆分重试，
+        最终只有真正失败的文本单独请求，个别文本失败不影响其他文本。
+        """
+        inputs = self._prepare(texts)
+        vectors, keys, missing = self._cache_lookup(inputs)
+        if not missing:
+            return vectors
+        ollama_health.check()  # 熔断期间直接失败，不再逐批超时
+        run = EmbedRun([inputs[i] for i in missing])
+        for batch in self.batch_sizer.batches(run.texts):
+            self._embed_batch(run, batch)
+        self._finish_run(run)
+        self._cache_store(keys, missing, run.vectors, vectors)
+        return vectors
+
+    def _prepare(self, texts: List[str]) -> List[str]:
+        """生成送入模型的文本（去掉图片链接、表格符号等噪声），原文不变"""
+        if not self.clean_text:
+            return texts
+        return [clean_for_embedding(text) for text in texts]
+
+    def _finish_run(self, run: EmbedRun):
+        """记录本次请求 Ollama 的用量"""
+        seconds = time.monotonic() - run.started
+        count = sum(vector is not None for vector in run.vectors)
+        self.stats.record(count, run.tokens, seconds)
+        if seconds > 0:
+            logger.info(
+                f"请求 Ollama 编码 {count}/{len(run.texts)} 个文本，约 {run.tokens} tokens，"
+                f"耗时 {seconds:.2f}s（{run.tokens / seconds:.0f} tokens/s）"
+            )
+
+    def _cache_lookup(self, texts: List[str]) -> tuple:
+        """
+        先查向量缓存
+
+        Returns:
+            (与 texts 对应的向量列表（未命中为 None）, 缓存键列表, 未命中的下标列表)
+        """
+        if self.cache is None:
+            return [None] * len(texts), [], list(range(len(texts)))
+        keys = [text_key(self.model_name, text) for text in texts]
+        try:
+            vectors = self.cache.get_many(keys)
+        except Exception as e:
+            logger.warning(f"读取向量缓存失败: {e}")
+            vectors = [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if len(missing) < len(texts):
+            logger.info(f"向量缓存命中 {len(texts) - len(missing)}/{len(texts)} 个文本")
+        return vectors, keys, missing
+
+    def _cache_store(
+        self,
+        keys: List[bytes],
+        missing: List[int],
+        fetched: List[Optional[np.ndarray]],
+        vectors: List[Optional[np.ndarray]],
+    ):
+        """把新编码的向量填回结果并写入缓存"""
+        new_keys, new_vectors = [], []
+        for i, vector in zip(missing, fetched):
+            vectors[i] = vector
+            if keys and vector is not None and len(vector) > 0:
+                new_keys.append(keys[i])
+                new_vectors.append(vector)
+        if self.cache is not None and new_keys:
+            try:
+                self.cache.put_many(new_keys, new_vectors)
+            except Exception as e:
+                logger.warning(f"写入向量缓存失败: {e}")
+
+    def _embed_batch(self, run: EmbedRun, batch: List[int], retry: bool = False):
+        """编码一批文本并写入 run.vectors，失败时对半拆分重试"""
+        started = time.monotonic()
+        try:
+            results, tokens = self._embed_request([run.texts[i] for i in batch])
+        except Exception as e:
+            if not retry:
+                self.batch_sizer.failed()
+            if len(batch) == 1:
+                logger.warning(f"编码第 {batch[0]} 个文本失败: {e}，跳过")
+                return
+            logger.warning(f"批量编码 {len(batch)} 个文本失败: {e}，拆分后重试")
+            middle = len(batch) // 2
+            self._embed_batch(run, batch[:middle], retry=True)
+            self._embed_batch(run, batch[middle:], retry=True)
+            return
+
+        if not retry:
+            self.batch_sizer.record(len(batch), time.monotonic() - started)
+        run.tokens += tokens
+        for i, vector in zip(batch, results):
+            run.vectors[i] = vector
+
+    def _collect(self, vectors: List[Optional[np.ndarray]]) -> tuple[List[int], np.ndarray]:
+        """
+        剔除失败、为空或维度不一致的向量
+
+        Returns:
+            (成功的索引列表, 向量数组)
+        """
+        embeddings = []
+        successful_indices = []
+        expected_dim = None
+
+        for i, embedding in enumerate(vectors):
+            if embedding is None:
+                continue
+
+            # 跳过空向量
+            if len(embedding) == 0:
+                logger.warning(f"第 {i} 个文本的向量为空，跳过")
+                continue
+
+            # 设置期望的维度（使用第一个成功的向量）
+            if expected_dim is None:
+                expected_dim = len(embedding)
+                if self.dimension != expected_dim:
+                    self.dimension = expected_dim
+                    logger.info(f"设置向量维度为: {expected_dim}")
+
+            # 检查向量维度一致性
+            if len(embedding) != expected_dim:
+                logger.warning(f"第 {i} 个文本的向量维度 ({len(embedding)}) 与期望维度 ({expected_dim}) 不一致，跳过")
+                continue
+
+            embeddings.append(embedding)
+            successful_indices.append(i)
+
+        if not embeddings:
+            raise ValueError("没有成功编码任何文本")
+
+        return successful_indices, np.array(embeddings)
+
+    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """
+        将文本编码为向量（同步版本）
 
         Args:
             texts: 单个文本或文本列表
 
         Returns:
-            向量数组，形状为 (n, dimension)
+            向量数组，形状为 (n, dimension)，编码失败的文本被跳过
         """
         if isinstance(texts, str):
             texts = [texts]
 
-        client = self.get_client()
-        embeddings = []
+        try:
+            _, embeddings = self._collect(self._embed_many(texts))
+            logger.info(f"成功编码 {len(embeddings)} 个文本，向量维度: {embeddings.shape[1]}")
+            return embeddings
+
+        except Exception as e:
+            logger.error(f"文本编码失败: {e}")
+            raise
+
+    def encode_with_indices(self, texts: List[str]) -> tuple[List[int], np.ndarray]:
+        """
+        编码文本并返回成功的索引和向量
 
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (成功的索引列表, 向量数组)
+        """
         try:
-            for text in texts:
+            successful_indices, embeddings = self._collect(self._embed_many(texts))
+            logger.info(
+                f"成功编码 {len(embeddings)} 个文本（共 {len(texts)} 个），"
+                f"向量维度: {embeddings.shape[1]}，当前批大小: {self.batch_sizer.size}"
+            )
+            return successful_indices, embeddings
+
+        except Exception as e:
+            logger.error(f"文本编码失败: {e}")
+            raise
+
+    # ---------- 异步批量编码 ----------
+
+    async def _embed_request_async(self, texts: List[str]) -> tuple:
+        """异步请求 /api/embed，同时在途的请求数不超过 max_concurrency"""
+        client = self.get_async_client()
+        async with self._semaphore:
+            try:
                 response = await client.post(
-                    f"{self.ollama_base_url}/api/embeddings",
+                    f"{self.ollama_base_url}/api/embed",
                     json={
                         "model": self.model_name,
-                        "prompt": text
+                        "input": texts,
+                        "keep_alive": model_residency.keep_alive(self.model_name)
                     }
                 )
-                response.raise_for_status()
-                result = response.json()
+            except httpx.TransportError as e:
+                ollama_health.record_failure(e)
+                raise
+        return self._parse_embed_response(response, texts)
 
-                if "embedding" in result:
-                    embedding = np.array(result["embedding"], dtype=np.float32)
-                    embeddings.append(embedding)
-
-                    # 更新维度
-                    if self.dimension != len(embedding):
-                        self.dimension = len(embedding)
-                        logger.info(f"更新向量维度为: {self.dimension}")
-
-            logger.info(f"成功编码 {len(texts)} 个文本")
-            return np.array(embeddings)
+    async def _embed_many_async(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        分批并发编码文本，返回与 texts 一一对应的向量（失败的为 None）
 
+        max_concurrency 个协程依次从同一个切分器取批，
+        每取一批时使用 BatchSizer 当前的批大小。
+        """
+        inputs = self._prepare(texts)
+        vectors, keys, missing = self._cache_lookup(inputs)
+        if not missing:
+            return vectors
+        ollama_health.check()  # 熔断期间直接失败，不再逐批超时
+        run = EmbedRun([inputs[i] for i in missing])
+        batches = self.batch_sizer.batches(run.texts)
+
+        async def worker():
+            for batch in batches:
+                await self._embed_batch_async(run, batch)
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+        self._finish_run(run)
+        self._cache_store(keys, missing, run.vectors, vectors)
+        return vectors
+
+    async def _embed_batch_async(self, run: EmbedRun, batch: List[int], retry: bool = False):
+        """异步编码一批文本并写入 run.vectors，失败时对半拆分重试"""
+        started = time.monotonic()
+        try:
+            results, tokens = await self._embed_request_async([run.texts[i] for i in batch])
         except Exception as e:
-            logger.error(f"文本编码失败: {e}")
-            raise
+            if not retry:
+                self.batch_sizer.failed()
+            if len(batch) == 1:
+                logger.warning(f"编码第 {batch[0]} 个文本失败: {e}，跳过")
+                return
+            logger.warning(f"批量编码 {len(batch)} 个文本失败: {e}，拆分后重试")
+            middle = len(batch) // 2
+            await asyncio.gather(
+                self._embed_batch_async(run, batch[:middle], retry=True),
+                self._embed_batch_async(run, batch[middle:], retry=True),
+            )
+            return
 
-    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        if not retry:
+            self.batch_sizer.record(len(batch), time.monotonic() - started)
+        run.tokens += tokens
+        for i, vector in zip(batch, results):
+            run.vectors[i] = vector
+
+    async def encode_async(self, texts: Union[str, List[str]]) -> np.ndarray:
         """
-        将文本编码为向量（同步版本）
+        异步将文本编码为向量
 
         Args:
             texts: 单个文本或文本列表
 
         Returns:
-            向量数组，形状为 (n, dimension)
+            向量数组，形状为 (n, dimension)，编码失败的文本被跳过
         """
         if isinstance(texts, str):
             texts = [texts]
 
-        client = self.get_client()
-        embeddings = []
-        expected_dim = None
-
         try:
-            for i, text in enumerate(texts):
-                try:
-                    response = client.post(
-                        f"{self.ollama_base_url}/api/embeddings",
-                        json={
-                            "model": self.model_name,
-                            "prompt": text
-                        },
-                        timeout=60.0  # 单个请求60秒超时
-                    )
-                    response.raise_for_status()
-                    result = response.json()
-
-                    if "embedding" in result:
-                        embedding = np.array(result["embedding"], dtype=np.float32)
-
-                        # 跳过空向量
-                        if len(embedding) == 0:
-                            logger.warning(f"第 {i} 个文本的向量为空，跳过")
-                            continue
-
-                        # 设置期望的维度（使用第一个成功的向量）
-                        if expected_dim is None:
-                            expected_dim = len(embedding)
-                            self.dimension = expected_dim
-                            logger.info(f"设置向量维度为: {expected_dim}")
-
-                        # 检查向量维度一致性
-                        if len(embedding) != expected_dim:
-                            logger.warning(f"第 {i} 个文本的向量维度 ({len(embedding)}) 与期望维度 ({expected_dim}) 不一致，跳过")
-                            continue
-
-                        embeddings.append(embedding)
-
-                except Exception as e:
-                    logger.warning(f"编码第 {i} 个文本失败: {e}，跳过")
-                    continue
-
-            if not embeddings:
-                raise ValueError("没有成功编码任何文本")
-
-            logger.info(f"成功编码 {len(embeddings)} 个文本，向量维度: {len(embeddings[0])}")
-            return np.array(embeddings)
+            _, embeddings = self._collect(await self._embed_many_async(texts))
+            logger.info(f"成功编码 {len(embeddings)} 个文本，向量维度: {embeddings.shape[1]}")
+            return embeddings
 
         except Exception as e:
             logger.error(f"文本编码失败: {e}")
             raise
 
-    def encode_with_indices(self, texts: List[str]) -> tuple[List[int], np.ndarray]:
+    async def encode_with_indices_async(self, texts: List[str]) -> tuple[List[int], np.ndarray]:
         """
-        编码文本并返回成功的索引和向量
+        异步编码文本并返回成功的索引和向量
 
         Args:
             texts: 文本列表
@@ -156,61 +496,23 @@ class EmbeddingService:
         Returns:
             (成功的索引列表, 向量数组)
         """
-        client = self.get_client()
-        embeddings = []
-        successful_indices = []
-        expected_dim = None
-
         try:
-            for i, text in enumerate(texts):
-                try:
-                    response = client.post(
-                        f"{self.ollama_base_url}/api/embeddings",
-                        json={
-                            "model": self.model_name,
-                            "prompt": text
-                        },
-                        timeout=60.0
-                    )
-                    response.raise_for_status()
-                    result = response.json()
-
-                    if "embedding" in result:
-                        embedding = np.array(result["embedding"], dtype=np.float32)
-
-                        # 跳过空向量
-                        if len(embedding) == 0:
-                            logger.warning(f"第 {i} 个文本的向量为空，跳过")
-                            continue
-
-                        # 设置期望的维度
-                        if expected_dim is None:
-                            expected_dim = len(embedding)
-                            self.dimension = expected_dim
-                            logger.info(f"设置向量维度为: {expected_dim}")
-
-                        # 检查向量维度一致性
-                        if len(embedding) != expected_dim:
-                            logger.warning(f"第 {i} 个文本的向量维度 ({len(embedding)}) 与期望维度 ({expected_dim}) 不一致，跳过")
-                            continue
-
-                        embeddings.append(embedding)
-                        successful_indices.append(i)
-
-                except Exception as e:
-                    logger.warning(f"编码第 {i} 个文本失败: {e}，跳过")
-                    continue
-
-            if not embeddings:
-                raise ValueError("没有成功编码任何文本")
-
-            logger.info(f"成功编码 {len(embeddings)} 个文本（共 {len(texts)} 个），向量维度: {len(embeddings[0])}")
-            return successful_indices, np.array(embeddings)
+            successful_indices, embeddings = self._collect(await self._embed_many_async(texts))
+            logger.info(
+                f"成功编码 {len(embeddings)} 个文本（共 {len(texts)} 个），"
+                f"向量维度: {embeddings.shape[1]}，当前批大小: {self.batch_sizer.size}"
+            )
+            return successful_indices, embeddings
 
         except Exception as e:
             logger.error(f"文本编码失败: {e}")
             raise
 
+    async def encode_single_async(self, text: str) -> List[float]:
+        """异步编码单个文本，返回列表格式"""
+        embedding = await self.encode_async(text)
+        return embedding[0].tolist()
+
     def encode_single(self, text: str) -> List[float]:
         """
         编码单个文本，返回列表格式
@@ -236,7 +538,25 @@ class EmbeddingService:
                 json={
                     "model": self.model_name,
                     "prompt": "",
-                    "keep_alive": -1  # -1 表示立即卸载模型
+                    "keep_alive": 0  # 0 表示立即卸载模型（-1 表示一直驻留）
+                }
+            )
+            logger.info(f"已卸载模型 {self.model_name}，释放 GPU 显存")
+            return True
+        except Exception as e:
+            logger.error(f"卸载模型失败: {e}")
+            return False
+
+    async def unload_model_async(self):
+        """异步卸载 Ollama 模型，释放 GPU 显存"""
+        try:
+            client = self.get_async_client()
+            await client.post(
+                f"{self.ollama_base_url}/api/generate",
+                json={
+                    "model": self.model_name,
+                    "prompt": "",
+                    "keep_alive": 0  # 0 表示立即卸载模型（-1 表示一直驻留）
                 }
             )
             logger.info(f"已卸载模型 {self.model_name}，释放 GPU 显存")
@@ -267,6 +587,25 @@ class EmbeddingService:
             logger.error(f"Ollama 连接失败: {e}")
             return False
 
+    async def test_connection_async(self) -> bool:
+        """异步测试 Ollama 连接"""
+        try:
+            client = self.get_async_client()
+            response = await client.get(f"{self.ollama_base_url}/api/tags")
+            response.raise_for_status()
+
+            models = response.json().get("models", [])
+            model_names = [m.get("name", "") for m in models]
+
+            if self.model_name in model_names:
+                return True
+            logger.warning(f"模型 {self.model_name} 不在可用模型列表中: {model_names}")
+            return False
+
+        except Exception as e:
+            logger.error(f"Ollama 连接失败: {e}")
+            return False
+
 
 # 全局嵌入服务实例
 embedding_service = EmbeddingService()
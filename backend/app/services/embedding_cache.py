@@ -0,0 +1,265 @@
+"""
+向量缓存
+
+按 (模型名, 规范化文本哈希) 缓存文本的嵌入向量，保存在磁盘上，重启后仍然有效。
+重新向量化时内容未变化的分块直接取缓存，不再请求 Ollama。
+
+每个模型一个目录，包含三个内存映射文件（行号即槽位）：
+- keys.bin：每个槽位的文本哈希（16 字节，全 0 表示空槽位）
+- ticks.bin：每个槽位最近一次使用的时间（纳秒），用于 LRU 淘汰
+- vectors.bin：向量（float16 / float32）
+槽位数固定为 EMBED_CACHE_MAX_ENTRIES，写满后淘汰最久未使用的槽位。
+内存中的「哈希 → 槽位」索引由 keys.bin 扫描得到，无需单独保存。
+
+多个 worker 共用缓存目录：写入在跨进程文件锁内进行，写完递增代数，
+其他进程发现代数变化时重新扫描 keys.bin。读取时在读向量前后各校验一次
+槽位的哈希，槽位被其他进程改写时视为未命中。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.file_lock import InterProcessLock
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 16
+_SUPPORTED_DTYPES = ("float16", "float32")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：Unicode NFC、统一换行、去掉首尾空白"""
+    text = unicodedata.normalize("NFC", text or "")
+    return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+def text_key(model_name: str, text: str) -> bytes:
+    """缓存键：模型名 + 规范化文本的哈希"""
+    digest = hashlib.blake2b(digest_size=KEY_BYTES)
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """单个模型的持久化向量缓存（LRU 淘汰）"""
+
+    def __init__(self, cache_dir: str, model_name: str, capacity: int, dtype: str = "float16"):
+        if dtype not in _SUPPORTED_DTYPES:
+            raise ValueError(f"不支持的缓存向量类型: {dtype}")
+        self.model_name = model_name
+        self.capacity = max(1, capacity)
+        self.dtype = dtype
+        self.directory = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+        self.meta_file = os.path.join(self.directory, "meta.json")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.dimension: Optional[int] = None
+        self._cache_id = None  # meta.json 中的创建标识，文件被重建时需要重新映射
+        self._keys = None
+        self._ticks = None
+        self._vectors = None
+        self._index: Dict[bytes, int] = {}
+        self._generation = -1
+        self._lock = threading.Lock()
+        self._file_lock = InterProcessLock(os.path.join(self.directory, ".lock"))
+
+    # ---------- 文件 ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _open(self, meta: Dict):
+        """按 meta 打开三个内存映射文件"""
+        dimension = meta["dimension"]
+        self._keys = np.memmap(self._path("keys.bin"), dtype=np.uint8, mode="r+",
+                               shape=(self.capacity, KEY_BYTES))
+        self._ticks = np.memmap(self._path("ticks.bin"), dtype=np.int64, mode="r+",
+                                shape=(self.capacity,))
+        self._vectors = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode="r+",
+                                  shape=(self.capacity, dimension))
+        self.dimension = dimension
+        self._cache_id = meta.get("id")
+
+    def _create(self, dimension: int):
+        """创建（或按新的维度 / 容量 / 类型重建）缓存文件（需持有文件锁）"""
+        self._close_maps()
+        for name in ("keys.bin", "ticks.bin", "vectors.bin", "meta.json"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        itemsize = np.dtype(self.dtype).itemsize
+        sizes = {
+            "keys.bin": self.capacity * KEY_BYTES,
+            "ticks.bin": self.capacity * 8,
+            "vectors.bin": self.capacity * dimension * itemsize,
+        }
+        for name, size in sizes.items():
+            with open(self._path(name), "wb") as f:
+                f.truncate(size)  # 稀疏文件，未写入的部分不占磁盘
+        meta = {
+            "model": self.model_name,
+            "dimension": dimension,
+            "dtype": self.dtype,
+            "capacity": self.capacity,
+            "id": time.time_ns(),
+        }
+        tmp_path = f"{self.meta_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_file)
+        logger.info(f"已创建向量缓存 {self.directory}（{self.capacity} 条，{dimension} 维，{self.dtype}）")
+
+    def _close_maps(self):
+        self._keys = self._ticks = self._vectors = None
+        self.dimension = None
+        self._cache_id = None
+        self._index = {}
+
+    def _matches(self, meta: Optional[Dict]) -> bool:
+        return bool(meta) and meta.get("dtype") == self.dtype and meta.get("capacity") == self.capacity
+
+    def _sync(self):
+        """其他进程写入后重新扫描索引（需持有 self._lock）"""
+        generation = self._file_lock.generation()
+        if generation == self._generation:
+            return
+        meta = self._read_meta()
+        if not self._matches(meta):
+            self._close_maps()
+        else:
+            if self._keys is None or self._cache_id != meta.get("id"):
+                self._open(meta)
+            self._rebuild_index()
+        self._generation = generation
+
+    def _rebuild_index(self):
+        """从 keys.bin 重建「哈希 → 槽位」索引"""
+        occupied = np.flatnonzero(self._keys.any(axis=1))
+        keys = self._keys[occupied]
+        self._index = {keys[i].tobytes(): int(slot) for i, slot in enumerate(occupied)}
+
+    # ---------- 读写 ----------
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """查找多个键，返回与 keys 一一对应的向量（float32，未命中为 None）"""
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            self._sync()
+            if self._keys is not None:
+                now = time.time_ns()
+                for i, key in enumerate(keys):
+                    slot = self._index.get(key)
+                    if slot is None or self._keys[slot].tobytes() != key:
+                        continue
+                    vector = np.array(self._vectors[slot], dtype=np.float32)
+                    # 读取期间槽位被其他进程改写时放弃
+                    if self._keys[slot].tobytes() != key:
+                        continue
+                    self._ticks[slot] = now
+                    results[i] = vector
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    def put_many(self, keys: List[bytes], vectors: List[np.ndarray]):
+        """写入多个向量，空间不足时淘汰最久未使用的槽位"""
+        if not keys:
+            return
+        dimension = len(vectors[0])
+        with self._file_lock.exclusive(), self._lock:
+            self._sync()
+            if self.dimension != dimension:
+                # 首次写入，或模型输出维度变了：旧缓存作废
+                self._create(dimension)
+                self._open(self._read_meta())
+                self._rebuild_index()
+                self._generation = self._file_lock.bump()
+
+            pending: Dict[bytes, np.ndarray] = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._index and len(vector) == dimension:
+                    pending[key] = vector
+            pending_items = list(pending.items())[: self.capacity]
+            if not pending_items:
+                return
+
+            slots = self._allocate(len(pending_items))
+            now = time.time_ns()
+            for slot, (key, vector) in zip(slots, pending_items):
+                old_key = self._keys[slot].tobytes()
+                if old_key in self._index:
+                    del self._index[old_key]
+                # 先清空哈希再写向量，读方据此发现槽位正在改写
+                self._keys[slot] = 0
+                self._vectors[slot] = np.asarray(vector, dtype=self.dtype)
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._ticks[slot] = now
+                self._index[key] = int(slot)
+            self._generation = self._file_lock.bump()
+
+    def _allocate(self, count: int) -> np.ndarray:
+        """选出 count 个槽位：优先空槽位，其次最久未使用的槽位"""
+        ticks = np.asarray(self._ticks)
+        if count >= self.capacity:
+            return np.arange(self.capacity)
+        # 空槽位的 tick 为 0，自然排在最前面
+        return np.argpartition(ticks, count - 1)[:count]
+
+    def flush(self):
+        """把内存映射的修改刷到磁盘"""
+        with self._lock:
+            for array in (self._keys, self._ticks, self._vectors):
+                if array is not None:
+                    array.flush()
+
+    def stats(self) -> Dict:
+        """缓存条目数与命中统计"""
+        with self._lock:
+            self._sync()
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._index),
+                "capacity": self.capacity,
+                "dimension": self.dimension,
+                "dtype": self.dtype,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def create_embedding_cache(model_name: str) -> Optional[EmbeddingCache]:
+    """按配置创建向量缓存，未启用或创建失败时返回 None"""
+    if not settings.EMBED_CACHE_ENABLED:
+        return None
+    try:
+        return EmbeddingCache(
+            settings.EMBED_CACHE_DIR,
+            model_name,
+            settings.EMBED_CACHE_MAX_ENTRIES,
+            settings.EMBED_CACHE_DTYPE,
+        )
+    except Exception as e:
+        logger.warning(f"向量缓存不可用: {e}")
+        return None
@@ -0,0 +1,62 @@
+"""
+向量化前的文本预处理
+
+MinerU 输出的 Markdown 中有大量对检索没有帮助的内容：图片链接、长公式、
+表格竖线和 HTML 标签。这些内容只会占用嵌入模型的 token，
+因此送入模型前先去掉或压缩，分块本身（用于展示和引用）保持原样。
+"""
+import html
+import re
+
+# 超过该长度的公式只保留开头部分
+MAX_FORMULA_CHARS = 80
+
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_BLOCK_FORMULA = re.compile(r"\$\$(.+?)\$\$", re.S)
+_INLINE_FORMULA = re.compile(r"(?<!\$)\$([^$\n]+)\$(?!\$)")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$", re.M)
+_HTML_CELL_END = re.compile(r"</t[dh]>|</tr>|<br\s*/?>", re.I)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"[ \t　]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def _condense_formula(match: re.Match) -> str:
+    formula = " ".join(match.group(1).split())
+    if len(formula) > MAX_FORMULA_CHARS:
+        formula = formula[:MAX_FORMULA_CHARS] + " …"
+    return f" ${formula}$ "
+
+
+def clean_for_embedding(text: str) -> str:
+    """
+    生成送入嵌入模型的文本
+
+    - 图片：只保留替代文字；链接：只保留链接文字
+    - 公式：合并空白，过长的只保留开头
+    - 表格：去掉分隔行和竖线，HTML 表格只保留单元格文字
+    - 其他 HTML 标签去掉，实体转义还原，多余空白合并
+    处理后为空（例如只有一张没有替代文字的图片）时返回原文。
+    """
+    if not text:
+        return text
+    cleaned = _IMAGE.sub(lambda m: m.group(1), text)
+    cleaned = _LINK.sub(lambda m: m.group(1), cleaned)
+    cleaned = _BLOCK_FORMULA.sub(_condense_formula, cleaned)
+    cleaned = _INLINE_FORMULA.sub(_condense_formula, cleaned)
+    cleaned = _TABLE_SEPARATOR.sub("", cleaned)
+    cleaned = cleaned.replace("|", " ")
+    cleaned = _HTML_CELL_END.sub(" ", cleaned)
+    cleaned = _HTML_TAG.sub("", cleaned)
+    cleaned = html.unescape(cleaned)
+    cleaned = _SPACES.sub(" ", cleaned)
+    cleaned = "\n".join(line.strip() for line in cleaned.split("\n"))
+    cleaned = _BLANK_LINES.sub("\n\n", cleaned).strip()
+    return cleaned or text.strip() or text
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数：中日韩字符各算一个，其余约 4 个字符一个"""
+    cjk = sum(1 for char in text if "㐀" <= char <= "鿿" or "豈" <= char <= "﫿")
+    return cjk + (len(text) - cjk + 3) // 4
@@ -0,0 +1,221 @@
+"""
+Ollama 模型驻留管理
+
+记录各模型最近一次使用的时间和占用的内存（来自 /api/ps，尚未加载的按 /api/tags 的文件大小估算），
+由后台任务按以下策略卸载模型，代替每次任务结束后无条件卸载：
+
+- 空闲超过 MODEL_IDLE_SECONDS 的模型卸载
+- 已加载模型的总内存超过 MODEL_MEMORY_BUDGET_MB 时，按最久未使用的顺序卸载，直到不超出预算
+- 被固定（pin）的模型不卸载：向量化任务执行期间固定嵌入模型，
+  队列中的文档全部处理完之前不会被卸载
+
+请求 Ollama 时通过 keep_alive(model) 指定驻留时间：固定的模型为 -1（一直驻留），
+其他模型比空闲超时略长，后端退出后由 Ollama 自行卸载。
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Union
+
+import httpx
+
+from app.core.config import settings
+from app.services.ollama_health import ollama_health
+
+logger = logging.getLogger(__name__)
+
+
+class ResidentModel:
+    """单个模型的驻留状态"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.size = 0  # 占用的内存（字节）
+        self.loaded = False
+        self.last_used = time.monotonic()
+        self.pins = 0
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            "name": self.name,
+            "loaded": self.loaded,
+            "size_mb": round(self.size / 1024 / 1024, 1),
+            "idle_seconds": round(now - self.last_used, 1),
+            "pinned": self.pins > 0,
+        }
+
+
+class ModelResidencyManager:
+    """按空闲时间和内存预算管理 Ollama 中驻留的模型"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.idle_seconds = settings.MODEL_IDLE_SECONDS
+        self.budget_bytes = int(settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.interval = settings.OLLAMA_HEALTH_INTERVAL
+        self.models: Dict[str, ResidentModel] = {}
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _get(self, name: str) -> ResidentModel:
+        model = self.models.get(name)
+        if model is None:
+            model = self.models[name] = ResidentModel(name)
+        return model
+
+    # ---------- 使用记录 ----------
+
+    def touch(self, name: str):
+        """记录一次使用（请求成功后调用）"""
+        with self._lock:
+            model = self._get(name)
+            model.last_used = time.monotonic()
+            model.loaded = True
+
+    def keep_alive(self, name: str) -> Union[int, str]:
+        """请求 Ollama 时使用的 keep_alive"""
+        with self._lock:
+            model = self.models.get(name)
+            if model is not None and model.pins > 0:
+                return -1
+        if self.idle_seconds <= 0:
+            return -1
+        return f"{int(self.idle_seconds + self.interval)}s"
+
+    def pin(self, name: str):
+        with self._lock:
+            model = self._get(name)
+            model.pins += 1
+            model.last_used = time.monotonic()
+
+    def unpin(self, name: str):
+        with self._lock:
+            model = self._get(name)
+            model.pins = max(0, model.pins - 1)
+            # 从释放固定时开始计算空闲时间
+            model.last_used = time.monotonic()
+
+    @contextmanager
+    def pinned(self, name: str):
+        """在 with 块内固定模型，不会被卸载"""
+        self.pin(name)
+        try:
+            yield
+        finally:
+            self.unpin(name)
+
+    # ---------- 卸载策略 ----------
+
+    def sync(self, loaded_models: List[Dict], installed_models: List[Dict]):
+        """按 /api/ps 的结果更新加载状态和内存占用"""
+        sizes = {m.get("name", ""): m.get("size", 0) for m in installed_models}
+        loaded = {}
+        for m in loaded_models:
+            name = m.get("name") or m.get("model", "")
+            loaded[name] = m.get("size_vram") or m.get("size") or sizes.get(name, 0)
+        with self._lock:
+            for name, size in loaded.items():
+                model = self._get(name)
+                if not model.loaded:
+                    # 由其他客户端加载的模型，从发现时开始计算空闲时间
+                    model.last_used = time.monotonic()
+                model.loaded = True
+                model.size = size
+            for name, model in self.models.items():
+                if name not in loaded:
+                    model.loaded = False
+                    model.size = model.size or sizes.get(name, 0)
+
+    def plan_evictions(self, now: Optional[float] = None) -> List[str]:
+        """需要卸载的模型：先是空闲超时的，再按最久未使用的顺序卸载到不超出内存预算"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            loaded = [m for m in self.models.values() if m.loaded]
+            candidates = sorted((m for m in loaded if m.pins == 0), key=lambda m: m.last_used)
+            evict = []
+            if self.idle_seconds > 0:
+                evict = [m for m in candidates if now - m.last_used >= self.idle_seconds]
+            if self.budget_bytes > 0:
+                total = sum(m.size for m in loaded if m not in evict)
+                for model in candidates:
+                    if total <= self.budget_bytes:
+                        break
+                    if model not in evict:
+                        evict.append(model)
+                        total -= model.size
+            return [m.name for m in evict]
+
+    async def unload(self, name: str) -> bool:
+        """请求 Ollama 立即卸载模型（keep_alive 为 0）"""
+        try:
+            async with httpx.AsyncClient(timeout=30.0) as client:
+                response = await client.post(
+                    f"{self.base_url}/api/generate",
+                    json={"model": name, "prompt": "", "keep_alive": 0},
+                )
+                response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"卸载模型 {name} 失败: {e}")
+            return False
+        with self._lock:
+            self._get(name).loaded = False
+            self.evictions += 1
+        return True
+
+    async def enforce(self) -> List[str]:
+        """按当前的健康检查快照执行一次卸载策略，返回已卸载的模型"""
+        if not ollama_health.running:
+            return []
+        self.sync(ollama_health.loaded_models, ollama_health.models)
+        unloaded = []
+        for name in self.plan_evictions():
+            if await self.unload(name):
+                logger.info(f"已卸载空闲模型 {name}")
+                unloaded.append(name)
+        if unloaded:
+            await ollama_health.refresh()
+        return unloaded
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.enforce()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"模型驻留检查异常: {e}")
+
+    def start(self):
+        """启动后台任务（在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            models = [m.to_dict(now) for m in self.models.values()]
+            loaded_bytes = sum(m.size for m in self.models.values() if m.loaded)
+        return {
+            "idle_seconds": self.idle_seconds,
+            "budget_mb": round(self.budget_bytes / 1024 / 1024, 1),
+            "loaded_mb": round(loaded_bytes / 1024 / 1024, 1),
+            "evictions": self.evictions,
+            "models": models,
+        }
+
+
+# 全局模型驻留管理实例
+model_residency = ModelResidencyManager("http://localhost:11434")
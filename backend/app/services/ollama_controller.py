@@ -150,7 +150,7 @@ class OllamaController:
                     "model": model_name,
                     "prompt": "",
                     "stream": False,
-                    "keep_alive": False  # 关键：不保持模型在内存中
+                    "keep_alive": 0  # 关键：不保持模型在内存中
                 },
                 timeout=10
             )
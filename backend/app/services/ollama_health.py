@@ -0,0 +1,201 @@
+"""
+Ollama 健康状态监控
+
+后台任务定期请求 /api/tags 和 /api/ps，缓存服务状态和模型列表，
+接口和检索路径直接读取缓存的快照，不再每次请求前做一次连通性检查。
+
+熔断器：连续失败达到阈值（后台检查或实际请求的连接失败都计入）后断开，
+断开期间调用方立即失败；经过 OLLAMA_BREAKER_RESET_SECONDS 后由后台任务探测一次，
+成功则恢复。
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailableError(Exception):
+    """Ollama 不可用（熔断器断开）"""
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    closed：正常放行；open：拒绝请求；
+    half_open：open 状态超过重置时间，等待一次探测决定恢复还是继续断开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """是否放行请求（只有 closed 状态放行，恢复由后台探测完成）"""
+        return self.state == self.CLOSED
+
+    def seconds_until_probe(self) -> float:
+        """距离下一次恢复探测的秒数"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Ollama 已恢复，熔断器关闭")
+            self.failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == self.OPEN or self.failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Ollama 连续失败 {self.failures} 次，熔断器断开")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class OllamaHealthMonitor:
+    """Ollama 健康状态监控（后台刷新 + 缓存快照 + 熔断器）"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.interval = settings.OLLAMA_HEALTH_INTERVAL
+        self.timeout = settings.OLLAMA_HEALTH_TIMEOUT
+        self.breaker = CircuitBreaker(
+            settings.OLLAMA_BREAKER_FAILURES,
+            settings.OLLAMA_BREAKER_RESET_SECONDS,
+        )
+        self.running = False
+        self.models: List[Dict] = []  # /api/tags：已安装的模型
+        self.loaded_models: List[Dict] = []  # /api/ps：已加载到内存 / 显存的模型
+        self.checked_at: Optional[str] = None
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- 刷新 ----------
+
+    async def refresh(self) -> bool:
+        """请求 Ollama 刷新快照，返回服务是否可用"""
+        started = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                tags = await client.get(f"{self.base_url}/api/tags")
+                tags.raise_for_status()
+                ps = await client.get(f"{self.base_url}/api/ps")
+                loaded = ps.json().get("models", []) if ps.status_code == 200 else []
+        except Exception as e:
+            self.running = False
+            self.error = str(e) or type(e).__name__
+            self.breaker.record_failure()
+        else:
+            self.running = True
+            self.models = tags.json().get("models", [])
+            self.loaded_models = loaded
+            self.error = None
+            self.breaker.record_success()
+        self.latency_ms = round((time.monotonic() - started) * 1000, 1)
+        self.checked_at = datetime.now().isoformat()
+        return self.running
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ollama 健康检查异常: {e}")
+            # 熔断期间等到探测时间再检查，否则按固定间隔刷新
+            await asyncio.sleep(max(self.interval, self.breaker.seconds_until_probe()))
+
+    def start(self):
+        """启动后台刷新任务（在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ---------- 实际请求的结果 ----------
+
+    def record_success(self):
+        """实际请求成功"""
+        self.breaker.record_success()
+
+    def record_failure(self, error: Exception):
+        """实际请求连接失败或服务端返回 5xx（4xx 是请求本身的问题，不应计入）"""
+        self.error = str(error) or type(error).__name__
+        self.breaker.record_failure()
+
+    # ---------- 查询 ----------
+
+    def model_names(self) -> List[str]:
+        return [m.get("name", "") for m in self.models]
+
+    def is_available(self, model_name: Optional[str] = None) -> bool:
+        """
+        按缓存的快照判断 Ollama（及指定模型）是否可用，不发起请求
+
+        尚未完成第一次检查时乐观地返回 True，由实际请求的结果驱动熔断器。
+        """
+        if not self.breaker.allow_request():
+            return False
+        if self.checked_at is None:
+            return True
+        if not self.running:
+            return False
+        return model_name is None or model_name in self.model_names()
+
+    def check(self):
+        """熔断器断开时立即抛出 OllamaUnavailableError"""
+        if not self.breaker.allow_request():
+            raise OllamaUnavailableError(f"Ollama 服务不可用: {self.error or '熔断中'}")
+
+    def snapshot(self) -> Dict:
+        return {
+            "running": self.running,
+            "models": self.models,
+            "loaded_models": self.loaded_models,
+            "checked_at": self.checked_at,
+            "latency_ms": self.latency_ms,
+            "error": self.error,
+            "breaker": self.breaker.state,
+        }
+
+
+# 全局 Ollama 健康监控实例
+ollama_health = OllamaHealthMonitor("http://localhost:11434")
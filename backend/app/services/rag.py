@@ -10,10 +10,13 @@ import threading
 import asyncio
 from datetime import datetime
 
+from app.core.config import settings
 from app.services.embedding import embedding_service
+from app.services.embedding_cache import normalize_text
+from app.services.query_cache import LRUCache, copy_results, vector_digest
 from app.services.vector_store import vector_store
 from app.models.document import storage
-from app.services.ollama_controller import ollama_controller
+from app.services.model_residency import model_residency
 
 logger = logging.getLogger(__name__)
 
@@ -37,16 +40,16 @@ class TaskManager:
             return True
 
     def stop_task(self, task_id: str) -> bool:
-        """停止任务并释放显存"""
+        """
+        停止任务
+
+        只标记状态，不卸载模型：模型由 model_residency 按空闲时间和内存预算卸载，
+        避免下一次问答重新加载模型。
+        """
         with self.lock:
             if task_id in self.active_tasks:
                 self.active_tasks[task_id]["status"] = "stopped"
-                # 释放显存
-                try:
-                    ollama_controller.unload_all_models()
-                    logger.info(f"任务 {task_id} 已停止，已释放显存")
-                except Exception as e:
-                    logger.warning(f"释放显存失败: {e}")
+                logger.info(f"任务 {task_id} 已停止")
                 return True
             return False
 
@@ -83,13 +86,17 @@ class RAGService:
         self.top_k = top_k
         self.rerank_top_k = rerank_top_k
         self.client = httpx.Client(timeout=120.0)
+        # 查询向量缓存和检索结果缓存
+        self.query_vectors = LRUCache(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL_SECONDS)
+        self.search_results = LRUCache(settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL_SECONDS)
 
     def search_relevant_chunks(
         self,
         query: str,
         document_id: str = None,
         document_ids: List[str] = None,
-        top_k: int = None
+        top_k: int = None,
+        folder_ids: List[str] = None
     ) -> List[Dict]:
         """
         搜索相关文档块
@@ -97,40 +104,186 @@ class RAGService:
         Args:
             query: 查询文本
             document_id: 单个文档ID
-            document_ids: 多个文档ID列表（用于知识库级别搜索）
+            document_ids: 多个文档ID列表
             top_k: 返回结果数量
+            folder_ids: 知识库ID列表（用于知识库级别搜索，按 folder_id 分区检索）
 
         Returns:
             相关文档块列表
         """
-        if not vector_store.connected:
-            vector_store.connect()
-
         # 生成查询向量
-        query_vector = embedding_service.encode_single(query)
+        query_vector = self.query_vector(query)
+        return self.search_with_vector(query_vector, document_id, document_ids, top_k, folder_ids)
+
+    async def search_relevant_chunks_async(
+        self,
+        query: str,
+        document_id: str = None,
+        document_ids: List[str] = None,
+        top_k: int = None,
+        folder_ids: List[str] = None
+    ) -> List[Dict]:
+        """
+        异步搜索相关文档块
+
+        查询向量通过异步客户端生成，Milvus 搜索在线程池中执行，不阻塞事件循环。
+        """
+        query_vector = await self.query_vector_async(query)
+        return await asyncio.to_thread(
+            self.search_with_vector, query_vector, document_id, document_ids, top_k, folder_ids
+        )
+
+    def _query_key(self, query: str) -> tuple:
+        return embedding_service.model_name, normalize_text(query)
+
+    def query_vector(self, query: str) -> List[float]:
+        """生成查询向量（优先取缓存）"""
+        key = self._query_key(query)
+        vector = self.query_vectors.get(key)
+        if vector is None:
+            vector = embedding_service.encode_single(query)
+            self.query_vectors.put(key, vector)
+        return vector
+
+    async def query_vector_async(self, query: str) -> List[float]:
+        """异步生成查询向量（优先取缓存）"""
+        key = self._query_key(query)
+        vector = self.query_vectors.get(key)
+        if vector is None:
+            vector = await embedding_service.encode_single_async(query)
+            self.query_vectors.put(key, vector)
+        return vector
+
+    def search_with_vector(
+        self,
+        query_vector: List[float],
+        document_id: str = None,
+        document_ids: List[str] = None,
+        top_k: int = None,
+        folder_ids: List[str] = None
+    ) -> List[Dict]:
+        """
+        用已生成的查询向量搜索文档块
 
-        # 向量搜索
+        结果按 (查询向量摘要, 文档范围, top_k, 文件夹向量数据版本号) 缓存，
+        范围内的文档重新向量化或删除后缓存失效。
+        """
+        return self.search_with_vectors([query_vector], document_id, document_ids, top_k, folder_ids)[0]
+
+    def search_with_vectors(
+        self,
+        query_vectors: List[List[float]],
+        document_id: str = None,
+        document_ids: List[str] = None,
+        top_k: int = None,
+        folder_ids: List[str] = None
+    ) -> List[List[Dict]]:
+        """多个查询向量在同一范围内搜索，未命中缓存的查询合并为一次 Milvus 搜索"""
         top_k = top_k or self.top_k
+        if folder_ids is not None:
+            scope = ("folders",) + tuple(sorted(set(folder_ids)))
+            version = storage.folder_vector_version(folder_ids)
+        elif document_ids:
+            scope = tuple(sorted(document_ids))
+            version = storage.vector_version(document_ids)
+        elif document_id:
+            scope = (document_id,)
+            version = storage.vector_version([document_id])
+        else:
+            scope = None
+            version = storage.version()  # 不限范围时任何文档变化都使缓存失效
+        keys = [(vector_digest(vector), scope, top_k, version) for vector in query_vectors]
+
+        results = [self.search_results.get(key) for key in keys]
+        missing = {}  # 未命中的缓存键 -> 查询向量（相同的查询只搜索一次）
+        for key, vector, hits in zip(keys, query_vectors, results):
+            if hits is None:
+                missing.setdefault(key, vector)
+        if missing:
+            found = dict(zip(
+                missing,
+                self._search(list(missing.values()), document_id, document_ids, top_k, folder_ids)
+            ))
+            for key, hits in found.items():
+                self.search_results.put(key, copy_results(hits))
+            results = [hits if hits is not None else found[key] for key, hits in zip(keys, results)]
+        return [copy_results(hits) for hits in results]
+
+    def _search(
+        self,
+        query_vectors: List[List[float]],
+        document_id: str,
+        document_ids: List[str],
+        top_k: int,
+        folder_ids: List[str] = None
+    ) -> List[List[Dict]]:
+        """执行向量搜索（不经过缓存）"""
+        if not vector_store.connected:
+            vector_store.connect()
+
+        # 知识库：按 folder_id 分区键只搜索对应分区；旧集合没有分区键时退回按文档 ID 过滤
+        if folder_ids is not None:
+            vector_store.ensure_loaded()
+            if vector_store.folder_key:
+                return vector_store.search_batch(query_vectors, top_k, folder_ids=folder_ids)
+            document_ids = storage.folder_document_ids(folder_ids)
+            if not document_ids:
+                return [[] for _ in query_vectors]
 
-        # 如果提供了多个文档ID，分别搜索后合并
+        # 多个文档：一次带 document_id in [...] 过滤的搜索，直接得到全局 top_k
         if document_ids:
-            all_results = []
-            per_doc_k = max(top_k // len(document_ids), 3)  # 每个文档至少返回3个
-            for doc_id in document_ids:
-                try:
-                    results = vector_store.search(query_vector, per_doc_k, doc_id)
-                    all_results.extend(results)
-                except Exception as e:
-                    logger.warning(f"搜索文档 {doc_id} 失败: {e}")
-                    continue
-
-            # 按score排序并返回top_k
-            all_results.sort(key=lambda x: x.get("score", 0), reverse=True)
-            return all_results[:top_k]
-        else:
-            # 单个文档搜索
-            results = vector_store.search(query_vector, top_k, document_id)
-            return results
+            return vector_store.search_batch(query_vectors, top_k, document_ids=document_ids)
+        return vector_store.search_batch(query_vectors, top_k, document_id)
+
+    def query_vectors_batch(self, queries: List[str]) -> List[Optional[List[float]]]:
+        """
+        生成多个查询向量（优先取缓存），未命中的一次编码
+
+        编码失败的查询对应位置为 None，不影响其他查询。
+        """
+        keys = [self._query_key(query) for query in queries]
+        vectors = [self.query_vectors.get(key) for key in keys]
+        missing = {}  # 未命中的查询键 -> 查询文本（相同的查询只编码一次）
+        for query, key, vector in zip(queries, keys, vectors):
+            if vector is None:
+                missing.setdefault(key, query)
+        if missing:
+            missing_keys = list(missing)
+            indices, embeddings = embedding_service.encode_with_indices(list(missing.values()))
+            encoded = {missing_keys[i]: embedding.tolist() for i, embedding in zip(indices, embeddings)}
+            for key, vector in encoded.items():
+                self.query_vectors.put(key, vector)
+            if len(encoded) < len(missing):
+                logger.warning(f"{len(missing) - len(encoded)} 个查询编码失败，已跳过")
+            vectors = [vector if vector is not None else encoded.get(key) for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def search_relevant_chunks_batch(
+        self,
+        queries: List[str],
+        document_id: str = None,
+        document_ids: List[str] = None,
+        top_k: int = None,
+        folder_ids: List[str] = None
+    ) -> List[List[Dict]]:
+        """
+        批量搜索相关文档块（如整份大纲的各个章节、一批评测问题）
+
+        查询一次编码，一次多向量搜索，返回与 queries 一一对应的结果列表；
+        编码失败的查询结果为空列表。
+        """
+        if not queries:
+            return []
+        query_vectors = self.query_vectors_batch(queries)
+        encoded = [i for i, vector in enumerate(query_vectors) if vector is not None]
+        results = [[] for _ in queries]
+        if encoded:
+            found = self.search_with_vectors(
+                [query_vectors[i] for i in encoded], document_id, document_ids, top_k, folder_ids
+            )
+            for i, hits in zip(encoded, found):
+                results[i] = hits
+        return results
 
     def rerank_chunks(
         self,
@@ -201,6 +354,7 @@ class RAGService:
                         }
                     ],
                     "stream": False,
+                    "keep_alive": model_residency.keep_alive(self.llm_model),
                     "options": {
                         "temperature": 0.7,
                         "top_p": 0.9,
@@ -211,6 +365,7 @@ class RAGService:
             )
 
             response.raise_for_status()
+            model_residency.touch(self.llm_model)
             result = response.json()
 
             # 获取生成的回答
@@ -291,7 +446,8 @@ class RAGService:
         document_ids: List[str] = None,
         conversation_id: str = None,
         conversation_history: List[Dict] = None,
-        task_id: str = None
+        task_id: str = None,
+        folder_ids: List[str] = None
     ) -> Dict:
         """
         完整的 RAG 问答流程
@@ -299,65 +455,68 @@ class RAGService:
         Args:
             query: 用户问题
             document_id: 单个文档ID
-            document_ids: 多个文档ID列表（用于知识库级别搜索）
+            document_ids: 多个文档ID列表
             conversation_id: 对话ID（用于获取历史）
             conversation_history: 对话历史
             task_id: 任务ID，用于停止任务
+            folder_ids: 知识库ID列表（用于知识库级别搜索）
 
         Returns:
             回答结果，包含答案和引用的文档块
         """
         try:
-            # 检查任务是否被停止
-            if task_id and task_manager.is_task_stopped(task_id):
-                logger.info(f"任务 {task_id} 已被停止")
-                raise Exception("任务已被用户停止")
+            self._check_stopped(task_id)
 
             # 1. 检索相关文档
             logger.info(f"开始检索相关文档，查询: {query}")
             retrieved_chunks = self.search_relevant_chunks(
                 query,
                 document_id=document_id,
-                document_ids=document_ids
+                document_ids=document_ids,
+                folder_ids=folder_ids
             )
             logger.info(f"检索到 {len(retrieved_chunks)} 个相关文档块")
 
-            # 检查任务是否被停止
-            if task_id and task_manager.is_task_stopped(task_id):
-                logger.info(f"任务 {task_id} 已被停止")
-                raise Exception("任务已被用户停止")
-
-            # 2. 重排序
-            reranked_chunks = self.rerank_chunks(query, retrieved_chunks)
-            logger.info(f"重排序后保留 {len(reranked_chunks)} 个文档块")
-
-            # 3. 生成回答
-            logger.info("开始生成回答")
-            answer = self.generate_answer(query, reranked_chunks, conversation_history, task_id)
-            logger.info("回答生成完成")
-
-            # 4. 返回结果（包含引用的文档块）
-            # 获取文档名称映射
-            doc_names = self._get_document_names(reranked_chunks)
+            return self._answer_from_chunks(query, retrieved_chunks, conversation_history, task_id)
 
+        except Exception as e:
             # 清理任务
             if task_id:
                 task_manager.remove_task(task_id)
+            logger.error(f"RAG 问答失败: {e}")
+            raise
 
-            return {
-                "answer": answer,
-                "sources": [
-                    {
-                        "id": chunk.get("id"),
-                        "document_id": chunk.get("document_id"),
-                        "document_name": doc_names.get(chunk.get("document_id"), "未知文档"),
-                        "title": chunk.get("title"),
-                        "content": chunk.get("content"),
-                        "score": chunk.get("score", 0)
-                    }
-                    for chunk in reranked_chunks
-                ]
-            }
+    async def answer_question_async(
+        self,
+        query: str,
+        document_id: str = None,
+        document_ids: List[str] = None,
+        conversation_id: str = None,
+        conversation_history: List[Dict] = None,
+        task_id: str = None,
+        folder_ids: List[str] = None
+    ) -> Dict:
+        """
+        异步 RAG 问答流程，参数同 answer_question
+
+        检索使用异步嵌入客户端，重排序和生成回答仍是同步请求，放到线程池中执行。
+        """
+        try:
+            self._check_stopped(task_id)
+
+            # 1. 检索相关文档
+            logger.info(f"开始检索相关文档，查询: {query}")
+            retrieved_chunks = await self.search_relevant_chunks_async(
+                query,
+                document_id=document_id,
+                document_ids=document_ids,
+                folder_ids=folder_ids
+            )
+            logger.info(f"检索到 {len(retrieved_chunks)} 个相关文档块")
+
+            return await asyncio.to_thread(
+                self._answer_from_chunks, query, retrieved_chunks, conversation_history, task_id
+            )
 
         except Exception as e:
             # 清理任务
@@ -366,6 +525,54 @@ class RAGService:
             logger.error(f"RAG 问答失败: {e}")
             raise
 
+    def _check_stopped(self, task_id: Optional[str]):
+        """检查任务是否被停止"""
+        if task_id and task_manager.is_task_stopped(task_id):
+            logger.info(f"任务 {task_id} 已被停止")
+            raise Exception("任务已被用户停止")
+
+    def _answer_from_chunks(
+        self,
+        query: str,
+        retrieved_chunks: List[Dict],
+        conversation_history: List[Dict] = None,
+        task_id: str = None
+    ) -> Dict:
+        """对检索结果重排序并生成回答（异常由调用方处理）"""
+        self._check_stopped(task_id)
+
+        # 2. 重排序
+        reranked_chunks = self.rerank_chunks(query, retrieved_chunks)
+        logger.info(f"重排序后保留 {len(reranked_chunks)} 个文档块")
+
+        # 3. 生成回答
+        logger.info("开始生成回答")
+        answer = self.generate_answer(query, reranked_chunks, conversation_history, task_id)
+        logger.info("回答生成完成")
+
+        # 4. 返回结果（包含引用的文档块）
+        # 获取文档名称映射
+        doc_names = self._get_document_names(reranked_chunks)
+
+        # 清理任务
+        if task_id:
+            task_manager.remove_task(task_id)
+
+        return {
+            "answer": answer,
+            "sources": [
+                {
+                    "id": chunk.get("id"),
+                    "document_id": chunk.get("document_id"),
+                    "document_name": doc_names.get(chunk.get("document_id"), "未知文档"),
+                    "title": chunk.get("title"),
+                    "content": chunk.get("content"),
+                    "score": chunk.get("score", 0)
+                }
+                for chunk in reranked_chunks
+            ]
+        }
+
 
 # 全局 RAG 服务实例
 rag_service = RAGService()
@@ -3,7 +3,10 @@
 使用 Milvus 存储和检索文档向量
 """
 import logging
-from typing import List, Dict, Optional, Tuple
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Dict, Optional, Tuple
+import numpy as np
 from pymilvus import (
     connections,
     Collection,
@@ -13,8 +16,171 @@ from pymilvus import (
     utility
 )
 
+from app.core.config import settings
+
+try:
+    from ml_dtypes import bfloat16
+except ImportError:  # 未安装 ml_dtypes 时不支持 bfloat16 编码
+    bfloat16 = None
+
 logger = logging.getLogger(__name__)
 
+# 向量编码 -> Milvus 字段类型
+VECTOR_FIELD_TYPES = {
+    "float32": DataType.FLOAT_VECTOR,
+    "float16": DataType.FLOAT16_VECTOR,
+    "bfloat16": DataType.BFLOAT16_VECTOR,
+}
+
+# 支持的索引类型及其建索引参数
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_SQ8", "HNSW")
+
+
+def encode_vectors(vectors, encoding: str) -> list:
+    """
+    把 float32 向量转换为集合字段要求的格式
+
+    float32 字段接收嵌套列表；float16 / bfloat16 字段接收对应类型的 numpy 数组。
+    """
+    array = np.asarray(vectors, dtype=np.float32)
+    if array.ndim == 1:
+        array = array.reshape(1, -1)
+    if encoding == "float32":
+        return array.tolist()
+    if encoding == "float16":
+        return list(array.astype(np.float16))
+    if encoding == "bfloat16":
+        if bfloat16 is None:
+            raise ValueError("bfloat16 向量编码需要安装 ml_dtypes：pip install ml-dtypes")
+        return list(array.astype(bfloat16))
+    raise ValueError(f"不支持的向量编码: {encoding}")
+
+
+def index_params(index_type: str, nlist: int) -> Dict:
+    """建索引参数"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}，可选: {', '.join(INDEX_TYPES)}")
+    if index_type == "FLAT":
+        params = {}
+    elif index_type == "HNSW":
+        params = {"M": 16, "efConstruction": 200}
+    else:
+        params = {"nlist": nlist}
+    return {"index_type": index_type, "metric_type": "COSINE", "params": params}
+
+
+# 一个过滤表达式中最多包含的文档 ID 数，超出时分组搜索后合并（避免表达式过长）
+MAX_FILTER_IDS = 1000
+
+
+def _quote(value: str) -> str:
+    """Milvus 表达式中的字符串字面量"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def document_filter(document_ids: List[str]) -> str:
+    """限定文档范围的过滤表达式"""
+    if len(document_ids) == 1:
+        return f"document_id == {_quote(document_ids[0])}"
+    return f"document_id in [{', '.join(_quote(d) for d in document_ids)}]"
+
+
+def folder_filter(folder_ids: List[str]) -> str:
+    """限定知识库范围的过滤表达式（folder_id 为分区键，Milvus 只搜索对应的分区）"""
+    if len(folder_ids) == 1:
+        return f"folder_id == {_quote(folder_ids[0])}"
+    return f"folder_id in [{', '.join(_quote(f) for f in folder_ids)}]"
+
+
+def decode_vector(value, encoding: str) -> List[float]:
+    """query 读出的向量字段 -> float32 列表（float16 / bfloat16 字段读出的是原始字节）"""
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], (bytes, bytearray)):
+        value = value[0]
+    if isinstance(value, (bytes, bytearray)):
+        if encoding == "bfloat16":
+            if bfloat16 is None:
+                raise ValueError("bfloat16 向量编码需要安装 ml_dtypes：pip install ml-dtypes")
+            dtype = bfloat16
+        else:
+            dtype = np.float16
+        return np.frombuffer(value, dtype=dtype).astype(np.float32).tolist()
+    return [float(x) for x in value]
+
+
+def search_params(index_type: str, top_k: int, nprobe: int) -> Dict:
+    """搜索参数"""
+    if index_type == "HNSW":
+        params = {"ef": max(top_k, 64)}
+    elif index_type == "FLAT":
+        params = {}
+    else:
+        params = {"nprobe": nprobe}
+    return {"metric_type": "COSINE", "params": params}
+
+
+# 各向量编码每个维度占用的字节数
+VECTOR_BYTES = {"float32": 4, "float16": 2, "bfloat16": 2}
+
+
+class InsertBuffer:
+    """
+    跨文档的插入缓冲（VectorStore.write_batch 范围内使用）
+
+    分块先进入缓冲，行数或字节数达到阈值时一次写入 Milvus；
+    写入成功后以 {文档 ID: 块数} 调用 on_inserted（调用方此时再把文档标记为已向量化），
+    写入失败的文档记入 failed_document_ids，由调用方更新状态。
+    同一文档的分块一次加入、一次取出，不会被拆到两次写入中。
+    """
+
+    def __init__(self, max_rows: int, max_bytes: int):
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max(1, max_bytes)
+        self.chunks: List[Dict] = []
+        self.embeddings: List[List[float]] = []
+        self.sizes: List[int] = []  # 每个分块的估算字节数
+        self.bytes = 0
+        self.failed_document_ids: set = set()
+        self.inserted_rows = 0
+        self.inserts = 0  # 向 Milvus 发起的插入次数
+        self.segments: Optional[int] = None  # 结束后集合的段数
+        self.on_inserted: Optional[Callable[[Dict[str, int]], None]] = None
+
+    def add(self, chunks: List[Dict], embeddings: List[List[float]], vector_bytes: int):
+        self.chunks.extend(chunks)
+        self.embeddings.extend(embeddings)
+        for chunk in chunks:
+            size = vector_bytes + sum(
+                len(str(chunk[name]).encode("utf-8")) for name in ("id", "document_id", "title", "content") if name in chunk
+            )
+            self.sizes.append(size)
+            self.bytes += size
+
+    def discard(self, document_id: str):
+        """丢弃缓冲中某个文档的分块（文档随后会被删除或重新写入）"""
+        keep = [i for i, chunk in enumerate(self.chunks) if chunk["document_id"] != document_id]
+        if len(keep) < len(self.chunks):
+            self.chunks = [self.chunks[i] for i in keep]
+            self.embeddings = [self.embeddings[i] for i in keep]
+            self.sizes = [self.sizes[i] for i in keep]
+            self.bytes = sum(self.sizes)
+
+    def move(self, document_id: str, folder_id: str) -> int:
+        """修改缓冲中某个文档分块的 folder_id（文档移动到其他知识库），返回修改的块数"""
+        moved = 0
+        for chunk in self.chunks:
+            if chunk["document_id"] == document_id:
+                chunk["folder_id"] = folder_id
+                moved += 1
+        return moved
+
+    def full(self) -> bool:
+        return len(self.chunks) >= self.max_rows or self.bytes >= self.max_bytes
+
+    def take(self) -> Tuple[List[Dict], List[List[float]]]:
+        chunks, embeddings = self.chunks, self.embeddings
+        self.chunks, self.embeddings, self.sizes, self.bytes = [], [], [], 0
+        return chunks, embeddings
+
 
 class VectorStore:
     """Milvus 向量存储服务"""
@@ -23,7 +189,9 @@ class VectorStore:
         self,
         host: str = "localhost",
         port: int = 19530,
-        collection_name: str = "document_chunks"
+        collection_name: str = "document_chunks",
+        encoding: str = None,
+        index_type: str = None
     ):
         """
         初始化向量存储
@@ -32,12 +200,116 @@ class VectorStore:
             host: Milvus 服务器地址
             port: Milvus 服务器端口
             collection_name: 集合名称
+            encoding: 新建集合的向量编码（float32 / float16 / bfloat16），默认取配置
+            index_type: 新建集合的索引类型，默认取配置
         """
         self.host = host
         self.port = port
         self.collection_name = collection_name
         self.collection = None
         self.connected = False
+        self.loaded = False  # 集合是否已加载到内存（可检索）
+        self.folder_key = False  # 集合是否有 folder_id 分区键（旧集合没有，需要迁移）
+        self._load_lock = threading.Lock()
+        self._buffer: Optional[InsertBuffer] = None  # write_batch 范围内的插入缓冲
+        self._batch_depth = 0
+        self._buffer_lock = threading.Lock()
+        self.encoding = encoding or settings.VECTOR_ENCODING
+        self.index_type = index_type or settings.VECTOR_INDEX_TYPE
+        if self.encoding not in VECTOR_FIELD_TYPES:
+            raise ValueError(f"不支持的向量编码: {self.encoding}")
+        index_params(self.index_type, settings.VECTOR_INDEX_NLIST)  # 校验索引类型
+
+    def _use_collection(self, collection: Collection):
+        """
+        使用已有集合
+
+        已有集合的向量编码和索引类型以集合本身为准（与配置不同时需要清空重建才会生效）。
+        """
+        self.collection = collection
+        self.loaded = False
+        self.folder_key = any(field.name == "folder_id" for field in collection.schema.fields)
+        if not self.folder_key:
+            logger.warning(
+                f"集合 {self.collection_name} 没有 folder_id 分区键，知识库检索按文档 ID 过滤；"
+                f"运行 python -m scripts.migrate_vectors 迁移后可按分区检索"
+            )
+        for field in collection.schema.fields:
+            if field.name != "vector":
+                continue
+            for encoding, dtype in VECTOR_FIELD_TYPES.items():
+                if field.dtype == dtype:
+                    if encoding != self.encoding:
+                        logger.warning(
+                            f"集合 {self.collection_name} 的向量编码为 {encoding}，"
+                            f"与配置的 {self.encoding} 不同，清空重建后才会使用新编码"
+                        )
+                    self.encoding = encoding
+        for index in collection.indexes:
+            if index.field_name == "vector":
+                self.index_type = index.params.get("index_type", self.index_type)
+
+    @property
+    def ready(self) -> bool:
+        """集合已打开并加载，可以直接检索"""
+        return self.collection is not None and self.loaded
+
+    def ensure_loaded(self):
+        """
+        确保集合已打开并加载到内存
+
+        只在首次使用、新建集合或集合被释放后调用 load()，检索路径上不再每次请求都发起加载。
+        """
+        if self.ready:
+            return
+        with self._load_lock:
+            if self.collection is None:
+                if not self.connected:
+                    self.connect()
+                if not utility.has_collection(self.collection_name):
+                    raise ValueError(f"集合 {self.collection_name} 不存在")
+                self._use_collection(Collection(self.collection_name))
+            if not self.loaded:
+                self.collection.load()
+                self.loaded = True
+                logger.info(f"集合 {self.collection_name} 已加载")
+
+    def warm_up(self) -> bool:
+        """启动时打开并加载已有集合（集合不存在或 Milvus 不可用时跳过）"""
+        try:
+            self.ensure_loaded()
+            return True
+        except Exception as e:
+            logger.warning(f"预加载集合 {self.collection_name} 失败: {e}")
+            return False
+
+    def release(self):
+        """从内存中释放集合"""
+        if self.collection is not None:
+            self.collection.release()
+        self.loaded = False
+
+    def drop(self):
+        """删除集合"""
+        if not self.connected:
+            self.connect()
+        if utility.has_collection(self.collection_name):
+            utility.drop_collection(self.collection_name)
+        self.collection = None
+        self.loaded = False
+
+    def _on_not_loaded(self, error: Exception) -> bool:
+        """
+        检索失败是否因为集合已被释放或删除（例如在其他客户端中 release / drop）；
+        是则重置加载状态，由调用方重试一次
+        """
+        message = str(error).lower()
+        if any(text in message for text in ("not loaded", "collection not found", "can't find collection")):
+            logger.warning(f"集合 {self.collection_name} 未加载或已删除，重新加载: {error}")
+            self.collection = None
+            self.loaded = False
+            return True
+        return False
 
     def connect(self):
         """连接到 Milvus"""
@@ -68,50 +340,68 @@ class VectorStore:
         has_collection = utility.has_collection(self.collection_name)
 
         if has_collection and drop_existing:
-            utility.drop_collection(self.collection_name)
+            self.drop()
             has_collection = False
             logger.info(f"已删除旧集合: {self.collection_name}")
 
         if has_collection:
-            # 使用现有集合
-            self.collection = Collection(self.collection_name)
-            logger.info(f"使用现有集合: {self.collection_name}")
+            # 使用现有集合（已经打开时不重复打开）
+            if self.collection is None:
+                self._use_collection(Collection(self.collection_name))
+                logger.info(f"使用现有集合: {self.collection_name}")
         else:
             # 创建新集合
-            fields = [
-                FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=256, is_primary=True),
-                FieldSchema(name="document_id", dtype=DataType.VARCHAR, max_length=256),
-                FieldSchema(name="chunk_index", dtype=DataType.INT64),
-                FieldSchema(name="title", dtype=DataType.VARCHAR, max_length=512),
-                FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
-                FieldSchema(name="level", dtype=DataType.INT64),
-                FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=dimension)
-            ]
-
-            schema = CollectionSchema(
-                fields=fields,
-                description="文档块向量存储",
-                enable_dynamic_field=True
+            self.collection = self._create(self.collection_name, dimension)
+            self.loaded = False
+            self.folder_key = True
+            logger.info(
+                f"创建新集合: {self.collection_name}, 维度: {dimension}, "
+                f"编码: {self.encoding}, 索引: {self.index_type}"
             )
 
-            self.collection = Collection(
-                name=self.collection_name,
-                schema=schema
-            )
-
-            # 创建索引
-            index_params = {
-                "index_type": "IVF_FLAT",
-                "metric_type": "COSINE",
-                "params": {"nlist": 128}
-            }
+        self.ensure_loaded()
 
-            self.collection.create_index(
-                field_name="vector",
-                index_params=index_params
-            )
+    def _create(self, name: str, dimension: int) -> Collection:
+        """
+        按当前编码和索引类型新建集合
 
-            logger.info(f"创建新集合: {self.collection_name}, 维度: {dimension}")
+        folder_id 为分区键：同一知识库的分块落在同一个分区，按知识库检索和删除时只处理对应的分区；
+        document_id 建标量索引，按文档过滤时不再逐行比较。
+        """
+        fields = [
+            FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=256, is_primary=True),
+            FieldSchema(name="document_id", dtype=DataType.VARCHAR, max_length=256),
+            FieldSchema(name="folder_id", dtype=DataType.VARCHAR, max_length=256, is_partition_key=True),
+            FieldSchema(name="chunk_index", dtype=DataType.INT64),
+            FieldSchema(name="title", dtype=DataType.VARCHAR, max_length=512),
+            FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
+            FieldSchema(name="level", dtype=DataType.INT64),
+            FieldSchema(name="vector", dtype=VECTOR_FIELD_TYPES[self.encoding], dim=dimension)
+        ]
+
+        schema = CollectionSchema(
+            fields=fields,
+            description="文档块向量存储",
+            enable_dynamic_field=True
+        )
+
+        collection = Collection(
+            name=name,
+            schema=schema,
+            num_partitions=settings.VECTOR_NUM_PARTITIONS
+        )
+
+        # 创建索引
+        collection.create_index(
+            field_name="vector",
+            index_params=index_params(self.index_type, settings.VECTOR_INDEX_NLIST)
+        )
+        collection.create_index(
+            field_name="document_id",
+            index_name="document_id_index",
+            index_params={"index_type": "INVERTED"}
+        )
+        return collection
 
     def insert_chunks(
         self,
@@ -121,38 +411,135 @@ class VectorStore:
         """
         插入文档块
 
+        在 write_batch 范围内时先进入插入缓冲，达到阈值或退出范围时再写入；
+        否则立即写入并 flush。
+
         Args:
             chunks: 文档块列表
-            embeddings: 对应的向量列表
+            embeddings: 对应的向量列表（float32，按集合的向量编码转换后写入）
         """
         if not self.collection:
             raise ValueError("集合未初始化，请先调用 create_collection")
 
-        try:
-            data = [
-                [chunk["id"] for chunk in chunks],
-                [chunk["document_id"] for chunk in chunks],
-                [chunk["chunk_index"] for chunk in chunks],
-                [chunk["title"] for chunk in chunks],
-                [chunk["content"] for chunk in chunks],
-                [chunk["level"] for chunk in chunks],
-                embeddings
-            ]
+        with self._buffer_lock:
+            if self._buffer is not None:
+                vector_bytes = len(embeddings[0]) * VECTOR_BYTES[self.encoding] if embeddings else 0
+                self._buffer.add(chunks, embeddings, vector_bytes)
+                if self._buffer.full():
+                    self._flush_buffer()
+                return
 
-            self.collection.insert(data)
+        try:
+            self._insert(chunks, embeddings)
             self.collection.flush()
-
             logger.info(f"成功插入 {len(chunks)} 个文档块")
 
         except Exception as e:
             logger.error(f"插入文档块失败: {e}")
             raise
 
+    def _insert(self, chunks: List[Dict], embeddings: List[List[float]]):
+        self.collection.insert(self._columns(chunks, embeddings, self.folder_key))
+
+    def _columns(self, chunks: List[Dict], embeddings: List[List[float]], folder_key: bool) -> list:
+        """按集合字段顺序组织的列数据"""
+        data = [
+            [chunk["id"] for chunk in chunks],
+            [chunk["document_id"] for chunk in chunks],
+            [chunk["chunk_index"] for chunk in chunks],
+            [chunk["title"] for chunk in chunks],
+            [chunk["content"] for chunk in chunks],
+            [chunk["level"] for chunk in chunks],
+            encode_vectors(embeddings, self.encoding)
+        ]
+        if folder_key:
+            data.insert(2, [chunk.get("folder_id") or "" for chunk in chunks])
+        return data
+
+    def _flush_buffer(self):
+        """把插入缓冲写入 Milvus（调用方持有 _buffer_lock）"""
+        buffer = self._buffer
+        chunks, embeddings = buffer.take()
+        if not chunks:
+            return
+        try:
+            self._insert(chunks, embeddings)
+            buffer.inserted_rows += len(chunks)
+            buffer.inserts += 1
+            logger.info(f"批量插入 {len(chunks)} 个文档块")
+        except Exception as e:
+            failed = {chunk["document_id"] for chunk in chunks}
+            buffer.failed_document_ids.update(failed)
+            logger.error(f"批量插入文档块失败（涉及 {len(failed)} 个文档）: {e}")
+            return
+        if buffer.on_inserted is not None:
+            counts: Dict[str, int] = {}
+            for chunk in chunks:
+                counts[chunk["document_id"]] = counts.get(chunk["document_id"], 0) + 1
+            try:
+                buffer.on_inserted(counts)
+            except Exception as e:
+                logger.error(f"批量插入回调失败: {e}")
+
+    @contextmanager
+    def write_batch(self, on_inserted: Optional[Callable[[Dict[str, int]], None]] = None):
+        """
+        批量写入范围
+
+        范围内的 insert_chunks 跨文档合并，行数达到 VECTOR_INSERT_BATCH_ROWS
+        或数据量达到 VECTOR_INSERT_BATCH_MB 时才写入一次，delete_document 不再逐个 flush；
+        退出最外层范围时写入剩余部分并 flush 一次，避免每个文档封存一个小段。
+
+        Args:
+            on_inserted: 每次缓冲写入成功后以 {文档 ID: 块数} 调用。文档状态应在此时才改为成功，
+                否则分块仍在缓冲中时的检索会以新的向量数据版本号缓存不完整的结果
+
+        Yields:
+            InsertBuffer，退出后可读取 failed_document_ids / inserted_rows / segments
+        """
+        with self._buffer_lock:
+            if self._batch_depth == 0:
+                self._buffer = InsertBuffer(
+                    settings.VECTOR_INSERT_BATCH_ROWS,
+                    int(settings.VECTOR_INSERT_BATCH_MB * 1024 * 1024),
+                )
+            self._batch_depth += 1
+            buffer = self._buffer
+            if on_inserted is not None:
+                buffer.on_inserted = on_inserted
+        try:
+            yield buffer
+        finally:
+            with self._buffer_lock:
+                self._batch_depth -= 1
+                outermost = self._batch_depth == 0
+                if outermost:
+                    if self.collection is not None:
+                        self._flush_buffer()
+                    self._buffer = None
+            if outermost and self.collection is not None and (buffer.inserts or buffer.failed_document_ids):
+                self.collection.flush()
+                buffer.segments = self.segment_count()
+                logger.info(
+                    f"批量写入完成：{buffer.inserted_rows} 个文档块，{buffer.inserts} 次插入，"
+                    f"集合段数 {buffer.segments}"
+                )
+
+    def segment_count(self) -> Optional[int]:
+        """集合已加载的段数（获取失败时返回 None）"""
+        try:
+            return len(utility.get_query_segment_info(self.collection_name))
+        except Exception as e:
+            logger.warning(f"获取段信息失败: {e}")
+            return None
+
     def search(
         self,
         query_vector: List[float],
         top_k: int = 10,
-        document_id: Optional[str] = None
+        document_id: Optional[str] = None,
+        document_ids: Optional[Iterable[str]] = None,
+        folder_ids: Optional[Iterable[str]] = None
     ) -> List[Dict]:
         """
         向量搜索
@@ -161,44 +548,107 @@ class VectorStore:
             query_vector: 查询向量
             top_k: 返回结果数量
             document_id: 限制搜索范围到特定文档
+            document_ids: 限制搜索范围到多个文档，
+                一次带过滤条件的搜索返回全局 top_k，而不是逐个文档搜索
+            folder_ids: 限制搜索范围到若干知识库（按 folder_id 分区键只搜索对应分区，
+                要求集合有 folder_id 字段，见 folder_key）
 
         Returns:
-            搜索结果列表
+            搜索结果列表，按相似度从高到低排序
         """
-        # 如果collection未初始化，自动加载
-        if not self.collection:
-            if not self.connected:
-                self.connect()
-            if utility.has_collection(self.collection_name):
-                self.collection = Collection(self.collection_name)
-                self.collection.load()
-            else:
-                raise ValueError(f"集合 {self.collection_name} 不存在")
+        return self.search_batch([query_vector], top_k, document_id, document_ids, folder_ids)[0]
+
+    def search_batch(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int = 10,
+        document_id: Optional[str] = None,
+        document_ids: Optional[Iterable[str]] = None,
+        folder_ids: Optional[Iterable[str]] = None
+    ) -> List[List[Dict]]:
+        """
+        多个查询向量一次搜索（Milvus nq > 1），范围参数同 search
+
+        Returns:
+            与 query_vectors 一一对应的搜索结果列表
+        """
+        if not query_vectors:
+            return []
+
+        scope = None
+        if document_ids is not None:
+            scope = list(dict.fromkeys(document_ids))
+            if not scope:
+                return [[] for _ in query_vectors]
+        elif document_id:
+            scope = [document_id]
+        folders = None
+        if folder_ids is not None:
+            folders = list(dict.fromkeys(folder_ids))
+            if not folders:
+                return [[] for _ in query_vectors]
 
         try:
-            # 加载集合到内存
-            self.collection.load()
-
-            # 构建搜索参数
-            search_params = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-
-            # 构建表达式
-            expr = f"document_id == '{document_id}'" if document_id else None
-
-            # 执行搜索
-            results = self.collection.search(
-                data=[query_vector],
-                anns_field="vector",
-                param=search_params,
-                limit=top_k,
-                expr=expr,
-                output_fields=["document_id", "chunk_index", "title", "content", "level"]
+            self.ensure_loaded()
+            if folders is not None and not self.folder_key:
+                raise ValueError(f"集合 {self.collection_name} 没有 folder_id 分区键，不能按知识库检索")
+            base_expr = folder_filter(folders) if folders is not None else None
+            try:
+                formatted_results = self._search_scope(query_vectors, top_k, scope, base_expr)
+            except Exception as e:
+                if not self._on_not_loaded(e):
+                    raise
+                self.ensure_loaded()
+                formatted_results = self._search_scope(query_vectors, top_k, scope, base_expr)
+
+            logger.info(
+                f"搜索完成，{len(query_vectors)} 个查询共返回 "
+                f"{sum(len(hits) for hits in formatted_results)} 个结果"
             )
+            return formatted_results
+
+        except Exception as e:
+            logger.error(f"向量搜索失败: {e}")
+            raise
 
-            # 格式化结果
-            formatted_results = []
-            for hit in results[0]:
-                formatted_results.append({
+    def _search_scope(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int,
+        scope: Optional[List[str]],
+        base_expr: Optional[str] = None
+    ) -> List[List[Dict]]:
+        """在文档范围内搜索（base_expr 为附加的知识库条件），范围过大时分组搜索后按分数合并"""
+        if scope is None:
+            return self._search(query_vectors, top_k, base_expr)
+
+        formatted_results = [[] for _ in query_vectors]
+        for start in range(0, len(scope), MAX_FILTER_IDS):
+            expr = document_filter(scope[start:start + MAX_FILTER_IDS])
+            if base_expr:
+                expr = f"{base_expr} and {expr}"
+            for merged, hits in zip(formatted_results, self._search(query_vectors, top_k, expr)):
+                merged.extend(hits)
+        if len(scope) > MAX_FILTER_IDS:
+            for hits in formatted_results:
+                hits.sort(key=lambda x: x["score"], reverse=True)
+                del hits[top_k:]
+        return formatted_results
+
+    def _search(self, query_vectors: List[List[float]], top_k: int, expr: Optional[str]) -> List[List[Dict]]:
+        """执行一次搜索并格式化结果（每个查询向量一个结果列表）"""
+        results = self.collection.search(
+            data=encode_vectors(query_vectors, self.encoding),
+            anns_field="vector",
+            param=search_params(self.index_type, top_k, settings.VECTOR_SEARCH_NPROBE),
+            limit=top_k,
+            expr=expr,
+            output_fields=["document_id", "chunk_index", "title", "content", "level"]
+        )
+
+        return [
+            [
+                {
                     "id": hit.id,
                     "score": hit.score,
                     "document_id": hit.entity.get("document_id"),
@@ -206,14 +656,11 @@ class VectorStore:
                     "title": hit.entity.get("title"),
                     "content": hit.entity.get("content"),
                     "level": hit.entity.get("level")
-                })
-
-            logger.info(f"搜索完成，返回 {len(formatted_results)} 个结果")
-            return formatted_results
-
-        except Exception as e:
-            logger.error(f"向量搜索失败: {e}")
-            raise
+                }
+                for hit in hits
+            ]
+            for hits in results
+        ]
 
     def get_document_chunks(self, document_id: str) -> List[Dict]:
         """
@@ -229,7 +676,7 @@ class VectorStore:
             raise ValueError("集合未初始化")
 
         try:
-            self.collection.load()
+            self.ensure_loaded()
 
             # 使用 query 获取所有块
             results = self.collection.query(
@@ -258,13 +705,171 @@ class VectorStore:
             raise ValueError("集合未初始化")
 
         try:
+            with self._buffer_lock:
+                batching = self._buffer is not None
+                if batching:
+                    self._buffer.discard(document_id)
             self.collection.delete(expr=f"document_id == '{document_id}'")
-            self.collection.flush()
+            if not batching:
+                self.collection.flush()
             logger.info(f"删除文档 {document_id} 的所有块")
         except Exception as e:
             logger.error(f"删除文档块失败: {e}")
             raise
 
+    def delete_folder(self, folder_id: str, document_ids: List[str]):
+        """
+        删除知识库的所有块
+
+        有 folder_id 分区键时按分区键一次删除；旧集合按文档 ID 分组删除。
+
+        Args:
+            folder_id: 知识库 ID
+            document_ids: 知识库中的文档 ID（旧集合使用）
+        """
+        if not self.collection:
+            raise ValueError("集合未初始化")
+
+        try:
+            with self._buffer_lock:
+                batching = self._buffer is not None
+                if batching:
+                    for document_id in document_ids:
+                        self._buffer.discard(document_id)
+            if self.folder_key:
+                self.collection.delete(expr=folder_filter([folder_id]))
+            else:
+                for start in range(0, len(document_ids), MAX_FILTER_IDS):
+                    self.collection.delete(expr=document_filter(document_ids[start:start + MAX_FILTER_IDS]))
+            if not batching:
+                self.collection.flush()
+            logger.info(f"删除知识库 {folder_id} 的所有块")
+        except Exception as e:
+            logger.error(f"删除知识库块失败: {e}")
+            raise
+
+    def _query_rows(self, expr: str) -> List[Dict]:
+        """读出符合条件的完整行（包括向量）"""
+        fields = [field.name for field in self.collection.schema.fields]
+        return self.collection.query(expr=expr, output_fields=fields)
+
+    def _rows_to_chunks(self, rows: List[Dict]) -> Tuple[List[Dict], List[List[float]]]:
+        chunks = [{k: v for k, v in row.items() if k != "vector"} for row in rows]
+        embeddings = [decode_vector(row["vector"], self.encoding) for row in rows]
+        return chunks, embeddings
+
+    def move_document(self, document_id: str, folder_id: str) -> int:
+        """
+        文档移动到其他知识库后更新分块的 folder_id
+
+        分区键不能原地修改，读出后删除再写入；插入缓冲中尚未写入的分块直接改为新的 folder_id。
+        旧集合没有 folder_id，直接返回 0。
+
+        Returns:
+            移动的块数
+        """
+        # 重启后集合尚未打开时 folder_key 还是 False，先加载再判断
+        self.ensure_loaded()
+        if not self.folder_key:
+            return 0
+        # 持有缓冲锁：移动期间缓冲不会写入该文档的分块，删除不会误删刚写入的新分块
+        with self._buffer_lock:
+            buffered = self._buffer.move(document_id, folder_id) if self._buffer is not None else 0
+            rows = self._query_rows(document_filter([document_id]))
+            if rows:
+                chunks, embeddings = self._rows_to_chunks(rows)
+                for chunk in chunks:
+                    chunk["folder_id"] = folder_id
+                self.collection.delete(expr=document_filter([document_id]))
+                self._insert(chunks, embeddings)
+                self.collection.flush()
+        moved = len(rows) + buffered
+        if moved:
+            logger.info(f"文档 {document_id} 的 {moved} 个块已移动到知识库 {folder_id}")
+        return moved
+
+    def migrate_folder_key(self, document_folders: Dict[str, str], batch_size: int = 1000) -> Dict:
+        """
+        把没有 folder_id 的旧集合迁移为以 folder_id 为分区键的新结构
+
+        逐批读出旧集合写入临时集合（编码、索引类型与旧集合相同），完成后旧集合改名为
+        {name}_backup 让出名称，临时集合改为原名称，之后才删除备份；
+        任何一步失败时原名称下仍有可用的集合（或日志给出恢复方法）。
+        文档已不存在的分块（document_folders 中没有）不再写入。
+
+        Args:
+            document_folders: 文档 ID -> 知识库 ID
+            batch_size: 每批读出 / 写入的行数
+
+        Returns:
+            {"migrated": 写入的块数, "orphaned": 丢弃的块数}
+        """
+        if not self.connected:
+            self.connect()
+        if not utility.has_collection(self.collection_name):
+            raise ValueError(f"集合 {self.collection_name} 不存在")
+        old = Collection(self.collection_name)
+        self._use_collection(old)
+        if self.folder_key:
+            return {"migrated": 0, "orphaned": 0}
+
+        dimension = next(int(f.params["dim"]) for f in old.schema.fields if f.name == "vector")
+        temp_name = f"{self.collection_name}_migrating"
+        backup_name = f"{self.collection_name}_backup"
+        if utility.has_collection(backup_name):
+            raise ValueError(f"集合 {backup_name} 已存在（可能是上次迁移中断留下的备份），确认后手动删除再迁移")
+        if utility.has_collection(temp_name):
+            utility.drop_collection(temp_name)
+        target = self._create(temp_name, dimension)
+
+        old.load()
+        migrated = orphaned = 0
+        iterator = old.query_iterator(
+            batch_size=batch_size,
+            expr='id != ""',
+            output_fields=[field.name for field in old.schema.fields]
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                kept = [row for row in rows if row["document_id"] in document_folders]
+                orphaned += len(rows) - len(kept)
+                chunks, embeddings = self._rows_to_chunks(kept)
+                for chunk in chunks:
+                    chunk["folder_id"] = document_folders[chunk["document_id"]]
+                if chunks:
+                    target.insert(self._columns(chunks, embeddings, True))
+                    migrated += len(chunks)
+                logger.info(f"已迁移 {migrated} 个块")
+        finally:
+            iterator.close()
+        target.flush()
+
+        # 先把旧集合改名让出名称，新集合就位后才删除旧集合
+        utility.rename_collection(self.collection_name, backup_name)
+        try:
+            utility.rename_collection(temp_name, self.collection_name)
+        except Exception:
+            try:
+                utility.rename_collection(backup_name, self.collection_name)
+            except Exception as e:
+                logger.error(
+                    f"恢复集合名称失败: {e}。旧数据在 {backup_name}，迁移结果在 {temp_name}，"
+                    f"请手动将其中之一改名为 {self.collection_name}"
+                )
+            raise
+        self.collection = None
+        self.loaded = False
+        self.ensure_loaded()
+        try:
+            utility.drop_collection(backup_name)
+        except Exception as e:
+            logger.warning(f"删除旧集合 {backup_name} 失败，可稍后手动删除: {e}")
+        logger.info(f"集合 {self.collection_name} 迁移完成：{migrated} 个块，丢弃 {orphaned} 个无主块")
+        return {"migrated": migrated, "orphaned": orphaned}
+
 
 # 全局向量存储实例
 vector_store = VectorStore()
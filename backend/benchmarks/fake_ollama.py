@@ -0,0 +1,242 @@
+"""
+本地替身 Ollama 服务
+
+实现后端用到的 Ollama 接口，延迟、生成速度和向量维度可配置，
+没有 GPU 的机器上也能对后端做压测：
+
+- GET  /api/tags、/api/ps
+- POST /api/embed（input 为字符串或列表）、/api/embeddings（旧接口，prompt 为字符串）
+- POST /api/chat、/api/generate（stream 为 true 时按 NDJSON 逐个 token 输出）
+
+向量由文本哈希确定（同一文本得到同一向量），回答内容为固定文本的循环。
+--parallel 模拟 Ollama 的 OLLAMA_NUM_PARALLEL：每个模型同时处理的请求数有限，超出的排队。
+
+用法（在 backend 目录下，后端保持默认的 http://localhost:11434）：
+    python -m benchmarks.fake_ollama --port 11434 --dimension 4096 --tokens-per-second 40
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Union
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.services.embedding_text import estimate_tokens
+
+_ANSWER_TEXT = (
+    "根据检索到的资料，该问题可以从以下几个方面理解。首先，相关文档给出了基本定义和适用范围；"
+    "其次，资料中列举了主要的实现步骤和注意事项；最后，文档总结了常见问题及其处理方法。"
+)
+
+
+@dataclass
+class FakeConfig:
+    dimension: int = 4096
+    latency_ms: float = 20.0  # 每个请求的固定开销
+    embed_ms_per_text: float = 5.0  # 每个文本的编码耗时
+    tokens_per_second: float = 40.0  # 生成速度
+    answer_tokens: int = 200  # 每次生成的 token 数
+    parallel: int = 1  # 每个模型同时处理的请求数
+    models: List[str] = field(default_factory=lambda: [
+        "qwen3-embedding:8b",
+        "qwen3:8b",
+        "dengcao/Qwen3-Reranker-8B:Q3_K_M",
+    ])
+
+
+config = FakeConfig()
+app = FastAPI(title="Fake Ollama")
+
+_slots: Dict[str, asyncio.Semaphore] = {}  # 模型 -> 并发槽位
+_loaded: Dict[str, float] = {}  # 已加载的模型 -> 最近使用时间
+_stats = {"embed_texts": 0, "generated_tokens": 0, "requests": 0}
+
+
+def _slot(model: str) -> asyncio.Semaphore:
+    if model not in _slots:
+        _slots[model] = asyncio.Semaphore(config.parallel)
+    return _slots[model]
+
+
+def _touch(model: str, keep_alive=None):
+    """记录模型加载状态；keep_alive 为 0 时卸载"""
+    if keep_alive in (0, "0", "0s"):
+        _loaded.pop(model, None)
+    else:
+        _loaded[model] = time.time()
+
+
+def fake_vector(text: str) -> List[float]:
+    """由文本哈希确定的单位向量"""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(config.dimension).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.round(6).tolist()
+
+
+def _tokens(count: int) -> List[str]:
+    return [_ANSWER_TEXT[i % len(_ANSWER_TEXT)] for i in range(count)]
+
+
+def _now() -> str:
+    return datetime.now().astimezone().isoformat()
+
+
+async def _embed(model: str, texts: List[str]) -> List[List[float]]:
+    async with _slot(model):
+        await asyncio.sleep((config.latency_ms + config.embed_ms_per_text * len(texts)) / 1000)
+    _stats["embed_texts"] += len(texts)
+    return [fake_vector(text) for text in texts]
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": name, "model": name, "size": 0} for name in config.models]}
+
+
+@app.get("/api/ps")
+async def ps():
+    expires = (datetime.now() + timedelta(minutes=5)).astimezone().isoformat()
+    return {"models": [{"name": name, "model": name, "expires_at": expires} for name in _loaded]}
+
+
+@app.get("/stats")
+async def stats():
+    """替身服务自身的计数（非 Ollama 接口）"""
+    return _stats
+
+
+@app.post("/api/embed")
+async def embed(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    texts: Union[str, List[str]] = body.get("input", [])
+    if isinstance(texts, str):
+        texts = [texts]
+    _stats["requests"] += 1
+    _touch(model, body.get("keep_alive"))
+    started = time.monotonic()
+    embeddings = await _embed(model, texts)
+    return {
+        "model": model,
+        "embeddings": embeddings,
+        "total_duration": int((time.monotonic() - started) * 1e9),
+        "prompt_eval_count": sum(estimate_tokens(text) for text in texts),
+    }
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    _stats["requests"] += 1
+    _touch(model, body.get("keep_alive"))
+    return {"embedding": (await _embed(model, [body.get("prompt", "")]))[0]}
+
+
+async def _generate(model: str, stream: bool, build_chunk):
+    """按 tokens_per_second 逐个输出 token；非流式时等全部生成后一次返回"""
+    tokens = _tokens(config.answer_tokens)
+    interval = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+
+    async def produce():
+        async with _slot(model):
+            await asyncio.sleep(config.latency_ms / 1000)
+            started = time.monotonic()
+            for i, token in enumerate(tokens):
+                # 按累计时间休眠，避免逐次 sleep 的误差累积
+                delay = started + (i + 1) * interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                _stats["generated_tokens"] += 1
+                yield token
+
+    if stream:
+        async def lines():
+            async for token in produce():
+                yield json.dumps(build_chunk(token, False), ensure_ascii=False) + "\n"
+            yield json.dumps(build_chunk("", True, len(tokens)), ensure_ascii=False) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    text = "".join([token async for token in produce()])
+    return build_chunk(text, True, len(tokens))
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    _stats["requests"] += 1
+    _touch(model, body.get("keep_alive"))
+
+    def build_chunk(content: str, done: bool, count: int = 0):
+        chunk = {
+            "model": model,
+            "created_at": _now(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+        if done:
+            chunk.update({"done_reason": "stop", "eval_count": count})
+        return chunk
+
+    return await _generate(model, body.get("stream", True), build_chunk)
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    _stats["requests"] += 1
+    keep_alive = body.get("keep_alive")
+    _touch(model, keep_alive)
+
+    # 空 prompt：只加载 / 卸载模型
+    if not body.get("prompt"):
+        reason = "unload" if keep_alive in (0, "0", "0s") else "load"
+        return {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": reason}
+
+    def build_chunk(content: str, done: bool, count: int = 0):
+        chunk = {"model": model, "created_at": _now(), "response": content, "done": done}
+        if done:
+            chunk.update({"done_reason": "stop", "eval_count": count})
+        return chunk
+
+    return await _generate(model, body.get("stream", True), build_chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地替身 Ollama 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dimension", type=int, default=config.dimension, help="向量维度")
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="每个请求的固定延迟（毫秒）")
+    parser.add_argument("--embed-ms-per-text", type=float, default=config.embed_ms_per_text,
+                        help="每个文本的编码耗时（毫秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second, help="生成速度")
+    parser.add_argument("--answer-tokens", type=int, default=config.answer_tokens, help="每次生成的 token 数")
+    parser.add_argument("--parallel", type=int, default=config.parallel, help="每个模型同时处理的请求数")
+    parser.add_argument("--models", default=",".join(config.models), help="/api/tags 返回的模型，逗号分隔")
+    args = parser.parse_args()
+
+    config.dimension = args.dimension
+    config.latency_ms = args.latency_ms
+    config.embed_ms_per_text = args.embed_ms_per_text
+    config.tokens_per_second = args.tokens_per_second
+    config.answer_tokens = args.answer_tokens
+    config.parallel = max(1, args.parallel)
+    config.models = [name.strip() for name in args.models.split(",") if name.strip()]
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
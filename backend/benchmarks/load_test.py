@@ -0,0 +1,243 @@
+"""
+后端端到端压测
+
+按指定并发驱动后端接口，统计每个场景的 p50 / p95 / p99 延迟和吞吐：
+
+- chat：POST /api/chat/ask（知识库问答）
+- vectorize：POST /api/documents/{id}/vectorize，轮询 /vectorize/status 直到完成，
+  延迟为提交到完成的时间；同一文档不会被并发向量化
+- generate：POST /api/document-projects/{id}/generate-content（章节内容生成）
+
+配合 benchmarks.fake_ollama 使用时，结果只反映后端自身的请求路径开销。
+
+用法（在 backend 目录下，后端和 Ollama（或替身）已启动）：
+    python -m benchmarks.load_test --folder-id <知识库ID> --scenarios chat,vectorize -c 8 -n 200
+    python -m benchmarks.load_test --project-id <项目ID> --scenarios generate -c 4 -n 40
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_QUESTIONS = [
+    "这份资料的主要内容是什么？",
+    "文档中提到了哪些关键步骤？",
+    "有哪些需要注意的问题？",
+    "请总结相关的技术要求。",
+    "文中给出的结论是什么？",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Result:
+    """单个场景的统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def ok(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def fail(self, error: str):
+        self.errors[error] = self.errors.get(error, 0) + 1
+
+    def report(self) -> str:
+        elapsed = max(self.finished - self.started, 1e-9)
+        count = len(self.latencies)
+        failed = sum(self.errors.values())
+        lines = [
+            f"[{self.name}] 成功 {count}，失败 {failed}，耗时 {elapsed:.1f}s，吞吐 {count / elapsed:.2f} 次/秒",
+            "  延迟 p50 {:.0f} ms  p95 {:.0f} ms  p99 {:.0f} ms  max {:.0f} ms".format(
+                *(percentile(self.latencies, q) * 1000 for q in (50, 95, 99, 100))
+            ),
+        ]
+        for error, times in sorted(self.errors.items(), key=lambda item: -item[1])[:5]:
+            lines.append(f"  错误 x{times}: {error}")
+        return "\n".join(lines)
+
+
+async def run_workers(concurrency: int, total: int, job, result: Result):
+    """concurrency 个协程共执行 total 次 job(i)"""
+    counter = itertools.count()
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            started = time.perf_counter()
+            try:
+                await job(i)
+            except Exception as e:
+                result.fail(str(e)[:200] or type(e).__name__)
+            else:
+                result.ok(time.perf_counter() - started)
+
+    result.started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.finished = time.perf_counter()
+
+
+def _check(response: httpx.Response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:120]}")
+
+
+# ---------- 场景 ----------
+
+async def chat_scenario(client: httpx.AsyncClient, args) -> Result:
+    result = Result("chat")
+
+    async def job(i: int):
+        question = DEFAULT_QUESTIONS[i % len(DEFAULT_QUESTIONS)]
+        if not args.repeat_questions:
+            question = f"{question}（{i}）"  # 默认每次不同，避免命中查询缓存
+        response = await client.post(
+            "/api/chat/ask",
+            json={"question": question, "folderId": args.folder_id},
+        )
+        _check(response)
+
+    await run_workers(args.concurrency, args.requests, job, result)
+    return result
+
+
+async def _parsed_documents(client: httpx.AsyncClient, folder_id: str) -> List[str]:
+    response = await client.get(
+        "/api/documents",
+        params={"folderId": folder_id, "limit": 1000, "fields": "summary"},
+    )
+    _check(response)
+    return [doc["id"] for doc in response.json()["documents"] if doc.get("parseStatus") == "success"]
+
+
+async def vectorize_scenario(client: httpx.AsyncClient, args) -> Result:
+    result = Result("vectorize")
+    document_ids = await _parsed_documents(client, args.folder_id)
+    if not document_ids:
+        result.fail("知识库中没有已解析的文档")
+        return result
+
+    # 空闲文档队列：保证同一文档不会被并发向量化
+    idle: asyncio.Queue = asyncio.Queue()
+    for document_id in document_ids:
+        idle.put_nowait(document_id)
+
+    async def job(i: int):
+        document_id = await idle.get()
+        try:
+            _check(await client.post(f"/api/documents/{document_id}/vectorize"))
+            deadline = time.monotonic() + args.timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(args.poll_interval)
+                response = await client.get(f"/api/documents/{document_id}/vectorize/status")
+                _check(response)
+                status = response.json().get("status")
+                if status == "success":
+                    return
+                if status in ("error", "failed"):
+                    raise RuntimeError(f"向量化失败: {document_id}")
+            raise TimeoutError(f"向量化超时: {document_id}")
+        finally:
+            idle.put_nowait(document_id)
+
+    await run_workers(min(args.concurrency, len(document_ids)), args.requests, job, result)
+    return result
+
+
+def _flatten_outline(nodes: List[Dict], path: Optional[List[str]] = None) -> List[tuple]:
+    """大纲节点 -> [(章节ID, 标题, 上级章节路径)]"""
+    path = path or []
+    sections = []
+    for node in nodes or []:
+        title = node.get("title", "")
+        if node.get("id") and title:
+            sections.append((node["id"], title, path))
+        sections.extend(_flatten_outline(node.get("children"), path + [title]))
+    return sections
+
+
+async def generate_scenario(client: httpx.AsyncClient, args) -> Result:
+    result = Result("generate")
+    project_id = args.project_id
+    if not project_id:
+        response = await client.post(
+            "/api/document-projects",
+            json={"title": "压测项目", "folderIds": [args.folder_id] if args.folder_id else []},
+        )
+        _check(response)
+        project_id = response.json()["id"]
+
+    response = await client.get(f"/api/document-projects/{project_id}")
+    _check(response)
+    sections = _flatten_outline(response.json().get("outline"))
+    if not sections:
+        sections = [(f"load-test-{i}", title, []) for i, title in enumerate(DEFAULT_QUESTIONS)]
+
+    async def job(i: int):
+        section_id, title, path = sections[i % len(sections)]
+        response = await client.post(
+            f"/api/document-projects/{project_id}/generate-content",
+            json={"sectionId": section_id, "sectionTitle": title, "contextSections": path},
+        )
+        _check(response)
+
+    await run_workers(args.concurrency, args.requests, job, result)
+    return result
+
+
+SCENARIOS = {
+    "chat": chat_scenario,
+    "vectorize": vectorize_scenario,
+    "generate": generate_scenario,
+}
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for name in args.scenarios:
+            print(f"运行场景 {name}：并发 {args.concurrency}，请求 {args.requests} 次")
+            result = await SCENARIOS[name](client, args)
+            print(result.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端端到端压测")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="后端地址")
+    parser.add_argument("--scenarios", default="chat", help="场景，逗号分隔：" + " / ".join(SCENARIOS))
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="并发数")
+    parser.add_argument("-n", "--requests", type=int, default=50, help="每个场景的请求次数")
+    parser.add_argument("--folder-id", help="chat / vectorize 使用的知识库 ID")
+    parser.add_argument("--project-id", help="generate 使用的项目 ID（不指定时新建）")
+    parser.add_argument("--repeat-questions", action="store_true", help="chat 重复使用相同问题（测试缓存命中）")
+    parser.add_argument("--timeout", type=float, default=600.0, help="单次请求 / 向量化任务超时（秒）")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="向量化状态轮询间隔（秒）")
+    args = parser.parse_args()
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    if any(s in ("chat", "vectorize") for s in args.scenarios) and not args.folder_id:
+        parser.error("chat / vectorize 场景需要 --folder-id")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
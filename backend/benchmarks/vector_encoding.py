@@ -0,0 +1,178 @@
+"""
+向量编码基准测试
+
+用知识库中已解析文档的分块作为语料，比较不同向量编码 / 索引类型
+相对 float32 精确检索的召回率（recall@k）和内存占用。
+
+- 离线部分（总是执行）：在 numpy 中模拟 float16 / bfloat16 / SQ8 量化后的精确检索，
+  只反映编码本身的精度损失，内存按向量原始字节数计算
+- Milvus 部分（--offline 时跳过）：为每个 编码:索引 组合新建临时集合，
+  写入语料后检索，内存取 Milvus 报告的已加载段大小，包含索引开销
+
+用法（在 backend 目录下）：
+    python -m benchmarks.vector_encoding --max-chunks 5000 --queries 200 -k 10
+    python -m benchmarks.vector_encoding --configs float32:IVF_FLAT,float16:HNSW,float32:IVF_SQ8
+"""
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.models.document import storage
+from app.services.chunker import chunker
+from app.services.embedding import embedding_service
+
+try:
+    from ml_dtypes import bfloat16
+except ImportError:
+    bfloat16 = None
+
+
+def load_corpus(max_chunks: int) -> Tuple[List[str], List[str]]:
+    """从已解析的文档中切出分块，返回 (分块正文, 分块标题)"""
+    contents, titles = [], []
+    documents, _ = storage.list_documents(limit=1_000_000)
+    for doc in documents:
+        if doc.get("parseStatus") != "success":
+            continue
+        markdown = storage.get_markdown(doc["id"])
+        if not markdown:
+            continue
+        for chunk in chunker.chunk(markdown, doc["id"]):
+            contents.append(chunk.content)
+            titles.append(chunk.title or "")
+            if len(contents) >= max_chunks:
+                return contents, titles
+    return contents, titles
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """余弦相似度精确检索，返回每个查询的 top-k 下标"""
+    scores = normalize(queries) @ normalize(corpus).T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall(truth: np.ndarray, found: List[List[int]]) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found))
+    return hits / max(1, truth.size)
+
+
+def sq8(vectors: np.ndarray) -> np.ndarray:
+    """模拟 IVF_SQ8 的标量量化：每个维度按最小 / 最大值线性量化为 8 位后还原"""
+    low = vectors.min(axis=0)
+    scale = np.maximum(vectors.max(axis=0) - low, 1e-12) / 255
+    codes = np.round((vectors - low) / scale)
+    return (codes * scale + low).astype(np.float32)
+
+
+def offline_encodings(corpus: np.ndarray) -> Dict[str, Tuple[np.ndarray, int]]:
+    """各编码还原后的向量及每个向量占用的字节数"""
+    dimension = corpus.shape[1]
+    encodings = {
+        "float32": (corpus, dimension * 4),
+        "float16": (corpus.astype(np.float16).astype(np.float32), dimension * 2),
+        "sq8": (sq8(corpus), dimension),
+    }
+    if bfloat16 is not None:
+        encodings["bfloat16"] = (corpus.astype(bfloat16).astype(np.float32), dimension * 2)
+    return encodings
+
+
+def run_offline(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int):
+    print("\n== 离线模拟（精确检索，仅编码损失）==")
+    print(f"{'编码':<10}{'recall@' + str(k):>12}{'向量内存':>14}")
+    for name, (vectors, size) in offline_encodings(corpus).items():
+        found = exact_top_k(vectors, queries, k).tolist()
+        memory = size * corpus.shape[0] / 1024 / 1024
+        print(f"{name:<10}{recall(truth, found):>12.4f}{memory:>11.1f} MB")
+
+
+def run_milvus(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int,
+               configs: List[str], keep: bool):
+    from pymilvus import utility
+    from app.services.vector_store import VectorStore
+
+    print("\n== Milvus ==")
+    print(f"{'编码:索引':<20}{'recall@' + str(k):>12}{'加载内存':>14}{'平均延迟':>12}")
+    for config in configs:
+        encoding, index_type = config.split(":")
+        name = f"bench_{encoding}_{index_type}".lower()
+        try:
+            store = VectorStore(collection_name=name, encoding=encoding, index_type=index_type)
+            store.create_collection(corpus.shape[1], drop_existing=True)
+            for start in range(0, corpus.shape[0], 1000):
+                part = corpus[start:start + 1000]
+                store.insert_chunks(
+                    [
+                        {
+                            "id": str(start + i),
+                            "document_id": "bench",
+                            "chunk_index": start + i,
+                            "title": "",
+                            "content": "",
+                            "level": 0,
+                        }
+                        for i in range(len(part))
+                    ],
+                    part,
+                )
+            store.ensure_loaded()
+            memory = sum(s.mem_size for s in utility.get_query_segment_info(name)) / 1024 / 1024
+
+            found = []
+            started = time.perf_counter()
+            for query in queries:
+                found.append([int(hit["id"]) for hit in store.search(query.tolist(), k)])
+            latency = (time.perf_counter() - started) / max(1, len(queries)) * 1000
+            print(f"{config:<20}{recall(truth, found):>12.4f}{memory:>11.1f} MB{latency:>9.1f} ms")
+        except Exception as e:
+            print(f"{config:<20}失败: {e}")
+        finally:
+            if not keep and utility.has_collection(name):
+                utility.drop_collection(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量编码召回率 / 内存基准测试")
+    parser.add_argument("--max-chunks", type=int, default=5000, help="语料分块数上限")
+    parser.add_argument("--queries", type=int, default=200, help="查询数（取分块标题）")
+    parser.add_argument("-k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument(
+        "--configs",
+        default="float32:IVF_FLAT,float16:IVF_FLAT,bfloat16:IVF_FLAT,float32:IVF_SQ8,float16:HNSW",
+        help="Milvus 部分测试的 编码:索引 组合，逗号分隔",
+    )
+    parser.add_argument("--offline", action="store_true", help="只做离线模拟，不连接 Milvus")
+    parser.add_argument("--keep", action="store_true", help="保留测试集合")
+    args = parser.parse_args()
+
+    contents, titles = load_corpus(args.max_chunks)
+    if not contents:
+        raise SystemExit("没有可用的语料：请先上传并解析文档")
+    query_texts = list(dict.fromkeys(title for title in titles if title.strip()))[: args.queries]
+    if not query_texts:
+        query_texts = contents[: args.queries]
+
+    print(f"语料 {len(contents)} 个分块，查询 {len(query_texts)} 条，模型 {embedding_service.model_name}")
+    indices, corpus = embedding_service.encode_with_indices(contents)
+    queries = embedding_service.encode(query_texts)
+    print(f"向量维度 {corpus.shape[1]}，成功编码 {len(indices)} 个分块")
+
+    truth = exact_top_k(corpus, queries, args.k)
+    run_offline(corpus, queries, truth, args.k)
+    if not args.offline:
+        configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+        run_milvus(corpus, queries, truth, args.k, configs, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+向量集合迁移：为 document_chunks 增加 folder_id 分区键
+
+旧版本创建的集合没有 folder_id 字段，知识库检索只能退回按文档 ID 过滤。
+本脚本按文档存储中的 文档 -> 知识库 对应关系逐批复制分块和向量，
+重建为以 folder_id 为分区键的集合（不需要重新调用嵌入模型）。
+迁移期间集合不可检索，请先停止后端。
+
+用法（在 backend 目录下）：
+    python -m scripts.migrate_vectors
+    python -m scripts.migrate_vectors --batch-size 2000
+"""
+import argparse
+import time
+
+from app.models.document import storage
+from app.services.vector_store import vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为向量集合增加 folder_id 分区键")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批读出 / 写入的行数")
+    args = parser.parse_args()
+
+    documents, _ = storage.list_documents(limit=1_000_000)
+    document_folders = {doc["id"]: doc.get("folderId") or "" for doc in documents}
+    print(f"文档存储中共 {len(document_folders)} 个文档")
+
+    started = time.perf_counter()
+    result = vector_store.migrate_folder_key(document_folders, batch_size=args.batch_size)
+    print(
+        f"迁移完成：写入 {result['migrated']} 个块，丢弃 {result['orphaned']} 个无主块，"
+        f"耗时 {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
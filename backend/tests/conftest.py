@@ -0,0 +1,30 @@
+"""
+测试在临时目录中运行：导入 app.models.document 时创建的全局存储不会改写 backend/data
+
+向量存储的测试使用内存中的 Milvus 替身（fake_milvus），不需要 Milvus 服务。
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+import fake_milvus
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="ai-writer-tests-"))
+fake_milvus.install()
+
+
+@pytest.fixture
+def milvus(monkeypatch):
+    """内存中的 Milvus：替换 vector_store 模块使用的 pymilvus 客户端"""
+    from app.services import vector_store
+
+    server = fake_milvus.FakeMilvus()
+    monkeypatch.setattr(vector_store, "Collection", server.Collection)
+    monkeypatch.setattr(vector_store, "utility", server.utility)
+    monkeypatch.setattr(vector_store, "connections", server.connections)
+    monkeypatch.setattr(vector_store, "FieldSchema", fake_milvus.FieldSchema)
+    monkeypatch.setattr(vector_store, "CollectionSchema", fake_milvus.CollectionSchema)
+    return server
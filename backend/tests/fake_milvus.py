@@ -0,0 +1,184 @@
+"""
+内存中的 Milvus 替身：只实现 vector_store 用到的 pymilvus 接口
+
+集合按名称登记在 FakeMilvus.collections 中，行以字典保存；
+过滤表达式只支持 vector_store 生成的几种形式（==、!=、in）。
+"""
+import re
+import sys
+import types
+from enum import Enum
+from typing import Dict, List, Optional
+
+
+class DataType(Enum):
+    INT64 = 5
+    VARCHAR = 21
+    FLOAT_VECTOR = 101
+    FLOAT16_VECTOR = 102
+    BFLOAT16_VECTOR = 103
+
+
+class FieldSchema:
+    def __init__(self, name: str, dtype, **params):
+        self.name = name
+        self.dtype = dtype
+        self.params = params
+
+
+class CollectionSchema:
+    def __init__(self, fields: List[FieldSchema], description: str = "", **kwargs):
+        self.fields = fields
+        self.description = description
+
+
+class Index:
+    def __init__(self, field_name: str, params: Dict):
+        self.field_name = field_name
+        self.params = params
+
+
+_CONDITION = re.compile(r"""^(\w+)\s*(==|!=)\s*(["'])(.*)\3$|^(\w+)\s+in\s+\[(.*)\]$""")
+
+
+def _matches(row: Dict, expr: Optional[str]) -> bool:
+    if not expr:
+        return True
+    for condition in expr.split(" and "):
+        match = _CONDITION.match(condition.strip())
+        if match is None:
+            raise ValueError(f"不支持的表达式: {condition}")
+        if match.group(1):
+            equal = row.get(match.group(1)) == match.group(4)
+            if equal != (match.group(2) == "=="):
+                return False
+        elif row.get(match.group(5)) not in re.findall(r'"((?:[^"\\]|\\.)*)"', match.group(6)):
+            return False
+    return True
+
+
+class QueryIterator:
+    def __init__(self, rows: List[Dict], batch_size: int):
+        self._rows = rows
+        self._batch_size = batch_size
+
+    def next(self) -> List[Dict]:
+        batch, self._rows = self._rows[:self._batch_size], self._rows[self._batch_size:]
+        return batch
+
+    def close(self):
+        self._rows = []
+
+
+class FakeCollection:
+    def __init__(self, server: "FakeMilvus", name: str, schema: CollectionSchema):
+        self.server = server
+        self.name = name
+        self.schema = schema
+        self.rows: List[Dict] = []
+        self.indexes: List[Index] = []
+        self.loaded = False
+        self.flushes = 0
+        self.inserts = 0
+
+    # pymilvus.Collection(name) 打开已有集合，带 schema 时新建
+    @classmethod
+    def open(cls, server: "FakeMilvus", name: str, schema: CollectionSchema = None, **kwargs):
+        if schema is None:
+            if name not in server.collections:
+                raise ValueError(f"collection not found: {name}")
+            return server.collections[name]
+        collection = server.collections[name] = cls(server, name, schema)
+        return collection
+
+    def insert(self, columns: list):
+        if self.server.fail_inserts:
+            raise RuntimeError("模拟的插入失败")
+        names = [field.name for field in self.schema.fields]
+        assert len(columns) == len(names), "列数与集合字段数不一致"
+        self.rows.extend(dict(zip(names, values)) for values in zip(*columns))
+        self.inserts += 1
+
+    def query(self, expr: str, output_fields: List[str] = None) -> List[Dict]:
+        return [
+            {k: v for k, v in row.items() if output_fields is None or k in output_fields}
+            for row in self.rows
+            if _matches(row, expr)
+        ]
+
+    def query_iterator(self, batch_size: int, expr: str, output_fields: List[str] = None) -> QueryIterator:
+        return QueryIterator(self.query(expr, output_fields), batch_size)
+
+    def delete(self, expr: str):
+        self.rows = [row for row in self.rows if not _matches(row, expr)]
+
+    def create_index(self, field_name: str, index_params: Dict, **kwargs):
+        self.indexes.append(Index(field_name, index_params))
+
+    def flush(self):
+        self.flushes += 1
+
+    def load(self):
+        self.loaded = True
+
+    def release(self):
+        self.loaded = False
+
+
+class FakeUtility:
+    def __init__(self, server: "FakeMilvus"):
+        self.server = server
+
+    def has_collection(self, name: str) -> bool:
+        return name in self.server.collections
+
+    def drop_collection(self, name: str):
+        self.server.collections.pop(name, None)
+
+    def rename_collection(self, old_name: str, new_name: str):
+        self.server.renames.append((old_name, new_name))
+        if self.server.fail_rename == (old_name, new_name):
+            raise RuntimeError(f"模拟的改名失败: {old_name} -> {new_name}")
+        if new_name in self.server.collections:
+            raise ValueError(f"集合 {new_name} 已存在")
+        collection = self.server.collections.pop(old_name)
+        collection.name = new_name
+        self.server.collections[new_name] = collection
+
+    def get_query_segment_info(self, name: str) -> list:
+        return [None]
+
+
+class FakeConnections:
+    def connect(self, **kwargs):
+        pass
+
+
+class FakeMilvus:
+    """一个测试用的 Milvus 实例"""
+
+    def __init__(self):
+        self.collections: Dict[str, FakeCollection] = {}
+        self.renames: List[tuple] = []
+        self.fail_inserts = False
+        self.fail_rename: Optional[tuple] = None  # 调用到这一对 (原名, 新名) 时改名失败
+        self.utility = FakeUtility(self)
+        self.connections = FakeConnections()
+
+    def Collection(self, name: str, schema: CollectionSchema = None, **kwargs) -> FakeCollection:
+        return FakeCollection.open(self, name, schema, **kwargs)
+
+
+def install():
+    """未安装 pymilvus 时注册替身模块，使 app.services.vector_store 可以导入"""
+    try:
+        import pymilvus  # noqa: F401
+    except ImportError:
+        module = types.ModuleType("pymilvus")
+        module.DataType = DataType
+        module.FieldSchema = FieldSchema
+        module.CollectionSchema = CollectionSchema
+        module.Collection = FakeCollection
+        module.utility = None
+        module.connections = FakeConnections()
+        sys.modules["pymilvus"] = module
@@ -0,0 +1,74 @@
+"""
+对话日志存储：启动时补读索引之后的日志、崩溃留下的半行、旧数据迁移和多进程同步
+"""
+import json
+
+from app.models.conversation import ConversationStorage
+
+MESSAGE = {"id": "m0", "role": "user", "content": "你好", "sources": [], "timestamp": "2024-01-01T00:00:00"}
+
+
+def _open(tmp_path, flush_delay: float = 60.0) -> ConversationStorage:
+    # 索引延迟写入：测试中的索引停留在创建对话之前，重启时必须从日志补读
+    return ConversationStorage(storage_dir=str(tmp_path), flush_delay=flush_delay)
+
+
+def test_reopen_replays_log_tail(tmp_path):
+    storage = _open(tmp_path)
+    conv = storage.create_conversation("新对话", "folder", MESSAGE)
+    storage._flush_index()
+    storage.add_message(conv["id"], "assistant", "回答一")
+    storage.add_message(conv["id"], "user", "追问")
+
+    reopened = _open(tmp_path)
+
+    [summary] = reopened.list_conversations()
+    assert summary["messageCount"] == 3
+    assert summary["folderId"] == "folder"
+    assert [m["content"] for m in reopened.get_conversation(conv["id"])["messages"]] == ["你好", "回答一", "追问"]
+
+
+def test_torn_tail_is_ignored_and_later_writes_survive(tmp_path):
+    storage = _open(tmp_path)
+    conv = storage.create_conversation("新对话", "folder", MESSAGE)
+    with open(storage._log_path(conv["id"]), "ab") as f:
+        f.write(b'{"op":"message","message":{"id":"half')  # 崩溃时写了一半的行
+
+    reopened = _open(tmp_path)
+    assert reopened.list_conversations()[0]["messageCount"] == 1
+
+    reopened.add_message(conv["id"], "assistant", "崩溃之后的回答")
+
+    again = _open(tmp_path)
+    assert again.list_conversations()[0]["messageCount"] == 2
+    assert [m["content"] for m in again.get_conversation(conv["id"])["messages"]] == ["你好", "崩溃之后的回答"]
+
+
+def test_migrates_conversations_json(tmp_path):
+    legacy = [
+        {"id": "new", "title": "新", "folderId": "f", "createdAt": "2024-02-01", "updatedAt": "2024-02-01",
+         "messages": [MESSAGE]},
+        {"id": "old", "title": "旧", "folderId": "f", "createdAt": "2024-01-01", "updatedAt": "2024-01-02",
+         "messages": [MESSAGE, dict(MESSAGE, id="m1", content="第二条")]},
+    ]
+    (tmp_path / "conversations.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding="utf-8")
+
+    storage = _open(tmp_path)
+
+    assert [(c["id"], c["messageCount"]) for c in storage.list_conversations()] == [("new", 1), ("old", 2)]
+    assert [m["content"] for m in storage.get_conversation("old")["messages"]] == ["你好", "第二条"]
+    assert _open(tmp_path).list_conversations()[1]["messageCount"] == 2
+
+
+def test_other_process_writes_are_visible(tmp_path):
+    a, b = _open(tmp_path), _open(tmp_path)
+
+    conv = a.create_conversation("新对话", "folder", MESSAGE)
+    assert b.get_conversation(conv["id"])["messages"] == [MESSAGE]
+
+    b.add_message(conv["id"], "assistant", "来自另一个进程")
+    assert a.list_conversations()[0]["messageCount"] == 2
+
+    a.delete_conversation(conv["id"])
+    assert b.get_conversation(conv["id"]) is None
+    assert b.list_conversations() == []
@@ -0,0 +1,63 @@
+"""
+Markdown 正文 blob 的引用计数：待写队列中的 markdownRef 同样算作引用
+"""
+import pytest
+
+from app.models.document import DocumentStorage, SQLiteDocumentStorage
+from app.schemas.document import DocumentCreate, ParseStatus
+
+MARKDOWN = "# 标题\n\n相同的解析结果"
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        return DocumentStorage(storage_dir=str(tmp_path))
+    return SQLiteDocumentStorage(str(tmp_path / "documents.db"), storage_dir=str(tmp_path))
+
+
+def _create(storage, title: str) -> str:
+    doc = storage.create_document(
+        DocumentCreate(title=title, fileName=f"{title}.pdf", fileType="pdf", fileSize=1, tags=[]),
+        "",
+    )
+    return doc["id"]
+
+
+def test_delete_keeps_blob_referenced_by_pending_parse(storage):
+    a, b = _create(storage, "a"), _create(storage, "b")
+    storage.update_parse_status(a, ParseStatus.SUCCESS, MARKDOWN)
+
+    with storage.write_batch():
+        storage.update_parse_status(b, ParseStatus.SUCCESS, MARKDOWN)
+        storage.delete_document(a)
+
+    assert storage.get_markdown(b) == MARKDOWN
+
+
+def test_reparse_keeps_blob_referenced_by_pending_parse(storage):
+    a, b = _create(storage, "a"), _create(storage, "b")
+    storage.update_parse_status(a, ParseStatus.SUCCESS, MARKDOWN)
+
+    # A 的新正文先进入待写队列，提交时先释放 A 的旧正文，此时 B 尚未提交
+    with storage.write_batch():
+        storage.update_parse_status(a, ParseStatus.SUCCESS, "重新解析后的正文")
+        storage.update_parse_status(b, ParseStatus.SUCCESS, MARKDOWN)
+
+    assert storage.get_markdown(b) == MARKDOWN
+    assert storage.get_markdown(a) == "重新解析后的正文"
+
+
+def test_replaced_and_deleted_pending_blobs_are_released(storage):
+    a = _create(storage, "a")
+
+    with storage.write_batch():
+        storage.update_parse_status(a, ParseStatus.SUCCESS, "第一次解析")
+        first = storage.get_document(a)["markdownRef"]
+        storage.update_parse_status(a, ParseStatus.SUCCESS, MARKDOWN)
+        assert not storage.blobs.exists(first)
+
+        ref = storage.get_document(a)["markdownRef"]
+        storage.delete_document(a)
+
+    assert not storage.blobs.exists(ref)
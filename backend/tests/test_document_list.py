@@ -0,0 +1,99 @@
+"""
+文档列表：按 (上传时间, ID) 的游标分页、翻页期间增删不重复不遗漏，以及作为 ETag 的数据版本号
+"""
+import pytest
+
+from app.models.document import DocumentStorage, SQLiteDocumentStorage, decode_cursor, encode_cursor
+from app.schemas.document import DocumentCreate, DocumentSummary, ParseStatus
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        return DocumentStorage(storage_dir=str(tmp_path))
+    return SQLiteDocumentStorage(str(tmp_path / "documents.db"), storage_dir=str(tmp_path))
+
+
+def _create(storage, title: str, folder_id: str = "root", tags=None) -> str:
+    doc = storage.create_document(
+        DocumentCreate(title=title, fileName=f"{title}.pdf", fileType="pdf", fileSize=1,
+                       tags=tags or [], folderId=folder_id),
+        "",
+    )
+    return doc["id"]
+
+
+def _pages(storage, limit: int, on_page=None, **filters) -> list:
+    """按游标翻完所有页，返回依次读到的文档 ID"""
+    seen, cursor = [], None
+    while True:
+        documents, _ = storage.list_documents(limit=limit, cursor=cursor, **filters)
+        seen.extend(doc["id"] for doc in documents)
+        if len(documents) < limit:
+            return seen
+        cursor = encode_cursor(documents[-1])
+        if on_page:
+            on_page()
+
+
+@pytest.mark.parametrize("filters", [{}, {"folder": "f1"}, {"tag": "偶数"}, {"search": "报告"}])
+def test_cursor_pages_follow_upload_order(storage, filters):
+    for i in range(23):
+        _create(storage, f"报告{i}", folder_id="f1" if i % 3 else "f2", tags=["偶数"] if i % 2 == 0 else [])
+    documents, total = storage.list_documents(limit=1000, **filters)
+
+    assert _pages(storage, 5, **filters) == [doc["id"] for doc in documents]
+    assert len(documents) == total
+
+
+def test_changes_while_paging_cause_no_duplicates_or_gaps(storage):
+    ids = [_create(storage, f"报告{i}") for i in range(20)]
+    deleted = []
+
+    def change():
+        # 每翻一页上传一个新文档，前三页还各删除一个尚未读到的文档
+        if len(deleted) < 3:
+            deleted.append(ids[len(deleted) * 4 + 10])
+            storage.delete_document(deleted[-1])
+        _create(storage, f"新报告{len(deleted)}")
+
+    seen = _pages(storage, 4, on_page=change)
+
+    assert len(seen) == len(set(seen))
+    assert [doc_id for doc_id in seen if doc_id in ids] == [doc_id for doc_id in ids if doc_id not in deleted]
+
+
+def test_invalid_cursor(storage):
+    with pytest.raises(ValueError):
+        storage.list_documents(cursor="not-a-cursor")
+    assert decode_cursor(encode_cursor({"id": "a", "uploadTime": "2024-01-01"})) == ("2024-01-01", "a")
+
+
+def test_version_changes_on_every_write(storage):
+    doc_id = _create(storage, "报告")
+    versions = [storage.version()]
+    assert storage.version() == versions[-1]
+
+    with storage.write_batch():
+        storage.update_parse_status(doc_id, ParseStatus.PARSING)
+        # 待写队列中的状态同样改变版本号
+        versions.append(storage.version())
+    versions.append(storage.version())
+    storage.update_vectorize_status(doc_id, "success", chunk_count=2)
+    versions.append(storage.version())
+    storage.delete_document(doc_id)
+    versions.append(storage.version())
+
+    assert len(set(versions)) == len(versions)
+
+
+def test_summary_omits_body(storage):
+    doc_id = _create(storage, "报告")
+    storage.update_parse_status(doc_id, ParseStatus.SUCCESS, "# 很长的正文")
+    storage.update_vectorize_status(doc_id, "success", chunk_count=2)
+
+    [doc], _ = storage.list_documents()
+    summary = DocumentSummary(**doc).model_dump(mode="json")
+
+    assert "markdownContent" not in summary
+    assert (summary["vectorizeStatus"], summary["chunkCount"]) == ("success", 2)
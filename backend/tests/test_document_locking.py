@@ -0,0 +1,72 @@
+"""
+文档存储的加锁顺序：并发的直接修改、状态提交和读取待写队列的查询不会死锁
+"""
+import threading
+
+import pytest
+
+from app.models.document import DocumentStorage, SQLiteDocumentStorage
+from app.schemas.document import DocumentCreate, DocumentUpdate, ParseStatus
+
+ROUNDS = 200
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        return DocumentStorage(storage_dir=str(tmp_path))
+    return SQLiteDocumentStorage(str(tmp_path / "documents.db"), storage_dir=str(tmp_path))
+
+
+def _run_concurrently(*targets, timeout: float = 15.0):
+    errors = []
+
+    def wrap(target):
+        def run():
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+        return run
+
+    threads = [threading.Thread(target=wrap(target), daemon=True) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout)
+    assert not [thread for thread in threads if thread.is_alive()], "并发写入死锁"
+    assert not errors, errors
+
+
+def test_update_flush_and_stats_do_not_deadlock(storage):
+    folder = storage.create_folder("知识库")["id"]
+    ids = [
+        storage.create_document(
+            DocumentCreate(title=f"文档{i}", fileName=f"{i}.pdf", fileType="pdf", fileSize=1, tags=[], folderId=folder),
+            "",
+        )["id"]
+        for i in range(4)
+    ]
+
+    def update_documents():
+        # PUT /documents/{id}：直接修改（先 flush，再写入）
+        for i in range(ROUNDS):
+            storage.update_document(ids[i % 2], DocumentUpdate(title=f"标题{i}"))
+
+    def flush_status():
+        # 解析任务：状态进入待写队列，随后提交
+        for i in range(ROUNDS):
+            with storage.write_batch():
+                storage.update_parse_status(ids[2 + i % 2], ParseStatus.SUCCESS, f"正文{i}")
+            storage.touch_folder(folder)
+
+    def read_pending():
+        # 检索 / 统计：持有待写队列锁读取已提交数据
+        for _ in range(ROUNDS):
+            storage.folder_stats(folder)
+            storage.vector_version(ids)
+
+    _run_concurrently(update_documents, flush_status, read_pending)
+
+    assert storage.get_document(ids[0])["title"].startswith("标题")
+    assert storage.get_markdown(ids[3]) == f"正文{ROUNDS - 1}"
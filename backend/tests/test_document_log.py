@@ -0,0 +1,149 @@
+"""
+JSON 文档存储的追加写日志：重启回放、压缩、崩溃留下的半行和轮转残留，以及多进程按变更代数同步
+"""
+import json
+import multiprocessing
+import time
+
+import pytest
+
+from app.models.document import DocumentStorage
+from app.schemas.document import DocumentCreate, DocumentUpdate, ParseStatus
+
+
+def _create(storage, title: str) -> str:
+    doc = storage.create_document(
+        DocumentCreate(title=title, fileName=f"{title}.pdf", fileType="pdf", fileSize=1, tags=[]),
+        "",
+    )
+    return doc["id"]
+
+
+def _state(storage) -> dict:
+    documents, _ = storage.list_documents(limit=1000)
+    return {
+        doc["id"]: (doc["title"], doc["parseStatus"], storage.get_markdown(doc["id"]))
+        for doc in documents
+    }
+
+
+def _populate(storage) -> list:
+    ids = [_create(storage, f"文档{i}") for i in range(5)]
+    storage.update_parse_status(ids[0], ParseStatus.SUCCESS, "# 正文")
+    storage.update_document(ids[1], DocumentUpdate(title="改名"))
+    storage.delete_document(ids[2])
+    return ids
+
+
+def test_reopen_replays_log(tmp_path):
+    storage = DocumentStorage(str(tmp_path))
+    ids = _populate(storage)
+
+    reopened = DocumentStorage(str(tmp_path))
+
+    assert json.loads((tmp_path / "documents.json").read_text(encoding="utf-8")) == []
+    assert _state(reopened) == _state(storage)
+    assert ids[2] not in _state(reopened)
+    assert _state(reopened)[ids[0]] == ("文档0", "success", "# 正文")
+
+
+def test_compaction_writes_snapshot_and_truncates_log(tmp_path):
+    storage = DocumentStorage(str(tmp_path))
+    _populate(storage)
+    expected = _state(storage)
+
+    storage._compact()
+
+    log = tmp_path / "documents.log"
+    assert not log.exists() or log.stat().st_size == 0
+    assert not (tmp_path / "documents.log.old").exists()
+    assert len(json.loads((tmp_path / "documents.json").read_text(encoding="utf-8"))) == 4
+    assert _state(DocumentStorage(str(tmp_path))) == expected
+
+
+def test_compaction_triggered_by_threshold(tmp_path):
+    storage = DocumentStorage(str(tmp_path), compact_threshold=10)
+    ids = [_create(storage, f"文档{i}") for i in range(30)]
+
+    # 压缩在后台线程中进行
+    deadline = time.monotonic() + 10
+    while storage._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert json.loads((tmp_path / "documents.json").read_text(encoding="utf-8"))
+    assert set(_state(DocumentStorage(str(tmp_path)))) == set(ids)
+
+
+def test_torn_log_tail_is_ignored(tmp_path):
+    storage = DocumentStorage(str(tmp_path))
+    ids = _populate(storage)
+    with open(tmp_path / "documents.log", "ab") as f:
+        f.write(b'{"op":"delete","id":"' + ids[0].encode())  # 崩溃时写了一半的行
+
+    reopened = DocumentStorage(str(tmp_path))
+    assert ids[0] in _state(reopened)
+
+    # 之后追加的记录不会与半行粘连
+    reopened.update_document(ids[3], DocumentUpdate(title="崩溃之后"))
+    assert _state(DocumentStorage(str(tmp_path)))[ids[3]][0] == "崩溃之后"
+
+
+def test_interrupted_compaction_keeps_rotated_log(tmp_path):
+    storage = DocumentStorage(str(tmp_path))
+    ids = _populate(storage)
+    # 压缩在轮转日志之后、写入快照之前中断
+    storage._log.rotate()
+    storage.update_document(ids[4], DocumentUpdate(title="轮转之后"))
+    expected = _state(storage)
+
+    reopened = DocumentStorage(str(tmp_path))
+    assert _state(reopened) == expected
+
+    reopened._compact()
+    assert not (tmp_path / "documents.log.old").exists()
+    assert _state(DocumentStorage(str(tmp_path))) == expected
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_other_process_writes_are_visible(tmp_path, compact):
+    a, b = DocumentStorage(str(tmp_path)), DocumentStorage(str(tmp_path))
+
+    doc_id = _create(a, "来自 A")
+    assert b.get_document(doc_id)["title"] == "来自 A"
+    version = b.version()
+
+    b.update_parse_status(doc_id, ParseStatus.SUCCESS, "B 的正文")
+    if compact:
+        # 快照被其他进程替换：整体重新加载
+        b._compact()
+    assert a.get_markdown(doc_id) == "B 的正文"
+    assert a.version() != version
+
+    a.delete_document(doc_id)
+    assert b.get_document(doc_id) is None
+    assert b.list_documents()[1] == 0
+
+
+def _create_many(storage_dir: str, prefix: str, count: int):
+    storage = DocumentStorage(storage_dir)
+    for i in range(count):
+        _create(storage, f"{prefix}{i}")
+
+
+def test_concurrent_workers_share_the_log(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_create_many, args=(str(tmp_path), f"进程{n}-", 20))
+        for n in range(3)
+    ]
+    storage = DocumentStorage(str(tmp_path), compact_threshold=25)
+    for worker in workers:
+        worker.start()
+    _create_many(str(tmp_path), "主进程-", 20)
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    # 期间日志可能已被任一进程压缩轮转，各进程的写入都不丢失
+    assert storage.list_documents()[1] == 80
+    assert DocumentStorage(str(tmp_path)).list_documents()[1] == 80
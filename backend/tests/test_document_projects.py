@@ -0,0 +1,118 @@
+"""
+文档项目存储：每个项目一个目录、章节单独写入、项目锁的引用计数和多进程同步
+"""
+import gc
+import json
+import os
+import threading
+
+from app.models.document_project import DocumentProjectStorage
+
+
+def _section(section_id: str, content: str) -> dict:
+    return {
+        "sectionId": section_id,
+        "paragraphs": [{"paragraph_id": f"p-{section_id}", "content": content}],
+        "sources": [],
+    }
+
+
+def _open_fds() -> int:
+    gc.collect()  # 之前测试中的存储被回收时会关闭各自的锁文件
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_project_directory_layout(tmp_path):
+    storage = DocumentProjectStorage(str(tmp_path))
+    project = storage.create_project("年度报告", ["f1"], content=[_section("node-1", "第一章")])
+    project_dir = tmp_path / "projects" / project["id"]
+
+    storage.add_section_content(project["id"], "第二章/附录", _section("第二章/附录", "附录"))
+
+    assert json.loads((project_dir / "project.json").read_text(encoding="utf-8"))["sectionIds"] == [
+        "node-1", "第二章/附录",
+    ]
+    assert (project_dir / "sections" / "node-1.json").exists()
+    # 不能直接作文件名的章节 ID 用哈希命名
+    assert len(list((project_dir / "sections").iterdir())) == 2
+    reopened = DocumentProjectStorage(str(tmp_path))
+    sections = reopened.get_project(project["id"])["sections"]
+    assert sections["第二章/附录"]["paragraphs"][0]["content"] == "附录"
+
+
+def test_section_write_leaves_other_sections_untouched(tmp_path):
+    storage = DocumentProjectStorage(str(tmp_path))
+    project = storage.create_project("年度报告", [], content=[_section("a", "甲"), _section("b", "乙")])
+    untouched = tmp_path / "projects" / project["id"] / "sections" / "b.json"
+    before = untouched.stat().st_mtime_ns, untouched.stat().st_ino
+
+    storage.update_paragraph(project["id"], "a", "p-a", "甲（修改）")
+
+    assert (untouched.stat().st_mtime_ns, untouched.stat().st_ino) == before
+    assert storage.get_project(project["id"])["sections"]["a"]["paragraphs"][0]["content"] == "甲（修改）"
+
+
+def test_project_locks_are_released(tmp_path):
+    storage = DocumentProjectStorage(str(tmp_path))
+    ids = [storage.create_project(f"项目{i}", [])["id"] for i in range(20)]
+    fds = _open_fds()
+
+    for project_id in ids:
+        storage.add_section_content(project_id, "a", _section("a", "内容"))
+        # 嵌套加锁（update_paragraph -> add_section_content -> _put_sections）不自锁
+        storage.update_paragraph(project_id, "a", "p-a", "修改")
+
+    assert storage._project_locks == {}
+    assert _open_fds() <= fds
+
+
+def test_concurrent_sections_in_one_project(tmp_path):
+    storage = DocumentProjectStorage(str(tmp_path))
+    project_id = storage.create_project("年度报告", [])["id"]
+
+    def write(start: int):
+        for i in range(start, start + 10):
+            storage.add_section_content(project_id, f"s{i}", _section(f"s{i}", str(i)))
+
+    threads = [threading.Thread(target=write, args=(start,)) for start in range(0, 40, 10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(15)
+
+    assert len(storage.get_project(project_id)["sections"]) == 40
+    assert storage._project_locks == {}
+
+
+def test_other_process_writes_are_visible(tmp_path):
+    a, b = DocumentProjectStorage(str(tmp_path)), DocumentProjectStorage(str(tmp_path))
+
+    project_id = a.create_project("年度报告", [])["id"]
+    assert b.get_project(project_id)["title"] == "年度报告"
+
+    b.update_outline(project_id, [{"id": "node-1", "title": "概述"}], locked=True)
+    assert a.get_project(project_id)["outlineLocked"] is True
+
+    a.delete_project(project_id)
+    assert b.get_project(project_id) is None
+    assert b.list_projects()[1] == 0
+
+
+def test_migrates_document_projects_json(tmp_path):
+    legacy = [{
+        "id": "p1",
+        "title": "旧项目",
+        "folderIds": [],
+        "outline": [],
+        "outlineLocked": False,
+        "sections": {"node-1": _section("node-1", "旧内容")},
+        "createdAt": "2024-01-01",
+        "updatedAt": "2024-01-01",
+    }]
+    (tmp_path / "document_projects.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding="utf-8")
+
+    storage = DocumentProjectStorage(str(tmp_path))
+
+    project = storage.get_project("p1")
+    assert project["sections"]["node-1"]["paragraphs"][0]["content"] == "旧内容"
+    assert not (tmp_path / "projects.tmp").exists()
@@ -0,0 +1,36 @@
+"""
+标题检索：两种存储后端都按 str.lower() 匹配，非 ASCII 字母同样不区分大小写
+"""
+import pytest
+
+from app.models.document import DocumentStorage, SQLiteDocumentStorage
+from app.schemas.document import DocumentCreate
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        return DocumentStorage(storage_dir=str(tmp_path))
+    return SQLiteDocumentStorage(str(tmp_path / "documents.db"), storage_dir=str(tmp_path))
+
+
+def _create(storage, title: str, file_name: str) -> str:
+    doc = storage.create_document(
+        DocumentCreate(title=title, fileName=file_name, fileType="pdf", fileSize=1, tags=[]),
+        "",
+    )
+    return doc["id"]
+
+
+@pytest.mark.parametrize("search", ["übersicht", "ÜBERSICHT", "ΣΥΣΤΗΜΑ", "система"])
+def test_search_folds_non_ascii_case(storage, search):
+    expected = {
+        _create(storage, "Übersicht der Systeme", "overview.pdf"),
+        _create(storage, "ΣΥΣΤΗΜΑ", "Система.pdf"),
+    }
+    _create(storage, "年度报告", "report.pdf")
+
+    documents, total = storage.list_documents(search=search)
+
+    assert total == 1
+    assert documents[0]["id"] in expected
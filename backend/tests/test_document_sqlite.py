@@ -0,0 +1,106 @@
+"""
+SQLite 文档存储：读写往返、事务回滚，以及从 JSON 存储的一次性迁移
+"""
+import json
+
+import pytest
+
+from app.models.document import DocumentStorage, SQLiteDocumentStorage
+from app.schemas.document import DocumentCreate, DocumentUpdate, ParseStatus
+
+
+def _create(storage, title: str, folder_id=None, tags=None) -> str:
+    doc = storage.create_document(
+        DocumentCreate(title=title, fileName=f"{title}.pdf", fileType="pdf", fileSize=1,
+                       tags=tags or [], folderId=folder_id),
+        "",
+    )
+    return doc["id"]
+
+
+def _open(tmp_path) -> SQLiteDocumentStorage:
+    return SQLiteDocumentStorage(str(tmp_path / "documents.db"), storage_dir=str(tmp_path))
+
+
+def test_round_trip(tmp_path):
+    storage = _open(tmp_path)
+    folder = storage.create_folder("制度")["id"]
+    a = _create(storage, "采购制度", folder, ["制度"])
+    b = _create(storage, "差旅报销", folder)
+    storage.update_parse_status(a, ParseStatus.SUCCESS, "# 采购制度")
+    storage.update_vectorize_status(a, "success", chunk_count=3)
+    storage.update_document(b, DocumentUpdate(title="差旅报销办法", tags=["报销"]))
+
+    reopened = _open(tmp_path)
+
+    doc = reopened.get_document(a, with_content=True)
+    assert doc["markdownContent"] == "# 采购制度"
+    assert (doc["parseStatus"], doc["vectorizeStatus"], doc["chunkCount"]) == ("success", "success", 3)
+    assert reopened.get_document(b)["title"] == "差旅报销办法"
+    assert [d["id"] for d in reopened.list_documents(tag="报销")[0]] == [b]
+    assert [d["id"] for d in reopened.list_documents(search="办法")[0]] == [b]
+    assert reopened.list_documents(folder=folder)[1] == 2
+    assert reopened.folder_stats(folder) == storage.folder_stats(folder)
+    assert reopened.get_folder(folder)["name"] == "制度"
+
+
+def test_failed_write_rolls_back(tmp_path, monkeypatch):
+    storage = _open(tmp_path)
+    folder = storage.create_folder("制度")["id"]
+    a = _create(storage, "采购制度", folder)
+    stats = storage.folder_stats(folder)
+    version = storage.version()
+
+    def crash(*args):
+        raise RuntimeError("写入中断")
+
+    monkeypatch.setattr(storage, "_write_grams", crash)
+    with pytest.raises(RuntimeError):
+        _create(storage, "差旅报销", folder)
+    with pytest.raises(RuntimeError):
+        storage.update_document(a, DocumentUpdate(title="采购管理制度"))
+    monkeypatch.undo()
+
+    # 文档行、标签、统计和版本号在同一事务中，中途失败时全部不生效
+    documents, total = storage.list_documents(folder=folder)
+    assert total == 1
+    assert documents[0]["title"] == "采购制度"
+    assert storage.list_documents(search="采购")[1] == 1
+    assert storage.folder_stats(folder) == stats
+    assert storage.version() == version
+
+
+def test_migrates_json_storage_once(tmp_path):
+    json_storage = DocumentStorage(storage_dir=str(tmp_path))
+    folder = json_storage.create_folder("合同")["id"]
+    a = _create(json_storage, "租赁合同", folder, ["合同"])
+    b = _create(json_storage, "服务协议", folder)
+    json_storage.update_parse_status(a, ParseStatus.SUCCESS, "# 租赁合同")
+    json_storage.delete_document(b)
+
+    # 旧版本的快照中正文内联在文档里，迁移时一并移到 blob
+    legacy = dict(
+        json_storage.get_document(a), id="legacy", title="旧版文档", tags=[], markdownContent="旧正文"
+    )
+    legacy.pop("markdownRef")
+    with open(tmp_path / "documents.json", "r+", encoding="utf-8") as f:
+        snapshot = json.load(f)
+        f.seek(0)
+        json.dump(snapshot + [legacy], f, ensure_ascii=False)
+        f.truncate()
+
+    storage = _open(tmp_path)
+
+    documents, total = storage.list_documents()
+    assert total == 2
+    assert {d["id"] for d in documents} == {a, "legacy"}
+    assert storage.get_markdown(a) == "# 租赁合同"
+    assert storage.get_markdown("legacy") == "旧正文"
+    assert "markdownContent" not in storage.get_document("legacy")
+    assert [d["id"] for d in storage.list_documents(tag="合同")[0]] == [a]
+    assert storage.get_folder(folder)["name"] == "合同"
+    assert storage.folder_stats(folder)["documentCount"] == 2
+
+    # 迁移只执行一次：之后 JSON 存储的变化不再带入
+    _create(json_storage, "补充协议", folder)
+    assert _open(tmp_path).list_documents()[1] == 2
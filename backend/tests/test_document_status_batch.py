@@ -0,0 +1,69 @@
+"""
+状态写入合并：write_batch 只对调用方生效，待写队列达到上限时提交
+"""
+import threading
+
+import pytest
+
+from app.models.document import DocumentStorage, SQLiteDocumentStorage
+from app.schemas.document import DocumentCreate, ParseStatus
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def make_storage(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "json":
+            return DocumentStorage(storage_dir=str(tmp_path), **kwargs)
+        return SQLiteDocumentStorage(str(tmp_path / "documents.db"), storage_dir=str(tmp_path), **kwargs)
+    return make
+
+
+def _create(storage, title: str) -> str:
+    doc = storage.create_document(
+        DocumentCreate(title=title, fileName=f"{title}.pdf", fileType="pdf", fileSize=1, tags=[]),
+        "",
+    )
+    return doc["id"]
+
+
+def _committed_status(storage, document_id: str) -> str:
+    return storage._stored_document(document_id)["parseStatus"]
+
+
+def test_batch_defers_only_its_own_writes(make_storage):
+    storage = make_storage()
+    in_batch, outside = _create(storage, "in"), _create(storage, "out")
+    entered, written = threading.Event(), threading.Event()
+
+    def other_request():
+        entered.wait()
+        storage.update_parse_status(outside, ParseStatus.SUCCESS, "正文")
+        written.set()
+
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    with storage.write_batch():
+        storage.update_parse_status(in_batch, ParseStatus.SUCCESS, "正文")
+        entered.set()
+        assert written.wait(10)
+        # 批量范围外的写入立即提交，范围内的写入仍在待写队列中（读取时可见）
+        assert _committed_status(storage, outside) == ParseStatus.SUCCESS.value
+        assert _committed_status(storage, in_batch) != ParseStatus.SUCCESS.value
+        assert storage.get_document(in_batch)["parseStatus"] == ParseStatus.SUCCESS.value
+    thread.join()
+    assert _committed_status(storage, in_batch) == ParseStatus.SUCCESS.value
+
+
+def test_batch_flushes_when_pending_reaches_limit(make_storage):
+    storage = make_storage(max_pending=3)
+    ids = [_create(storage, f"d{i}") for i in range(5)]
+
+    with storage.write_batch():
+        for document_id in ids[:3]:
+            storage.update_parse_status(document_id, ParseStatus.SUCCESS, f"正文{document_id}")
+        assert all(_committed_status(storage, d) == ParseStatus.SUCCESS.value for d in ids[:3])
+        assert storage.get_markdown(ids[0]) == f"正文{ids[0]}"
+
+        storage.update_parse_status(ids[3], ParseStatus.SUCCESS, "正文")
+        assert _committed_status(storage, ids[3]) != ParseStatus.SUCCESS.value
+    assert _committed_status(storage, ids[3]) == ParseStatus.SUCCESS.value
@@ -0,0 +1,72 @@
+"""
+嵌入请求与熔断器：只有解析成功才记为健康，5xx 计入失败，4xx 不计入
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import embedding
+from app.services.embedding import EmbeddingService
+from app.services.ollama_health import CircuitBreaker
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    monkeypatch.setattr(embedding.ollama_health, "breaker", breaker)
+    return breaker
+
+
+def _service(status_code: int, body: dict) -> EmbeddingService:
+    transport = httpx.MockTransport(lambda request: httpx.Response(status_code, json=body))
+    service = EmbeddingService()
+    service.client = httpx.Client(transport=transport)
+    return service
+
+
+def test_server_errors_open_the_breaker(breaker):
+    service = _service(500, {"error": "model runner crashed"})
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            service._embed_request(["文本"])
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_client_errors_do_not_count(breaker):
+    service = _service(400, {"error": "invalid input"})
+
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            service._embed_request(["文本"])
+
+    assert breaker.failures == 0
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_success_recorded_only_after_parsing(breaker):
+    breaker.record_failure()
+    with pytest.raises(ValueError):
+        _service(200, {"embeddings": []})._embed_request(["文本"])
+    assert breaker.failures == 1
+
+    vectors, _ = _service(200, {"embeddings": [[0.1, 0.2]]})._embed_request(["文本"])
+    assert len(vectors) == 1
+    assert breaker.failures == 0
+
+
+def test_async_server_errors_open_the_breaker(breaker):
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(503, json={}))
+        service = EmbeddingService()
+        service.async_client = httpx.AsyncClient(transport=transport)
+        service._async_loop = asyncio.get_running_loop()
+        service._semaphore = asyncio.Semaphore(1)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await service._embed_request_async(["文本"])
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.OPEN
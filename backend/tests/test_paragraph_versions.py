@@ -0,0 +1,92 @@
+"""
+段落历史版本的逆向差量：编码 / 还原往返、与旧版完整内容混合，以及项目中的重新生成和恢复
+"""
+import pytest
+
+from app.models.document_project import DocumentProjectStorage
+from app.models.paragraph_versions import (
+    apply_delta,
+    expand_versions,
+    make_delta,
+    push_version,
+    replace_content,
+)
+
+TEXTS = [
+    "",
+    "第一行\n第二行\n第三行\n",
+    "第一行\n第二行（修改）\n第三行\n新增的第四行\n",
+    "完全不同的内容",
+    "第一行\n第三行",
+]
+
+
+@pytest.mark.parametrize("base", TEXTS)
+@pytest.mark.parametrize("target", TEXTS)
+def test_delta_round_trip(base, target):
+    assert apply_delta(base, make_delta(base, target)) == target
+
+
+def test_unchanged_lines_are_not_stored():
+    base = "".join(f"第{i}行\n" for i in range(100))
+    target = base.replace("第50行", "第五十行")
+
+    delta = make_delta(base, target)
+
+    assert sum(len(item) for item in delta if isinstance(item, str)) == len("第五十行\n")
+
+
+def test_push_and_expand_versions():
+    paragraph = {"content": TEXTS[1]}
+    for index, text in enumerate(TEXTS[2:]):
+        push_version(paragraph, text, {"timestamp": str(index)})
+
+    assert paragraph["content"] == TEXTS[-1]
+    assert all("content" not in entry for entry in paragraph["versions"])
+    assert [(v["content"], v["timestamp"]) for v in expand_versions(paragraph)] == [
+        (TEXTS[1], "0"), (TEXTS[2], "1"), (TEXTS[3], "2"),
+    ]
+
+
+def test_replace_content_keeps_history():
+    paragraph = {"content": TEXTS[1]}
+    push_version(paragraph, TEXTS[2])
+
+    replace_content(paragraph, TEXTS[3])
+
+    assert paragraph["content"] == TEXTS[3]
+    assert [v["content"] for v in expand_versions(paragraph)] == [TEXTS[1]]
+
+
+def test_legacy_full_versions_are_packed_on_next_write():
+    paragraph = {
+        "content": TEXTS[3],
+        "versions": [{"content": TEXTS[1], "timestamp": "旧"}, {"content": TEXTS[2], "timestamp": "较新"}],
+    }
+    assert [v["content"] for v in expand_versions(paragraph)] == [TEXTS[1], TEXTS[2]]
+
+    push_version(paragraph, TEXTS[4])
+
+    assert all("delta" in entry and "content" not in entry for entry in paragraph["versions"])
+    assert [v["content"] for v in expand_versions(paragraph)] == [TEXTS[1], TEXTS[2], TEXTS[3]]
+
+
+def test_regenerate_and_restore_in_project(tmp_path):
+    storage = DocumentProjectStorage(str(tmp_path))
+    project_id = storage.create_project("年度报告", [])["id"]
+
+    for index, text in enumerate(TEXTS[1:4]):
+        result = storage.regenerate_paragraph(project_id, "s1", {
+            "paragraph_id": f"p{index}", "content": text, "sources": [], "timestamp": str(index),
+        })
+    assert result["versionCount"] == 2
+    assert "versions" not in storage.get_project(project_id)["sections"]["s1"]["paragraphs"][0]
+
+    versions = storage.get_paragraph_versions(project_id, "s1", "p2")
+    assert [v["content"] for v in versions] == [TEXTS[1], TEXTS[2]]
+
+    storage.restore_paragraph_version(project_id, "s1", "p2", 0)
+
+    [paragraph] = storage.get_project(project_id)["sections"]["s1"]["paragraphs"]
+    assert paragraph["content"] == TEXTS[1]
+    assert [v["content"] for v in storage.get_paragraph_versions(project_id, "s1", "p2")] == [TEXTS[2], TEXTS[3]]
@@ -0,0 +1,103 @@
+"""
+批量向量化的插入缓冲：分块写入 Milvus 之后才把文档标记为已向量化，写入失败的文档单独报告
+"""
+import pytest
+
+from app.core.config import settings
+from app.models.document import DocumentStorage
+from app.schemas.document import DocumentCreate
+from app.services.vector_store import VectorStore
+
+
+@pytest.fixture
+def store(milvus, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INSERT_BATCH_ROWS", 5)
+    store = VectorStore(collection_name="document_chunks", encoding="float32")
+    store.create_collection(dimension=4)
+    return store
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return DocumentStorage(str(tmp_path))
+
+
+def _document(storage) -> str:
+    doc = storage.create_document(
+        DocumentCreate(title="文档", fileName="文档.pdf", fileType="pdf", fileSize=1, tags=[], folderId="f1"),
+        "",
+    )
+    storage.update_vectorize_status(doc["id"], "processing")
+    return doc["id"]
+
+
+def _insert(store, document_id: str, count: int, folder_id: str = "f1"):
+    chunks = [
+        {
+            "id": f"{document_id}-{i}",
+            "document_id": document_id,
+            "folder_id": folder_id,
+            "chunk_index": i,
+            "title": "标题",
+            "content": f"内容{i}",
+            "level": 1,
+        }
+        for i in range(count)
+    ]
+    store.insert_chunks(chunks, [[0.1, 0.2, 0.3, float(i)] for i in range(count)])
+
+
+def _mark_inserted(storage):
+    # 与批量向量化任务相同：写入 Milvus 后才标记为成功
+    def mark_inserted(chunk_counts: dict):
+        for document_id, count in chunk_counts.items():
+            storage.update_vectorize_status(document_id, "success", count)
+    return mark_inserted
+
+
+def test_documents_marked_successful_after_insert(store, storage, milvus):
+    a, b, c = _document(storage), _document(storage), _document(storage)
+    collection = milvus.collections["document_chunks"]
+
+    with storage.write_batch(), store.write_batch(on_inserted=_mark_inserted(storage)) as batch:
+        _insert(store, a, 3)
+        # 仍在缓冲中：没有写入 Milvus，状态不变
+        assert collection.rows == []
+        assert storage.get_document(a)["vectorizeStatus"] == "processing"
+
+        _insert(store, b, 3)
+        assert len(collection.rows) == 6
+        assert [storage.get_document(d)["vectorizeStatus"] for d in (a, b)] == ["success", "success"]
+        assert storage.get_document(c)["vectorizeStatus"] == "processing"
+
+        _insert(store, c, 1)
+
+    assert storage.get_document(c)["vectorizeStatus"] == "success"
+    assert [storage.get_document(d)["chunkCount"] for d in (a, b, c)] == [3, 3, 1]
+    assert (batch.inserts, batch.inserted_rows, collection.flushes) == (2, 7, 1)
+    assert batch.failed_document_ids == set()
+
+
+def test_failed_insert_is_reported_not_marked(store, storage, milvus):
+    a, b = _document(storage), _document(storage)
+    milvus.fail_inserts = True
+
+    with store.write_batch(on_inserted=_mark_inserted(storage)) as batch:
+        _insert(store, a, 3)
+        _insert(store, b, 3)
+
+    assert batch.failed_document_ids == {a, b}
+    assert batch.inserted_rows == 0
+    assert [storage.get_document(d)["vectorizeStatus"] for d in (a, b)] == ["processing", "processing"]
+
+
+def test_delete_and_move_apply_to_buffered_chunks(store, milvus):
+    with store.write_batch():
+        _insert(store, "a", 2)
+        store.delete_document("a")
+        _insert(store, "b", 2)
+        assert store.move_document("b", "f2") == 2
+
+    rows = milvus.collections["document_chunks"].rows
+    assert {(row["document_id"], row["folder_id"]) for row in rows} == {("b", "f2")}
+    assert len(rows) == 2
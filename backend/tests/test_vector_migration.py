@@ -0,0 +1,119 @@
+"""
+向量集合迁移（migrate_folder_key）：按文档所在知识库补 folder_id 分区键，任何一步失败时原名称下仍有可用的集合
+"""
+import pytest
+
+from app.services import vector_store as vector_store_module
+from app.services.vector_store import VectorStore
+
+import fake_milvus
+
+NAME = "document_chunks"
+
+
+def _legacy_collection(milvus, rows: dict) -> fake_milvus.FakeCollection:
+    """没有 folder_id 字段的旧集合，rows 为 文档 ID -> 块数"""
+    DataType = vector_store_module.DataType
+    fields = [
+        fake_milvus.FieldSchema("id", DataType.VARCHAR, max_length=256, is_primary=True),
+        fake_milvus.FieldSchema("document_id", DataType.VARCHAR, max_length=256),
+        fake_milvus.FieldSchema("chunk_index", DataType.INT64),
+        fake_milvus.FieldSchema("title", DataType.VARCHAR, max_length=512),
+        fake_milvus.FieldSchema("content", DataType.VARCHAR, max_length=65535),
+        fake_milvus.FieldSchema("level", DataType.INT64),
+        fake_milvus.FieldSchema("vector", DataType.FLOAT_VECTOR, dim=4),
+    ]
+    collection = milvus.Collection(NAME, schema=fake_milvus.CollectionSchema(fields))
+    collection.create_index("vector", {"index_type": "HNSW", "metric_type": "COSINE", "params": {}})
+    for document_id, count in rows.items():
+        collection.insert([
+            [f"{document_id}-{i}" for i in range(count)],
+            [document_id] * count,
+            list(range(count)),
+            ["标题"] * count,
+            [f"内容{i}" for i in range(count)],
+            [1] * count,
+            [[0.1, 0.2, 0.3, float(i)] for i in range(count)],
+        ])
+    return collection
+
+
+def test_migrates_rows_into_folder_partitions(milvus):
+    _legacy_collection(milvus, {"a": 3, "b": 2, "orphan": 2})
+    store = VectorStore(collection_name=NAME, encoding="float32")
+
+    result = store.migrate_folder_key({"a": "f1", "b": "f2"}, batch_size=2)
+
+    assert result == {"migrated": 5, "orphaned": 2}
+    assert set(milvus.collections) == {NAME}
+    collection = milvus.collections[NAME]
+    assert "folder_id" in [field.name for field in collection.schema.fields]
+    assert sorted((row["id"], row["folder_id"]) for row in collection.rows) == [
+        ("a-0", "f1"), ("a-1", "f1"), ("a-2", "f1"), ("b-0", "f2"), ("b-1", "f2"),
+    ]
+    assert collection.rows[0]["vector"] == pytest.approx([0.1, 0.2, 0.3, 0.0])
+    # 索引类型沿用旧集合
+    assert collection.indexes[0].params["index_type"] == "HNSW"
+    assert store.folder_key and store.ready
+
+    # 已经迁移过的集合不再处理
+    assert store.migrate_folder_key({"a": "f1"}) == {"migrated": 0, "orphaned": 0}
+
+
+def test_failed_rename_restores_old_collection(milvus):
+    old = _legacy_collection(milvus, {"a": 3})
+    milvus.fail_rename = (f"{NAME}_migrating", NAME)
+    store = VectorStore(collection_name=NAME, encoding="float32")
+
+    with pytest.raises(RuntimeError):
+        store.migrate_folder_key({"a": "f1"})
+
+    # 旧集合改回原名称，数据不变；迁移结果留在临时集合中，下次迁移时先删除
+    assert milvus.collections[NAME] is old
+    assert len(old.rows) == 3
+    assert f"{NAME}_backup" not in milvus.collections
+
+    milvus.fail_rename = None
+    assert store.migrate_folder_key({"a": "f1"}) == {"migrated": 3, "orphaned": 0}
+    assert set(milvus.collections) == {NAME}
+
+
+def test_existing_backup_blocks_migration(milvus):
+    old = _legacy_collection(milvus, {"a": 3})
+    milvus.collections[f"{NAME}_backup"] = fake_milvus.FakeCollection(milvus, f"{NAME}_backup", old.schema)
+    store = VectorStore(collection_name=NAME, encoding="float32")
+
+    with pytest.raises(ValueError):
+        store.migrate_folder_key({"a": "f1"})
+
+    assert milvus.collections[NAME] is old
+    assert milvus.renames == []
+
+
+def test_failed_copy_leaves_old_collection_in_place(milvus):
+    old = _legacy_collection(milvus, {"a": 3})
+    milvus.fail_inserts = True
+    store = VectorStore(collection_name=NAME, encoding="float32")
+
+    with pytest.raises(RuntimeError):
+        store.migrate_folder_key({"a": "f1"})
+
+    assert milvus.collections[NAME] is old
+    assert milvus.renames == []
+
+
+def test_move_document_after_restart(milvus):
+    store = VectorStore(collection_name=NAME, encoding="float32")
+    store.create_collection(dimension=4)
+    store.insert_chunks(
+        [{"id": f"a-{i}", "document_id": "a", "folder_id": "f1", "chunk_index": i,
+          "title": "标题", "content": "内容", "level": 1} for i in range(2)],
+        [[0.1, 0.2, 0.3, 0.4]] * 2,
+    )
+
+    # 重启后集合尚未打开（folder_key 仍为 False），移动前需要先加载
+    restarted = VectorStore(collection_name=NAME, encoding="float32")
+    restarted.connected = True
+
+    assert restarted.move_document("a", "f2") == 2
+    assert {row["folder_id"] for row in milvus.collections[NAME].rows} == {"f2"}
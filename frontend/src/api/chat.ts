@@ -22,13 +22,18 @@ export interface Source {
   score: number
 }
 
-// 对话接口
-export interface Conversation {
+// 对话摘要（列表接口返回，不含消息内容）
+export interface ConversationSummary {
   id: string
   title: string
   folderId: string
   createdAt: string
   updatedAt: string
+  messageCount: number
+}
+
+// 对话接口
+export interface Conversation extends Omit<ConversationSummary, 'messageCount'> {
   messages: Message[]
 }
 
@@ -84,11 +89,11 @@ export const chatApi = {
 
   // 获取对话列表
   listConversations: async (folderId: string, limit?: number): Promise<{
-    conversations: Conversation[]
+    conversations: ConversationSummary[]
     total: number
   }> => {
     const response = await apiClient.get<{
-      conversations: Conversation[]
+      conversations: ConversationSummary[]
       total: number
     }>('/chat/conversations', {
       params: { folderId, limit }
@@ -1,5 +1,5 @@
 import apiClient from './index'
-import type { Document, Folder, UploadProgress } from '@/types/document'
+import type { Document, Folder, FolderStats, UploadProgress } from '@/types/document'
 
 export interface UploadResponse {
   documentId: string
@@ -16,6 +16,7 @@ export interface ParseResponse {
 export interface DocumentListResponse {
   documents: Document[]
   total: number
+  nextCursor: string | null  // 下一页的游标，没有更多文档时为 null
 }
 
 // 文档 API
@@ -52,18 +53,35 @@ export const documentApi = {
     return response
   },
 
-  // 获取文档列表
+  // 获取文档列表（摘要，不含正文）
   list: async (params?: {
     folder?: string
     tag?: string
     search?: string
-    page?: number
-    pageSize?: number
+    limit?: number
+    cursor?: string
+    fields?: string  // 只返回指定字段（逗号分隔）
   }): Promise<DocumentListResponse> => {
     const response = await apiClient.get<DocumentListResponse>('/documents', { params })
     return response
   },
 
+  // 按游标逐页获取全部文档
+  listAll: async (params?: {
+    folder?: string
+    tag?: string
+    search?: string
+  }): Promise<Document[]> => {
+    const documents: Document[] = []
+    let cursor: string | undefined
+    do {
+      const result = await documentApi.list({ ...params, limit: 500, cursor })
+      documents.push(...result.documents)
+      cursor = result.nextCursor ?? undefined
+    } while (cursor)
+    return documents
+  },
+
   // 获取文档详情
   get: async (documentId: string): Promise<Document> => {
     const response = await apiClient.get<Document>(`/documents/${documentId}`)
@@ -115,6 +133,12 @@ export const documentApi = {
     await apiClient.delete(`/folders/${folderId}`)
   },
 
+  // 获取文件夹统计
+  getFolderStats: async (folderId: string): Promise<FolderStats> => {
+    const response = await apiClient.get<FolderStats>(`/folders/${folderId}/stats`)
+    return response
+  },
+
   // ==================== RAG 分块相关接口 ====================
 
   // 分块文档
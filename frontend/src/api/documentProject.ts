@@ -28,12 +28,14 @@ export interface Paragraph {
   id: string
   content: string
   timestamp: string
+  versionCount?: number  // 历史版本数量，历史版本需通过 getParagraphVersions 按需加载
   versions?: ParagraphVersion[]
 }
 
 export interface ParagraphVersion {
   content: string
   timestamp: string
+  sources?: Source[]
 }
 
 export interface Source {
@@ -145,7 +147,7 @@ export const documentProjectApi = {
     content: string
     sources: Source[]
     timestamp: string
-    versions?: ParagraphVersion[]
+    versionCount: number
   }> => {
     const response = await apiClient.post<{
       paragraph_id: string
@@ -153,7 +155,7 @@ export const documentProjectApi = {
       content: string
       sources: Source[]
       timestamp: string
-      versions?: ParagraphVersion[]
+      versionCount: number
     }>(`/document-projects/${projectId}/regenerate-paragraph`, {
       sectionId,
       sectionTitle,
@@ -191,6 +193,18 @@ export const documentProjectApi = {
     return response
   },
 
+  // 获取段落历史版本（从旧到新）
+  getParagraphVersions: async (
+    projectId: string,
+    sectionId: string,
+    paragraphId: string
+  ): Promise<{ versions: ParagraphVersion[] }> => {
+    const response = await apiClient.get<{ versions: ParagraphVersion[] }>(
+      `/document-projects/${projectId}/sections/${encodeURIComponent(sectionId)}/paragraphs/${encodeURIComponent(paragraphId)}/versions`
+    )
+    return response
+  },
+
   // 获取项目详情（别名）
   getProject: async (projectId: string): Promise<DocumentProject> => {
     const response = await apiClient.get<DocumentProject>(`/document-projects/${projectId}`)
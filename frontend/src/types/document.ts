@@ -30,6 +30,16 @@ export interface Folder {
   createdAt: string
 }
 
+export interface FolderStats {
+  folderId: string
+  documentCount: number  // 文档数
+  parsedCount: number  // 已解析
+  vectorizedCount: number  // 已向量化
+  failedCount: number  // 解析或向量化失败
+  chunkCount: number  // 分块总数
+  totalBytes: number  // 文件总字节数
+}
+
 export interface DocumentFilter {
   searchQuery: string
   selectedTags: string[]